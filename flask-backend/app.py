@@ -1,11 +1,26 @@
-from flask import Flask, request, jsonify
-from generate_transcript import get_transcript 
-from generate_questions import get_questions 
+import json
+import atexit
+from flask import Flask, Response, request, jsonify
+from generate_transcript import extract_youtube_video_id, add_timed_transcript_column
+from pipeline import generate_questions_for_video, stream_questions_for_video
+from question_cache import create_question_sets_table, invalidate_questions
+from database import init_pool, close_pool
+from jobs import JobStore, JobQueue, PRIORITY_LEVELS
+import metrics
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 
+init_pool()
+create_question_sets_table()
+add_timed_transcript_column()
+atexit.register(close_pool)
+
+job_queue = JobQueue(JobStore())
+job_queue.resume()
+atexit.register(job_queue.shutdown)
+
 @app.route('/generate_questions', methods=['POST', 'OPTIONS'])
 def generate_questions():
     """
@@ -15,10 +30,13 @@ def generate_questions():
     - `video_url`: The URL of the YouTube video (required).
     - `timestamped`: A boolean indicating whether the questions returned should include timestamps, corresponding to when the video covers the topic (required). 
                      True indicates that timestamps should be included, and False indicates no timestamps. 
+    - `regenerate`: A boolean indicating whether a new set of questions should be generated even if questions for the video are already stored (optional).
+                    Defaults to False, which returns the stored questions without calling the model.
 
     Returns:
     - A JSON response with the list of questions extracted from the video, or an error message.
     - Status code 200 for success, 400 for missing URL or missing value for 'timestamped', and 500 for other exceptions. 
+    - If SERVER_TIMING is set, a `Server-Timing` header with the milliseconds spent in each stage of the request, such as `download` and `summarize`.
     
     Each question is represented as a dictionary with the structure:
     - `correct_answer` (str): The correct answer for the question.
@@ -37,23 +55,151 @@ def generate_questions():
     data = request.json
     video_url = data.get('video_url')
     timestamped = data.get('timestamped')
+    regenerate = bool(data.get('regenerate', False))
 
     if not video_url:
         return jsonify({"error": "YouTube URL is required"}), 400
     if timestamped is None:  
         return jsonify({"error": "Flag indicating if questions should have timestamps (timestamped) is required"}), 400
 
+    with metrics.trace() as request_trace:
+        try:
+            response = jsonify(generate_questions_for_video(video_url, timestamped, regenerate))
+        except Exception as e:
+            response = jsonify({"error": str(e)}), 500
+    if metrics.SERVER_TIMING:
+        response = app.make_response(response)
+        response.headers['Server-Timing'] = request_trace.server_timing()
+    return response
+
+
+@app.route('/generate_questions/stream', methods=['POST'])
+def stream_questions():
+    """
+    Generates educational questions from a youtube video, streaming them to the client as newline-delimited JSON while they are generated.
+
+    Endpoint expects the same JSON payload as /generate_questions.
+
+    Returns:
+    - An `application/x-ndjson` response with one JSON event per line, or an error message. Each event has a `type` of:
+        - `stage`: A processing stage has started, given in `stage`.
+        - `question`: A question has been generated, given in `question`. It may be removed from the final set when questions are cleaned.
+        - `window`: When timestamped questions are generated incrementally (INCREMENTAL_QUESTIONS, on by default), every question for the part of the video
+                    from `start` to `end` seconds is ready, given in `questions`. Windows arrive in playback order, so the questions up to `end` can be shown.
+        - `final`: The final, cleaned list of questions, given in `questions`, in the same format returned by /generate_questions.
+        - `error`: Generation failed, with the reason given in `error`.
+    - Status code 200 once streaming starts, and 400 for missing URL or missing value for 'timestamped'.
+    """
+    data = request.json
+    video_url = data.get('video_url')
+    timestamped = data.get('timestamped')
+    regenerate = bool(data.get('regenerate', False))
+
+    if not video_url:
+        return jsonify({"error": "YouTube URL is required"}), 400
+    if timestamped is None:  
+        return jsonify({"error": "Flag indicating if questions should have timestamps (timestamped) is required"}), 400
+
+    events = stream_questions_for_video(video_url, timestamped, regenerate)
+    return Response((json.dumps(event) + "\n" for event in events), mimetype='application/x-ndjson')
+
+
+@app.route('/questions', methods=['DELETE'])
+def delete_questions():
+    """
+    Invalidates the stored questions for a youtube video, so the next request for the video generates new questions.
+
+    Endpoint expects a JSON payload with:
+    - `video_url`: The URL of the YouTube video (required).
+    - `timestamped`: A boolean limiting the invalidation to questions with (True) or without (False) timestamps (optional). Both are invalidated if omitted.
+
+    Returns:
+    - A JSON response with the number of question sets deleted, or an error message.
+    - Status code 200 for success, 400 for a missing or invalid URL, and 500 for other exceptions.
+    """
+    data = request.json
+    video_id = extract_youtube_video_id(data.get('video_url') or '')
+    if not video_id:
+        return jsonify({"error": "YouTube URL is required"}), 400
+
     try:
-        transcript = get_transcript(video_url, timestamped)
-        questions = get_questions(transcript, timestamped)
-        return jsonify(questions)  
+        deleted = invalidate_questions(video_id, data.get('timestamped'))
+        return jsonify({"deleted": deleted})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Starts generating educational questions from a youtube video in the background, returning immediately with a job ID.
 
+    Endpoint expects the same JSON payload as /generate_questions:
+    - `video_url`: The URL of the YouTube video (required).
+    - `timestamped`: A boolean indicating whether the questions returned should include timestamps (required).
+    - `regenerate`: A boolean indicating whether a new set of questions should be generated even if questions for the video are already stored (optional).
+    And optionally:
+    - `priority`: 'interactive' if a user is waiting on the job, or 'background' for work no one is waiting on, such as pre-warming,
+                  whose requests to the model wait behind every interactive request. Defaults to 'interactive'.
 
+    Returns:
+    - A JSON response with the `job_id` and its `status`, or an error message.
+    - Status code 202 for success, 400 for missing URL, missing value for 'timestamped', or an unknown 'priority', and 500 for other exceptions.
+    """
+    data = request.json
+    video_url = data.get('video_url')
+    timestamped = data.get('timestamped')
+    regenerate = bool(data.get('regenerate', False))
+    priority = data.get('priority', 'interactive')
 
+    if not video_url:
+        return jsonify({"error": "YouTube URL is required"}), 400
+    if timestamped is None:  
+        return jsonify({"error": "Flag indicating if questions should have timestamps (timestamped) is required"}), 400
+    if priority not in PRIORITY_LEVELS:
+        return jsonify({"error": f"Priority must be one of: {', '.join(PRIORITY_LEVELS)}"}), 400
 
+    try:
+        job_id = job_queue.submit(video_url, timestamped, regenerate, PRIORITY_LEVELS[priority])
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Reports the progress of a job started with POST /jobs.
+
+    Returns:
+    - A JSON response with the job, or an error message. The job includes:
+        - `status` (str): 'queued', 'running', 'done', or 'failed'.
+        - `priority` (str): 'interactive' or 'background', as submitted.
+        - `stage` (str): While running, one of 'captions', 'downloading', 'transcribing', 'summarizing', 'generating', or 'cleaning'.
+        - `result` (list of dict): Once done, the questions, in the same format returned by /generate_questions.
+        - `error` (str): If failed, the reason the job failed.
+    - Status code 200 for success and 404 if the job does not exist.
+    """
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Reports the service's metrics in the Prometheus text format.
+
+    Returns:
+    - A `text/plain` response with:
+        - `stage_duration_seconds`: A histogram of the time spent in each pipeline stage, such as `download`, `transcribe`, `summarize`, and `llm_request`.
+        - `llm_requests_total`, `llm_tokens_total`, and `llm_cost_dollars_total`: Chat completion requests, their prompt and completion tokens, and the estimated cost of them and of hosted transcription.
+        - `download_bytes_total` and `audio_seconds_total`: The audio downloaded and transcribed.
+        - `cache_lookups_total` and `retries_total`: Where cached transcripts and questions were found, and operations retried after failing.
+        - Counters ending in `_total` for the hits, misses, evictions, and expirations of the in-process caches, the database connection pool's checkouts,
+          waits, health checks, and discarded connections, structured output parse failures, and the API request schedulers' retries and rate limit errors.
+        - Gauges for the current state of the in-process caches, the database connection pool, and the API request schedulers' queues and budgets.
+    - Status code 200.
+    """
+    return Response(metrics.render_prometheus(metrics.collect_gauges(), metrics.collect_totals()), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,255 @@
+"""
+Serves the same API as app.py on an ASGI server, so requests waiting for questions do not each hold a server worker thread.
+
+Only the lookup of stored questions is asynchronous: it reads the in-process cache or queries through an asyncpg connection pool.
+Videos that need processing run the same blocking pipeline as app.py, with the synchronous OpenAI client and psycopg2, on a shared pool
+of PIPELINE_WORKERS threads that the request awaits. Requests beyond PIPELINE_WORKERS wait in the pool's queue without holding a thread,
+and the pipeline's own limits, such as the in-flight and rate limits of scheduler.py for calls to the model, still apply across all requests.
+The 'async_load' benchmark experiment compares this server with a smaller pool of threads running the pipeline directly, so the speedup it
+reports comes from running more videos at once, not from asynchronous I/O inside the pipeline.
+
+Usage:
+    hypercorn async_app:app --bind localhost:5000
+"""
+import os
+import json
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import asyncpg
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from generate_transcript import extract_youtube_video_id, add_timed_transcript_column
+from pipeline import generate_questions_for_video, generate_with_events
+from question_cache import create_question_sets_table, get_cached_questions_async, invalidate_questions
+from database import DB_NAME, POOL_MIN_SIZE, POOL_MAX_SIZE, init_pool, close_pool
+from jobs import JobStore, JobQueue, PRIORITY_LEVELS
+import metrics
+
+# The maximum number of videos processed at the same time. Further requests for new videos wait for a free worker.
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "32"))
+
+app = cors(Quart(__name__), allow_origin="http://localhost:5173")
+
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+connection_pool = None
+job_queue = None
+background_tasks = set()
+# Videos waiting for a pipeline worker, videos being processed by one, and the most processed at once. Updated under pipeline_stats_lock.
+pipeline_stats = {"queued": 0, "in_flight": 0, "peak_in_flight": 0}
+pipeline_stats_lock = threading.Lock()
+
+
+@app.before_serving
+async def startup():
+    global connection_pool, job_queue
+    init_pool()
+    create_question_sets_table()
+    add_timed_transcript_column()
+    connection_pool = await asyncpg.create_pool(
+        database=DB_NAME,
+        user=os.getenv("PGUSER"),
+        host="localhost",
+        port=5432,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE
+    )
+    job_queue = JobQueue(JobStore())
+    job_queue.resume()
+
+
+@app.after_serving
+async def shutdown():
+    if job_queue is not None:
+        job_queue.shutdown()
+    if connection_pool is not None:
+        await connection_pool.close()
+    pipeline_executor.shutdown(wait=False, cancel_futures=True)
+    close_pool()
+
+
+async def run_in_pipeline(function, *args, **kwargs):
+    """
+    Runs a blocking pipeline function on the pipeline thread pool, in the caller's context, and waits for its result without blocking the event loop.
+    The call is counted as queued until a pipeline worker starts it, and as in flight while the worker runs it.
+
+    Args:
+    function (function): The function to run.
+    *args, **kwargs: The arguments to call function with.
+
+    Returns:
+    The result of function.
+    """
+    started = False
+    call = metrics.in_context(functools.partial(function, *args, **kwargs))
+
+    def run():
+        nonlocal started
+        with pipeline_stats_lock:
+            started = True
+            pipeline_stats["queued"] -= 1
+            pipeline_stats["in_flight"] += 1
+            pipeline_stats["peak_in_flight"] = max(pipeline_stats["peak_in_flight"], pipeline_stats["in_flight"])
+        try:
+            return call()
+        finally:
+            with pipeline_stats_lock:
+                pipeline_stats["in_flight"] -= 1
+
+    with pipeline_stats_lock:
+        pipeline_stats["queued"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pipeline_executor, run)
+    finally:
+        # A call cancelled before a worker picked it up is still counted as queued.
+        with pipeline_stats_lock:
+            if not started:
+                pipeline_stats["queued"] -= 1
+
+
+async def lookup_questions(video_id, timestamped):
+    """
+    Fetches the stored questions for a video without blocking, or None if none are stored or the database pool has not been started.
+    """
+    if connection_pool is None:
+        return None
+    return await get_cached_questions_async(connection_pool, video_id, timestamped)
+
+
+def read_request(data):
+    """
+    Reads the fields shared by the question endpoints from a request's JSON payload.
+
+    Returns:
+    tuple: The video URL, timestamped flag, regenerate flag, and an error response, which is None if the payload is valid.
+           The flags are converted to bool, since asyncpg only accepts a bool for the timestamped column.
+    """
+    video_url = data.get('video_url')
+    timestamped = data.get('timestamped')
+    regenerate = bool(data.get('regenerate', False))
+
+    if not video_url:
+        return video_url, timestamped, regenerate, (jsonify({"error": "YouTube URL is required"}), 400)
+    if timestamped is None:
+        return video_url, timestamped, regenerate, (jsonify({"error": "Flag indicating if questions should have timestamps (timestamped) is required"}), 400)
+    return video_url, bool(timestamped), regenerate, None
+
+
+@app.route('/generate_questions', methods=['POST', 'OPTIONS'])
+async def generate_questions():
+    """
+    Generates educational questions from a youtube video, with the same payload and response as /generate_questions in app.py.
+    """
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:5173')
+        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        return response
+
+    video_url, timestamped, regenerate, error = read_request(await request.get_json())
+    if error:
+        return error
+
+    with metrics.trace() as request_trace:
+        try:
+            questions = None if regenerate else await lookup_questions(extract_youtube_video_id(video_url), timestamped)
+            if questions is None:
+                questions = await run_in_pipeline(generate_questions_for_video, video_url, timestamped, regenerate)
+            response = jsonify(questions)
+        except Exception as e:
+            response = jsonify({"error": str(e)}), 500
+    if metrics.SERVER_TIMING:
+        response = await app.make_response(response)
+        response.headers['Server-Timing'] = request_trace.server_timing()
+    return response
+
+
+@app.route('/generate_questions/stream', methods=['POST'])
+async def stream_questions():
+    """
+    Generates educational questions from a youtube video, streaming them as newline-delimited JSON, with the same payload and events as /generate_questions/stream in app.py.
+    """
+    video_url, timestamped, regenerate, error = read_request(await request.get_json())
+    if error:
+        return error
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    emit = lambda event: loop.call_soon_threadsafe(events.put_nowait, event)
+    task = asyncio.ensure_future(run_in_pipeline(generate_with_events, video_url, timestamped, regenerate, emit))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    async def body():
+        while True:
+            event = await events.get()
+            yield (json.dumps(event) + "\n").encode("utf-8")
+            if event["type"] in ("final", "error"):
+                return
+
+    return Response(body(), mimetype='application/x-ndjson')
+
+
+@app.route('/questions', methods=['DELETE'])
+async def delete_questions():
+    """
+    Invalidates the stored questions for a youtube video, with the same payload and response as DELETE /questions in app.py.
+    """
+    data = await request.get_json()
+    video_id = extract_youtube_video_id(data.get('video_url') or '')
+    if not video_id:
+        return jsonify({"error": "YouTube URL is required"}), 400
+
+    try:
+        deleted = await asyncio.to_thread(invalidate_questions, video_id, data.get('timestamped'))
+        return jsonify({"deleted": deleted})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs', methods=['POST'])
+async def submit_job():
+    """
+    Starts generating educational questions from a youtube video in the background, with the same payload and response as POST /jobs in app.py.
+    """
+    data = await request.get_json()
+    video_url, timestamped, regenerate, error = read_request(data)
+    if error:
+        return error
+    priority = data.get('priority', 'interactive')
+    if priority not in PRIORITY_LEVELS:
+        return jsonify({"error": f"Priority must be one of: {', '.join(PRIORITY_LEVELS)}"}), 400
+
+    try:
+        job_id = await asyncio.to_thread(job_queue.submit, video_url, timestamped, regenerate, PRIORITY_LEVELS[priority])
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """
+    Reports the progress of a job started with POST /jobs, with the same response as GET /jobs/<job_id> in app.py.
+    """
+    job = await asyncio.to_thread(job_queue.store.get, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """
+    Reports the service's metrics in the Prometheus text format, as GET /metrics in app.py does,
+    together with the number of videos waiting for a pipeline thread, the number being processed by one, and the most processed at once.
+    """
+    gauges = metrics.collect_gauges()
+    with pipeline_stats_lock:
+        gauges[("pipeline_queued_videos", ())] = pipeline_stats["queued"]
+        gauges[("pipeline_in_flight_videos", ())] = pipeline_stats["in_flight"]
+        gauges[("pipeline_peak_in_flight_videos", ())] = pipeline_stats["peak_in_flight"]
+    gauges[("pipeline_workers", ())] = PIPELINE_WORKERS
+    return Response(metrics.render_prometheus(gauges, metrics.collect_totals()), mimetype='text/plain; version=0.0.4')
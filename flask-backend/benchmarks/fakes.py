@@ -0,0 +1,360 @@
+"""
+Local stand-ins for the services the pipeline calls, so it can be benchmarked offline and without cost:
+a fake OpenAI client, fixture audio files in place of YouTube downloads, and SQLite in place of the PostgreSQL 'videos' table.
+"""
+import os
+import re
+import json
+import time
+import wave
+import random
+import shutil
+import sqlite3
+import threading
+from types import SimpleNamespace
+from collections import Counter
+from contextlib import contextmanager
+
+import generate_questions
+import generate_transcript
+import pipeline
+import transcription_backends
+import memory_cache
+from chunking import count_tokens
+
+# Whisper returns a segment every few seconds of speech.
+SEGMENT_SECONDS = 6.0
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "te", "vo", "zi", "pa", "do", "fe", "gu", "hi", "ja", "ko"]
+
+
+class FakeRateLimitError(Exception):
+    """
+    Stands in for openai.RateLimitError, which the scheduler recognizes by its status code.
+    """
+
+    status_code = 429
+
+
+class FakeOpenAI:
+    """
+    Answers chat completion and transcription requests like the OpenAI client, after a configurable delay, with synthetic content that passes the pipeline's validation.
+    Chat completions are answered according to the name of the JSON schema in their response_format, so the pipeline must request structured output.
+    Token counts are measured on the actual prompts and responses with chunking.count_tokens.
+
+    Args:
+    latency (float): The mean number of seconds a chat completion takes. Defaults to 0.05.
+    jitter (float): Each chat completion takes up to this many seconds more or less than latency. Defaults to 0.02.
+    transcription_seconds_per_minute (float): The number of seconds a transcription takes per minute of audio. Defaults to 0.02.
+    key_points (int): The number of key points returned for each summary, or fewer if the prompt asks for at most fewer points. Defaults to 8.
+    seed (int): Seeds the synthetic content. Defaults to 0.
+    rate_limit_rate (float): The share of chat completions answered with a rate limit error after the delay. Defaults to 0.
+    seconds_per_completion_token (float): Added to each chat completion's delay for every token in its response, since models generate tokens one at a time. Defaults to 0.
+    """
+
+    def __init__(self, latency = 0.05, jitter = 0.02, transcription_seconds_per_minute = 0.02, key_points = 8, seed = 0, rate_limit_rate = 0.0, seconds_per_completion_token = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.transcription_seconds_per_minute = transcription_seconds_per_minute
+        self.key_points = key_points
+        self.rate_limit_rate = rate_limit_rate
+        self.seconds_per_completion_token = seconds_per_completion_token
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_completion))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create_transcription))
+
+    def usage(self):
+        """
+        Returns a snapshot of the requests and tokens served so far.
+
+        Returns:
+        dict: The number of requests of each kind, and the total prompt and completion tokens.
+        """
+        with self.lock:
+            return {"requests": dict(self.requests), "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
+    def word(self, rng):
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    def sentence(self, rng, words = None):
+        return " ".join(self.word(rng) for _ in range(words or rng.randint(6, 14))).capitalize() + "."
+
+    def question(self, rng):
+        options = [self.sentence(rng, 4)[:-1] for _ in range(4)]
+        return {"question": f"Which of these best describes {self.sentence(rng, 6)[:-1].lower()}?", "options": options, "correct_answer": options[0]}
+
+    def answer(self, schema_name, prompt, rng):
+        limit = re.search(r"at most (\d+) points", prompt)
+        key_points = min(self.key_points, int(limit.group(1))) if limit else self.key_points
+        if schema_name == "key_points":
+            return {"key_points": [self.sentence(rng) for _ in range(key_points)]}
+        if schema_name == "timestamped_key_points":
+            ends = sorted(float(end) for end in re.findall(r'"end": ([\d.]+)', prompt))
+            ends = sorted(rng.sample(ends, min(key_points, len(ends))))
+            return {"key_points": [{"key_point": self.sentence(rng), "timestamp": end} for end in ends]}
+        if schema_name == "question":
+            return self.question(rng)
+        if schema_name == "batch_questions":
+            indices = [int(index) for index in re.findall(r"^(\d+)\. ", prompt, re.MULTILINE)]
+            return {"questions": [dict(self.question(rng), index=index) for index in indices]}
+        if schema_name == "questions":
+            timestamps = re.findall(r"'timestamp': ([\d.]+)", prompt)
+            count = min(15, prompt.count("'question'")) or 1
+            return {"questions": [dict(self.question(rng), timestamp=float(timestamps[i]) if i < len(timestamps) else None) for i in range(count)]}
+        raise ValueError(f"The fake client only answers structured requests, not '{schema_name}'")
+
+    def create_completion(self, model, messages, timeout = None, response_format = None, **options):
+        with self.lock:
+            rng = random.Random(self.random.random())
+            delay = max(0.0, rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+        schema_name = response_format["json_schema"]["name"] if response_format else None
+        prompt = "\n".join(message["content"] for message in messages)
+        content = json.dumps(self.answer(schema_name, messages[-1]["content"], rng))
+        completion_tokens = count_tokens(content)
+        time.sleep(delay + completion_tokens * self.seconds_per_completion_token)
+        if rng.random() < self.rate_limit_rate:
+            with self.lock:
+                self.requests["rate_limited"] += 1
+            raise FakeRateLimitError("Rate limit reached")
+
+        usage = SimpleNamespace(prompt_tokens=count_tokens(prompt), completion_tokens=completion_tokens)
+        with self.lock:
+            self.requests[schema_name] += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def create_transcription(self, model, file, response_format = "json", timestamp_granularities = None, **options):
+        duration = get_duration(file.name)
+        with self.lock:
+            rng = random.Random(self.random.random())
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + SEGMENT_SECONDS, duration)
+            segments.append(SimpleNamespace(start=start, end=end, text=" " + self.sentence(rng)))
+            start = end
+        time.sleep(duration / 60 * self.transcription_seconds_per_minute)
+
+        with self.lock:
+            self.requests["transcription"] += 1
+        if response_format == "text":
+            return "".join(segment.text for segment in segments).strip()
+        return SimpleNamespace(segments=segments)
+
+
+def get_duration(path):
+    """
+    Returns the duration of an audio file in seconds, reading WAV headers directly and using ffprobe for other formats.
+
+    Args:
+    path (str): The path to the audio file.
+
+    Returns:
+    float: The duration in seconds.
+    """
+    if path.endswith(".wav"):
+        with wave.open(path, "rb") as audio:
+            return audio.getnframes() / audio.getframerate()
+    return generate_transcript.get_audio_duration_ms(path) / 1000
+
+
+def make_fixture(path, minutes, sample_rate = 8000):
+    """
+    Writes a silent mono 8-bit WAV file, unless it already exists. At the default sample rate, files longer than about 52 minutes exceed Whisper's 25 MB limit and are split.
+
+    Args:
+    path (str): Where to write the file.
+    minutes (float): The duration of the audio.
+    sample_rate (int): The number of samples per second. Defaults to 8000.
+
+    Returns:
+    str: The path.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frames = int(minutes * 60 * sample_rate)
+    with wave.open(path + ".part", "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(1)
+        audio.setframerate(sample_rate)
+        block = b"\x80" * sample_rate * 60
+        for _ in range(frames // len(block)):
+            audio.writeframes(block)
+        audio.writeframes(block[:frames % len(block)])
+    os.replace(path + ".part", path)
+    return path
+
+
+class FakeDownloader:
+    """
+    Stands in for download_audio by copying a fixture audio file into the download directory.
+    Each video ID is mapped to a fixture by its prefix, the part before the first '-', so many distinct videos can share one fixture.
+
+    Args:
+    fixtures (dict): Maps each video ID prefix to the path of its fixture audio file.
+    """
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.lock = threading.Lock()
+        self.downloads = 0
+
+    def __call__(self, youtube_url, output_dir = None, fast = None):
+        video_id = generate_transcript.extract_youtube_video_id(youtube_url)
+        fixture = self.fixtures[video_id.split("-")[0]]
+        path = os.path.join(output_dir or os.getcwd(), video_id + os.path.splitext(fixture)[1])
+        shutil.copyfile(fixture, path)
+        with self.lock:
+            self.downloads += 1
+        return os.path.abspath(path)
+
+
+class SQLiteCursor:
+    """
+    Runs the PostgreSQL queries used for the 'videos' table against SQLite, converting %s placeholders and adapted parameters such as psycopg2.Binary.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cursor.close()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def execute(self, query, values = ()):
+        values = tuple(getattr(value, "adapted", value) for value in values)
+        self.cursor.execute(query.replace("%s", "?"), values)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+
+class SQLiteConnection:
+    """
+    Wraps a SQLite connection with the parts of the psycopg2 connection interface used for the 'videos' table.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self):
+        return SQLiteCursor(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+
+class SQLiteVideos:
+    """
+    A SQLite database with the 'videos' table, used in place of the PostgreSQL 'youtube_transcripts' database.
+
+    Args:
+    path (str): The path to the SQLite database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(path) as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    youtube_video_id TEXT PRIMARY KEY,
+                    transcript TEXT,
+                    timed_transcript TEXT,
+                    timed_transcript_data BLOB
+                )
+            """)
+
+    @contextmanager
+    def get_connection(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield SQLiteConnection(connection)
+        finally:
+            connection.close()
+
+
+class MemoryQuestionStore:
+    """
+    Stands in for the 'question_sets' table used by pipeline.py, keeping finished questions in a dictionary.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.questions = {}
+
+    def get(self, youtube_video_id, timestamped):
+        with self.lock:
+            return self.questions.get((youtube_video_id, timestamped))
+
+    def store(self, youtube_video_id, timestamped, questions):
+        with self.lock:
+            self.questions[(youtube_video_id, timestamped)] = questions
+
+
+local_locks = {}
+local_locks_lock = threading.Lock()
+
+
+@contextmanager
+def local_advisory_lock(key):
+    """
+    Stands in for single_flight.advisory_lock with a lock held within this process.
+    """
+    with local_locks_lock:
+        lock = local_locks.setdefault(key, threading.Lock())
+    with lock:
+        yield
+
+
+@contextmanager
+def offline(client, downloader, videos, max_file_size_mb = 25):
+    """
+    Points the pipeline at the fake client, downloader, SQLite database, and an in-memory question store while the block runs, and restores it afterwards.
+    Captions are turned off so every video is downloaded and transcribed, and structured output is turned on, since the fake client only answers structured requests.
+
+    Args:
+    client (FakeOpenAI): Answers chat completion and transcription requests.
+    downloader (FakeDownloader): Provides the audio for each video.
+    videos (SQLiteVideos): Stores the transcripts.
+    max_file_size_mb (float): The upload limit of the fake hosted Whisper backend, above which audio is split. Defaults to 25.
+    """
+    backend = transcription_backends.OpenAIWhisperBackend()
+    backend.max_file_size_mb = max_file_size_mb
+    question_store = MemoryQuestionStore()
+    replacements = [
+        (generate_questions, "client", client),
+        (generate_questions, "STRUCTURED_OUTPUT", True),
+        (transcription_backends, "OpenAI", lambda **options: client),
+        (transcription_backends, "backend", backend),
+        (generate_transcript, "download_audio", downloader),
+        (generate_transcript, "USE_CAPTIONS", False),
+        (generate_transcript, "get_connection", videos.get_connection),
+        (generate_transcript, "advisory_lock", local_advisory_lock),
+        (pipeline, "get_cached_questions", question_store.get),
+        (pipeline, "store_questions", question_store.store),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in replacements]
+    for module, name, value in replacements:
+        setattr(module, name, value)
+    memory_cache.transcripts.clear()
+    try:
+        yield
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+        memory_cache.transcripts.clear()
@@ -0,0 +1,78 @@
+"""
+Splits one audio file into Whisper-sized chunks and reports the time it took, the peak memory of this process, and the peak memory of
+the largest process taking part, this one or an ffmpeg process it started, as JSON on stdout.
+Run by the 'split_audio' experiment in run_benchmarks.py, once per variant, in a fresh process each time, so the peak memory of
+this process and of the ffmpeg processes it starts belongs to that variant alone.
+
+Variants:
+    ffmpeg: the current split_audio, which cuts each chunk by time range with ffmpeg stream copy.
+    pydub:  the implementation split_audio replaced, which decodes the whole file with pydub's AudioSegment.from_mp3 and
+            exports each chunk as MP3. It needs pydub, which the backend no longer depends on.
+
+Usage:
+    python benchmarks/measure_split.py ffmpeg /path/to/audio.mp3 /path/to/output_dir
+"""
+import os
+import sys
+import json
+import time
+import resource
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The backend's modules create their OpenAI clients at import time, but nothing here calls the API.
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+# Imported by both variants, so the memory of the imports is counted the same way in each.
+from generate_transcript import CHUNK_DURATION_MS, OVERLAP_DURATION_MS, split_audio
+
+
+def split_audio_with_pydub(absolute_path_to_file, output_dir, chunk_duration_ms = CHUNK_DURATION_MS, overlap_duration_ms = OVERLAP_DURATION_MS):
+    """
+    Splits an audio file the way split_audio did before it used ffmpeg stream copy: the whole file is decoded into memory, and each chunk is re-encoded as MP3.
+
+    Args:
+    absolute_path_to_file (str): Path to the input MP3 file.
+    output_dir (str): The directory the chunks are written to.
+    chunk_duration_ms (int): Duration of each chunk in milliseconds. Defaults to CHUNK_DURATION_MS.
+    overlap_duration_ms (int): Duration of overlap between chunks in milliseconds. Defaults to OVERLAP_DURATION_MS.
+
+    Returns:
+    list of str: a list of absolute paths to the saved chunk files.
+    """
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_mp3(absolute_path_to_file)
+    video_length_ms = len(audio)
+    num_chunks = video_length_ms // chunk_duration_ms + (1 if video_length_ms % chunk_duration_ms else 0)
+    output_files = []
+    for i in range(num_chunks):
+        start_time = i * (chunk_duration_ms - overlap_duration_ms)
+        end_time = start_time + chunk_duration_ms if start_time + chunk_duration_ms <= video_length_ms else video_length_ms
+        chunk = audio[start_time:end_time]
+        output_file = os.path.join(output_dir, f"chunk_{i+1}.mp3")
+        chunk.export(output_file, format="mp3")
+        output_files.append(os.path.abspath(output_file))
+    return output_files
+
+
+def main(variant, path, output_dir):
+    started = time.monotonic()
+    if variant == "pydub":
+        chunks = split_audio_with_pydub(path, output_dir)
+    else:
+        chunks = split_audio(path, output_dir=output_dir)
+    seconds = time.monotonic() - started
+    # On Linux, ru_maxrss is in kilobytes. RUSAGE_CHILDREN covers the ffmpeg processes this process started and waited for, but a child
+    # started with vfork is also charged this process's memory at the time, so only the larger of the two is a meaningful peak.
+    python_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({
+        "chunks": len(chunks),
+        "seconds": seconds,
+        "peak_python_rss_mb": python_rss / 1024,
+        "peak_rss_mb": max(python_rss, children_rss) / 1024,
+    }))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
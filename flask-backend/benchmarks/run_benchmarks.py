@@ -0,0 +1,555 @@
+"""
+Benchmarks the transcript and question pipeline end to end without network access or API costs, using the stand-ins in fakes.py.
+
+Each scenario runs get_transcript and get_questions for a number of distinct videos made from the same fixture audio, and reports
+throughput, p50 and p95 latency, peak traced Python memory, LLM requests and tokens, and the mean time spent in each stage.
+Further experiments measure specific optimizations: LLM concurrency, request prioritization under rate limits, overlap deduplication, audio splitting, single-flight
+deduplication of identical requests, local versus LLM cleaning, batched question generation, token-aware chunking, and how soon
+incremental generation has timed questions ready, and load test the async server in async_app.py against a threaded server.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scenarios short timestamped --iterations 10 --concurrency 4 --latency 0.2
+    python benchmarks/run_benchmarks.py --experiments batching cleaning --json results.json
+
+Fixture audio is written to benchmarks/fixtures the first time it is needed. The 'long' scenario and the 'split_audio' experiment
+split audio with ffmpeg, and are skipped if it is not installed. The 'split_audio' experiment also compares against the pydub splitter
+it replaced if pydub is installed. The 'async_load' experiment needs the async server's dependencies.
+
+Token counts use chunking's character estimate by default, even if tiktoken is installed. tiktoken downloads its tokenizer data
+on first use, which needs network access, and results that depend on whether that data happens to be cached cannot be compared
+between machines. Pass --tokenizer tiktoken to count real tokens on a machine that has the data cached or can download it.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import importlib.util
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The backend's modules create their OpenAI clients at import time, but the benchmarks answer every call to the API with the stand-ins in fakes.py.
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import metrics
+import chunking
+import scheduler
+import generate_questions
+import generate_transcript
+import pipeline
+from pipeline import generate_questions_for_video, generate_with_events
+from generate_questions import get_questions, create_questions_from_points, split_transcript, split_timestamped_transcript
+from generate_transcript import get_transcript, stitch_texts
+from timed_transcript import TimedTranscript
+from chunking import count_tokens
+from fakes import FakeOpenAI, FakeDownloader, SQLiteVideos, make_fixture, offline
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# The minutes of audio in each scenario's fixture, and whether its questions are timestamped.
+# The long fixture is larger than Whisper's 25 MB limit, so it is split into chunks.
+SCENARIOS = {
+    "short": {"minutes": 10, "timestamped": False},
+    "long": {"minutes": 90, "timestamped": False},
+    "timestamped": {"minutes": 20, "timestamped": True},
+}
+EXPERIMENTS = ["concurrency", "scheduler", "overlap_dedupe", "split_audio", "single_flight", "cleaning", "batching", "chunker", "incremental", "async_load"]
+NEEDS_FFMPEG = {"long", "split_audio"}
+
+
+def percentile(values, fraction):
+    """
+    Returns a percentile of a list of values, by the nearest-rank method.
+
+    Args:
+    values (list of float): The values.
+    fraction (float): The percentile as a fraction, such as 0.95.
+
+    Returns:
+    float: The percentile, or 0.0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def stage_means():
+    """
+    Returns the mean number of seconds spent in each stage, from the 'stage_duration_seconds' histogram in metrics.
+
+    Returns:
+    dict: The mean seconds of each stage.
+    """
+    with metrics.lock:
+        return {
+            dict(labels)["stage"]: histogram["sum"] / histogram["count"]
+            for (name, labels), histogram in metrics.histograms.items()
+            if name == "stage_duration_seconds" and histogram["count"]
+        }
+
+
+def fixture(name):
+    return make_fixture(os.path.join(FIXTURE_DIR, f"{name}.wav"), SCENARIOS[name]["minutes"])
+
+
+def synthetic_text(words, seed = 0):
+    """
+    Generates a transcript of random sentences.
+
+    Args:
+    words (int): The approximate number of words.
+    seed (int): Seeds the text. Defaults to 0.
+
+    Returns:
+    str: The transcript.
+    """
+    rng = random.Random(seed)
+    client = FakeOpenAI()
+    sentences = []
+    total = 0
+    while total < words:
+        sentence = client.sentence(rng)
+        sentences.append(sentence)
+        total += sentence.count(" ") + 1
+    return " ".join(sentences)
+
+
+def synthetic_timed_transcript(minutes, seed = 0):
+    """
+    Generates a timestamped transcript of random sentences, with a segment every six seconds.
+
+    Args:
+    minutes (float): The duration of the transcript.
+    seed (int): Seeds the text. Defaults to 0.
+
+    Returns:
+    TimedTranscript: The transcript.
+    """
+    rng = random.Random(seed)
+    client = FakeOpenAI()
+    return TimedTranscript.from_dicts(
+        {"start": i * 6.0, "end": (i + 1) * 6.0, "text": " " + client.sentence(rng)}
+        for i in range(int(minutes * 10))
+    )
+
+
+def run_scenario(name, iterations, concurrency, latency, work_dir):
+    """
+    Transcribes and generates questions for `iterations` distinct videos made from a scenario's fixture, `concurrency` at a time.
+
+    Args:
+    name (str): The name of the scenario in SCENARIOS.
+    iterations (int): The number of videos.
+    concurrency (int): The number of videos processed at the same time.
+    latency (float): The mean seconds a chat completion takes.
+    work_dir (str): A directory for the scenario's SQLite database.
+
+    Returns:
+    dict: The scenario's results.
+    """
+    timestamped = SCENARIOS[name]["timestamped"]
+    client = FakeOpenAI(latency=latency)
+    downloader = FakeDownloader({name: fixture(name)})
+    videos = SQLiteVideos(os.path.join(work_dir, f"{name}.sqlite3"))
+    latencies = []
+    failures = 0
+    questions = 0
+    lock = threading.Lock()
+
+    def run_once(i):
+        nonlocal failures, questions
+        started = time.monotonic()
+        try:
+            transcript = get_transcript(f"https://www.youtube.com/watch?v={name}-{i}", timestamped)
+            if not transcript:
+                raise ValueError("No transcript")
+            generated = get_questions(transcript, timestamped)
+            with lock:
+                latencies.append(time.monotonic() - started)
+                questions += len(generated)
+        except Exception as e:
+            print(f"  {name} run {i} failed: {e}")
+            with lock:
+                failures += 1
+
+    metrics.reset()
+    tracemalloc.reset_peak()
+    started = time.monotonic()
+    with offline(client, downloader, videos):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(run_once, range(iterations)))
+    elapsed = time.monotonic() - started
+    usage = client.usage()
+
+    return {
+        "scenario": name,
+        "minutes": SCENARIOS[name]["minutes"],
+        "timestamped": timestamped,
+        "runs": iterations,
+        "failures": failures,
+        "seconds": elapsed,
+        "throughput_per_minute": len(latencies) / elapsed * 60 if elapsed else 0.0,
+        "p50_seconds": percentile(latencies, 0.5),
+        "p95_seconds": percentile(latencies, 0.95),
+        "peak_traced_mb": tracemalloc.get_traced_memory()[1] / 2**20,
+        "questions_per_run": questions / max(len(latencies), 1),
+        "llm_requests": sum(count for kind, count in usage["requests"].items() if kind != "transcription"),
+        "transcription_requests": usage["requests"].get("transcription", 0),
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "stage_seconds": stage_means(),
+    }
+
+
+def experiment_concurrency(latency, work_dir):
+    """
+    Compares get_questions on a long transcript with one LLM request in flight at a time against the default MAX_IN_FLIGHT_LLM_REQUESTS.
+    """
+    transcript = synthetic_text(60_000)
+    client = FakeOpenAI(latency=latency)
+    results = {}
+    with offline(client, FakeDownloader({}), SQLiteVideos(os.path.join(work_dir, "concurrency.sqlite3"))):
+        for label, limit in (("sequential", 1), ("concurrent", scheduler.MAX_IN_FLIGHT_LLM_REQUESTS)):
+            generate_questions.chat_scheduler = scheduler.RateLimitScheduler("chat", limit)
+            started = time.monotonic()
+            try:
+                get_questions(transcript, False)
+            finally:
+                generate_questions.chat_scheduler = scheduler.chat_scheduler
+            results[f"{label}_seconds"] = time.monotonic() - started
+    results["speedup"] = results["sequential_seconds"] / results["concurrent_seconds"]
+    return results
+
+
+def experiment_scheduler(latency, work_dir, background = 4, rate_limit_rate = 0.1):
+    """
+    Times an interactive request for questions made while background requests for long transcripts fill the chat scheduler's queue,
+    with the background requests at the same priority and at BACKGROUND priority. The fake client answers a share of requests with
+    rate limit errors, which are retried with backoff.
+    """
+    long_transcript = synthetic_text(60_000)
+    short_transcript = synthetic_text(10_000)
+    results = {}
+    for label, level in (("fifo", scheduler.INTERACTIVE), ("prioritized", scheduler.BACKGROUND)):
+        client = FakeOpenAI(latency=latency, rate_limit_rate=rate_limit_rate)
+        chat_scheduler = scheduler.RateLimitScheduler("chat", 4, base_delay=latency, max_delay=latency * 8)
+        generate_questions.chat_scheduler = chat_scheduler
+
+        def run_background(_):
+            with scheduler.priority(level):
+                return get_questions(long_transcript, False)
+
+        try:
+            with offline(client, FakeDownloader({}), SQLiteVideos(os.path.join(work_dir, "scheduler.sqlite3"))):
+                with ThreadPoolExecutor(max_workers=background) as executor:
+                    futures = [executor.submit(run_background, i) for i in range(background)]
+                    while sum(chat_scheduler.stats()["queued"].values()) < background and not all(future.done() for future in futures):
+                        time.sleep(latency / 10)
+                    started = time.monotonic()
+                    get_questions(short_transcript, False)
+                    interactive_seconds = time.monotonic() - started
+                    for future in futures:
+                        future.result()
+        finally:
+            generate_questions.chat_scheduler = scheduler.chat_scheduler
+        stats = chat_scheduler.stats()
+        results[label] = {"interactive_seconds": interactive_seconds, "retries": stats["retries"], "rate_limited": stats["rate_limited"]}
+    results["interactive_speedup"] = results["fifo"]["interactive_seconds"] / results["prioritized"]["interactive_seconds"]
+    return results
+
+
+def experiment_overlap_dedupe(latency, work_dir):
+    """
+    Measures the tokens saved by removing the text repeated in the overlap between consecutive audio chunks of a three-hour transcript.
+    """
+    words = synthetic_text(3 * 60 * 150).split(" ")
+    words_per_second = 150 / 60
+    step = int((generate_transcript.CHUNK_DURATION_MS - generate_transcript.OVERLAP_DURATION_MS) / 1000 * words_per_second)
+    length = int(generate_transcript.CHUNK_DURATION_MS / 1000 * words_per_second)
+    chunks = [" ".join(words[start:start + length]) for start in range(0, len(words), step)]
+
+    naive_tokens = count_tokens(" ".join(chunks))
+    started = time.monotonic()
+    stitched = stitch_texts(chunks)
+    stitch_seconds = time.monotonic() - started
+    stitched_tokens = count_tokens(stitched)
+    return {
+        "chunks": len(chunks),
+        "naive_tokens": naive_tokens,
+        "stitched_tokens": stitched_tokens,
+        "original_tokens": count_tokens(" ".join(words)),
+        "tokens_saved": naive_tokens - stitched_tokens,
+        "stitch_seconds": stitch_seconds,
+    }
+
+
+def experiment_split_audio(latency, work_dir):
+    """
+    Compares the time and peak memory of splitting the long fixture, encoded as MP3 like downloaded audio, with the current ffmpeg stream copy
+    and with the pydub decode and re-encode it replaced. Each variant runs in a fresh process started by measure_split.py, so the peak memory
+    of that process and of its ffmpeg processes is not mixed up with the rest of the benchmark. The pydub variant is skipped if pydub is not installed.
+    """
+    path = os.path.join(FIXTURE_DIR, "long.mp3")
+    if not os.path.exists(path):
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", fixture("long"), "-c:a", "libmp3lame", "-b:a", "64k", path], check=True)
+
+    results = {"input_mb": os.path.getsize(path) / 2**20}
+    for variant in ("ffmpeg", "pydub"):
+        if variant == "pydub" and importlib.util.find_spec("pydub") is None:
+            results[variant] = {"skipped": "pydub is not installed"}
+            continue
+        output_dir = tempfile.mkdtemp(prefix=f"split_{variant}_", dir=work_dir)
+        process = subprocess.run(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "measure_split.py"), variant, path, output_dir],
+            capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            results[variant] = {"failed": process.stderr.strip().splitlines()[-1:]}
+            continue
+        results[variant] = json.loads(process.stdout.strip().splitlines()[-1])
+    return results
+
+
+def experiment_single_flight(latency, work_dir, requests = 20):
+    """
+    Sends many identical transcript requests at once and counts how many times the video is downloaded and transcribed.
+    """
+    client = FakeOpenAI(latency=latency)
+    downloader = FakeDownloader({"short": fixture("short")})
+    barrier = threading.Barrier(requests)
+
+    def request(_):
+        barrier.wait()
+        return get_transcript("https://www.youtube.com/watch?v=short-shared", False)
+
+    with offline(client, downloader, SQLiteVideos(os.path.join(work_dir, "single_flight.sqlite3"))):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=requests) as executor:
+            transcripts = list(executor.map(request, range(requests)))
+    return {
+        "requests": requests,
+        "succeeded": sum(1 for transcript in transcripts if transcript),
+        "downloads": downloader.downloads,
+        "transcriptions": client.usage()["requests"].get("transcription", 0),
+        "seconds": time.monotonic() - started,
+    }
+
+
+def experiment_cleaning(latency, work_dir):
+    """
+    Compares cleaning questions locally with filter_questions against also cleaning them with the model, in time and tokens.
+    """
+    transcript = synthetic_text(20_000)
+    results = {}
+    for label, use_llm_cleaning in (("local", False), ("llm", True)):
+        client = FakeOpenAI(latency=latency)
+        with offline(client, FakeDownloader({}), SQLiteVideos(os.path.join(work_dir, "cleaning.sqlite3"))):
+            metrics.reset()
+            get_questions(transcript, False, use_llm_cleaning=use_llm_cleaning)
+            stages = stage_means()
+        usage = client.usage()
+        results[label] = {
+            "cleaning_seconds": stages.get("filter_questions", 0.0) + stages.get("clean_questions", 0.0),
+            "cleaning_requests": usage["requests"].get("questions", 0),
+            "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+        }
+    results["tokens_saved"] = results["llm"]["total_tokens"] - results["local"]["total_tokens"]
+    return results
+
+
+def experiment_batching(latency, work_dir, points = 40):
+    """
+    Compares the tokens and requests per question when generating one question per request against the default batch size.
+    """
+    rng = random.Random(0)
+    key_points = [FakeOpenAI().sentence(rng) for _ in range(points)]
+    results = {}
+    for label, batch_size in (("per_point", 1), ("batched", generate_questions.QUESTION_BATCH_SIZE)):
+        client = FakeOpenAI(latency=latency)
+        with offline(client, FakeDownloader({}), SQLiteVideos(os.path.join(work_dir, "batching.sqlite3"))):
+            started = time.monotonic()
+            questions = [question for question in create_questions_from_points(key_points, False, batch_size=batch_size) if question]
+        usage = client.usage()
+        results[label] = {
+            "batch_size": batch_size,
+            "questions": len(questions),
+            "requests": sum(usage["requests"].values()),
+            "tokens_per_question": (usage["prompt_tokens"] + usage["completion_tokens"]) / max(len(questions), 1),
+            "seconds": time.monotonic() - started,
+        }
+    return results
+
+
+def experiment_chunker(latency, work_dir, hours = 4):
+    """
+    Measures token-aware chunking of multi-hour text and timestamped transcripts.
+    """
+    text = synthetic_text(hours * 60 * 150)
+    timed = synthetic_timed_transcript(hours * 60)
+    results = {"hours": hours, "text_tokens": count_tokens(text)}
+    for label, split, transcript in (("text", split_transcript, text), ("timestamped", split_timestamped_transcript, timed)):
+        started = time.monotonic()
+        chunks = split(transcript)
+        results[label] = {"chunks": len(chunks), "seconds": time.monotonic() - started}
+    return results
+
+
+def experiment_incremental(latency, work_dir, minutes = 60, seconds_per_completion_token = 0.0005):
+    """
+    Streams timestamped questions for a video whose transcript is stored, generating them from the whole transcript and window by window,
+    and compares how soon the first timed question is ready with how far playback has covered the video by then.
+    Completions take longer the more tokens they return, so summarizing a short window is faster than summarizing the whole video.
+    Windows of audio are transcribed the same way, but splitting them needs ffmpeg, so only question generation is measured here.
+    """
+    transcript = synthetic_timed_transcript(minutes)
+    url = "https://www.youtube.com/watch?v=incremental-stored"
+    results = {"video_seconds": minutes * 60}
+    for label, incremental in (("full", False), ("incremental", True)):
+        client = FakeOpenAI(latency=latency, seconds_per_completion_token=seconds_per_completion_token)
+        events = []
+        emit = lambda event: events.append((time.monotonic() - started, event))
+        original = pipeline.INCREMENTAL_QUESTIONS
+        pipeline.INCREMENTAL_QUESTIONS = incremental
+        try:
+            with offline(client, FakeDownloader({}), SQLiteVideos(os.path.join(work_dir, f"incremental_{label}.sqlite3"))):
+                generate_transcript.store_transcript("incremental-stored", True, transcript)
+                started = time.monotonic()
+                generate_with_events(url, True, True, emit)
+        finally:
+            pipeline.INCREMENTAL_QUESTIONS = original
+
+        question_times = [seconds for seconds, event in events if event["type"] == "question"]
+        ready = [(seconds, event) for seconds, event in events if event["type"] in ("window", "final")]
+        first_ready_seconds, first_ready = ready[0]
+        final = next(event for _, event in events if event["type"] in ("final", "error"))
+        results[label] = {
+            "first_question_seconds": min(question_times) if question_times else None,
+            "first_ready_seconds": first_ready_seconds,
+            "first_ready_until": first_ready.get("end", minutes * 60),
+            "windows": sum(1 for _, event in events if event["type"] == "window"),
+            "total_seconds": events[-1][0],
+            "questions": len(final.get("questions", [])),
+            "completion_tokens": client.usage()["completion_tokens"],
+        }
+    results["first_ready_speedup"] = results["full"]["first_ready_seconds"] / results["incremental"]["first_ready_seconds"]
+    return results
+
+
+def experiment_async_load(latency, work_dir, requests = 48, sync_threads = 8):
+    """
+    Sends requests for many distinct videos at once, both to the async server through its test client and to a pool of
+    sync_threads threads, as a threaded server with that many workers would handle them, and compares how long they take.
+    Both run the same blocking pipeline in threads, so the difference measures PIPELINE_WORKERS threads against sync_threads,
+    which the async server can afford because waiting requests do not hold threads, rather than asynchronous I/O.
+    """
+    try:
+        import async_app
+    except ImportError as e:
+        return {"skipped": f"the async server's dependencies are not installed: {e}"}
+
+    async def send_all(test_client):
+        async def send(i):
+            started = time.monotonic()
+            response = await test_client.post("/generate_questions", json={"video_url": f"https://www.youtube.com/watch?v=short-async-{i}", "timestamped": False})
+            if response.status_code != 200:
+                raise RuntimeError(f"Request {i} failed with status {response.status_code}")
+            return time.monotonic() - started
+        return await asyncio.gather(*(send(i) for i in range(requests)))
+
+    def send_sync(i, submitted):
+        generate_questions_for_video(f"https://www.youtube.com/watch?v=short-sync-{i}", False)
+        return time.monotonic() - submitted
+
+    results = {"requests": requests, "pipeline_workers": async_app.PIPELINE_WORKERS, "sync_threads": sync_threads}
+    client = FakeOpenAI(latency=latency)
+    downloader = FakeDownloader({"short": fixture("short")})
+    with offline(client, downloader, SQLiteVideos(os.path.join(work_dir, "async_load.sqlite3"))):
+        started = time.monotonic()
+        latencies = asyncio.run(send_all(async_app.app.test_client()))
+        results["async"] = {
+            "seconds": time.monotonic() - started,
+            "p50_seconds": percentile(latencies, 0.5),
+            "p95_seconds": percentile(latencies, 0.95),
+            "peak_in_flight_videos": async_app.pipeline_stats["peak_in_flight"],
+        }
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=sync_threads) as executor:
+            latencies = list(executor.map(lambda i: send_sync(i, started), range(requests)))
+        results["threaded"] = {
+            "seconds": time.monotonic() - started,
+            "p50_seconds": percentile(latencies, 0.5),
+            "p95_seconds": percentile(latencies, 0.95),
+            "peak_in_flight_videos": min(requests, sync_threads),
+        }
+    return results
+
+
+def print_results(scenarios, experiments):
+    if scenarios:
+        print(f"\n{'scenario':<12} {'runs':>5} {'fail':>5} {'per min':>8} {'p50':>8} {'p95':>8} {'peak MB':>8} {'LLM req':>8} {'tokens':>9}")
+        for result in scenarios:
+            print(
+                f"{result['scenario']:<12} {result['runs']:>5} {result['failures']:>5} {result['throughput_per_minute']:>8.1f} "
+                f"{result['p50_seconds']:>7.2f}s {result['p95_seconds']:>7.2f}s {result['peak_traced_mb']:>8.1f} "
+                f"{result['llm_requests']:>8} {result['prompt_tokens'] + result['completion_tokens']:>9}"
+            )
+            print("  mean stage seconds: " + ", ".join(f"{stage} {seconds:.3f}" for stage, seconds in sorted(result["stage_seconds"].items())))
+    for name, result in experiments.items():
+        print(f"\n{name}: {json.dumps(result, indent=4)}")
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against fake OpenAI, YouTube, and database stand-ins.")
+    parser.add_argument("--scenarios", nargs="*", choices=list(SCENARIOS), default=list(SCENARIOS), help="The scenarios to run. Defaults to all.")
+    parser.add_argument("--experiments", nargs="*", choices=EXPERIMENTS, default=EXPERIMENTS, help="The experiments to run. Defaults to all.")
+    parser.add_argument("--iterations", type=int, default=5, help="The number of videos in each scenario. Defaults to 5.")
+    parser.add_argument("--concurrency", type=int, default=2, help="The number of videos processed at the same time. Defaults to 2.")
+    parser.add_argument("--latency", type=float, default=0.05, help="The mean seconds a fake chat completion takes. Defaults to 0.05.")
+    parser.add_argument("--tokenizer", choices=["estimate", "tiktoken"], default="estimate", help="How tokens are counted: estimated from characters, or with tiktoken if it is installed. Defaults to estimate.")
+    parser.add_argument("--json", help="A file to write the results to as JSON.")
+    args = parser.parse_args(argv)
+
+    if args.tokenizer == "estimate":
+        chunking.get_encoding = lambda: None
+
+    has_ffmpeg = shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+    skipped = [name for name in args.scenarios + args.experiments if name in NEEDS_FFMPEG and not has_ffmpeg]
+    if skipped:
+        print(f"ffmpeg is not installed, skipping: {', '.join(skipped)}")
+
+    work_dir = tempfile.mkdtemp(prefix="benchmarks_")
+    tracemalloc.start()
+    try:
+        scenarios = []
+        for name in args.scenarios:
+            if name not in skipped:
+                print(f"Running scenario {name}...")
+                scenarios.append(run_scenario(name, args.iterations, args.concurrency, args.latency, work_dir))
+        experiments = {}
+        for name in args.experiments:
+            if name not in skipped:
+                print(f"Running experiment {name}...")
+                experiments[name] = globals()[f"experiment_{name}"](args.latency, work_dir)
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(scenarios, experiments)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"scenarios": scenarios, "experiments": experiments}, file, indent=4)
+    return 1 if any(result["failures"] for result in scenarios) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import re
+import types
+import urllib.request
+import yt_dlp
+
+CAPTION_LANGUAGES = ("en",)
+CUE_TIMING = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})\s+-->\s+(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})")
+CUE_TAG = re.compile(r"<[^>]+>")
+
+# Automatic captions contain short cues, a few milliseconds long, that only repeat the previous line while the display scrolls.
+MIN_CUE_DURATION = 0.05
+
+
+def parse_timestamp(hours, minutes, seconds, milliseconds):
+    """
+    Converts the parts of a WebVTT timestamp to seconds.
+
+    Args:
+    hours (str): The hours, or None if the timestamp has no hours.
+    minutes (str): The minutes.
+    seconds (str): The seconds.
+    milliseconds (str): The milliseconds.
+
+    Returns:
+    float: The timestamp in seconds.
+    """
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000
+
+
+def parse_vtt(content):
+    """
+    Parses a WebVTT subtitle file into transcription segments.
+    Inline tags are removed, and lines repeated from the previous cue, as in YouTube's rolling automatic captions, are kept once.
+
+    Args:
+    content (str): The contents of a WebVTT file.
+
+    Returns:
+    list of SimpleNamespace: The segments, in order, each with `start` and `end` times in seconds and its `text`, matching the segments returned by Whisper.
+
+    Example:
+    >>> parse_vtt('WEBVTT\\n\\n00:00:01.000 --> 00:00:04.000\\nHello there.\\n')
+    [namespace(start=1.0, end=4.0, text='Hello there.')]
+    """
+    segments = []
+    previous_lines = []
+    for block in re.split(r"\n{2,}", content.replace("\r\n", "\n")):
+        lines = block.strip().split("\n")
+        timing_index = next((i for i, line in enumerate(lines) if CUE_TIMING.search(line)), None)
+        if timing_index is None:
+            continue
+
+        timing = CUE_TIMING.search(lines[timing_index]).groups()
+        start, end = parse_timestamp(*timing[:4]), parse_timestamp(*timing[4:])
+        cue_lines = [CUE_TAG.sub("", line).strip() for line in lines[timing_index + 1:]]
+        cue_lines = [line for line in cue_lines if line]
+        if end - start < MIN_CUE_DURATION:
+            continue
+
+        new_lines = [line for line in cue_lines if line not in previous_lines]
+        previous_lines = cue_lines
+        if new_lines:
+            segments.append(types.SimpleNamespace(start=start, end=end, text=" ".join(new_lines)))
+    return segments
+
+
+def find_caption_url(info, languages = CAPTION_LANGUAGES):
+    """
+    Finds the URL of a WebVTT caption track in the metadata yt-dlp extracted for a video, preferring manual subtitles over automatic captions.
+
+    Args:
+    info (dict): The video's metadata, as returned by yt_dlp.YoutubeDL.extract_info.
+    languages (tuple of str): The accepted language codes, in order of preference. Regional variants such as 'en-US' also match. Defaults to ('en',).
+
+    Returns:
+    str: The URL of the caption track, or None if the video has no caption track in an accepted language.
+    """
+    for tracks in (info.get("subtitles") or {}, info.get("automatic_captions") or {}):
+        for language in languages:
+            for track_language, formats in tracks.items():
+                if track_language != language and not track_language.startswith(language + "-"):
+                    continue
+                for caption_format in formats:
+                    if caption_format.get("ext") == "vtt":
+                        return caption_format["url"]
+    return None
+
+
+def get_caption_segments(youtube_url, languages = CAPTION_LANGUAGES):
+    """
+    Fetches a YouTube video's own captions, without downloading the video or its audio.
+
+    Args:
+    youtube_url (str): The URL of the YouTube video.
+    languages (tuple of str): The accepted language codes, in order of preference. Defaults to ('en',).
+
+    Returns:
+    list of SimpleNamespace: The caption segments, each with `start`, `end`, and `text`, or None if the video has no usable caption track or an error occurred.
+    """
+    ydl_opts = {"skip_download": True, "quiet": True}
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=False)
+        caption_url = find_caption_url(info, languages)
+        if not caption_url:
+            return None
+        with urllib.request.urlopen(caption_url, timeout=30) as response:
+            content = response.read().decode("utf-8")
+        segments = parse_vtt(content)
+        return segments if segments else None
+    except yt_dlp.DownloadError as e:
+        print(f"Could not fetch captions: {e}")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred while fetching captions: {e}")
+        return None
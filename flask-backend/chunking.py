@@ -0,0 +1,155 @@
+import os
+import re
+import json
+from functools import lru_cache
+
+# gpt-4o has a 128k token context window, and each chunk shares it with the summarization prompt and the model's response.
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "25000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+TOKENIZER_MODEL = "gpt-4o"
+
+# Used to estimate token counts when tiktoken is not installed or its tokenizer cannot be loaded.
+CHARACTERS_PER_TOKEN = 4
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Loads the tokenizer used by TOKENIZER_MODEL the first time it is needed.
+    tiktoken downloads a tokenizer's data the first time it is used, so loading fails without network access unless the data is already cached.
+    A failure is reported once and remembered, so later calls do not try the download again.
+
+    Returns:
+    tiktoken.Encoding: The tokenizer, or None if tiktoken is not installed or the tokenizer could not be loaded, in which case token counts are estimated from character counts.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Could not load the {TOKENIZER_MODEL} tokenizer, estimating token counts from character counts instead: {e}")
+        return None
+
+
+def count_tokens(text):
+    """
+    Counts the tokens in a piece of text.
+
+    Args:
+    text (str): The text.
+
+    Returns:
+    int: The number of tokens, or an estimate of CHARACTERS_PER_TOKEN characters per token if the tokenizer is not available.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARACTERS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def pack(sizes, max_tokens, overlap_tokens = 0):
+    """
+    Groups consecutive units, such as sentences or segments, into chunks of at most max_tokens tokens, in a single pass.
+    A unit larger than max_tokens is given a chunk of its own.
+    With overlap, each chunk after the first starts with the last units of the previous chunk, up to overlap_tokens tokens of them.
+
+    Args:
+    sizes (list of int): The number of tokens in each unit.
+    max_tokens (int): The maximum number of tokens in a chunk.
+    overlap_tokens (int): The maximum number of tokens repeated from the end of the previous chunk. Defaults to 0.
+
+    Returns:
+    list of (int, int): The start and end index of the units in each chunk, in order.
+
+    Example:
+    >>> pack([3, 3, 3, 3], max_tokens=6)
+    [(0, 2), (2, 4)]
+    >>> pack([3, 3, 3, 3], max_tokens=6, overlap_tokens=3)
+    [(0, 2), (1, 3), (2, 4)]
+    """
+    ranges = []
+    start = 0
+    total = 0
+    for i, size in enumerate(sizes):
+        if total + size > max_tokens and i > start:
+            ranges.append((start, i))
+            start, total = i, 0
+            while start > ranges[-1][0] + 1 and total + sizes[start - 1] <= overlap_tokens and total + sizes[start - 1] + size <= max_tokens:
+                start -= 1
+                total += sizes[start]
+        total += size
+    if start < len(sizes):
+        ranges.append((start, len(sizes)))
+    return ranges
+
+
+def split_sentences(text, max_tokens):
+    """
+    Splits text into sentences. Sentences longer than max_tokens, as in transcripts without punctuation, are split further between words.
+
+    Args:
+    text (str): The text.
+    max_tokens (int): The maximum number of tokens in a piece.
+
+    Returns:
+    list of str: The pieces, which join back into the original text when concatenated.
+    """
+    pieces = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+
+    result = []
+    for piece in pieces:
+        if count_tokens(piece) <= max_tokens:
+            result.append(piece)
+            continue
+        words = re.findall(r"\S+\s*", piece)
+        word_sizes = [count_tokens(word) for word in words]
+        result += ["".join(words[start:end]) for start, end in pack(word_sizes, max_tokens)]
+    return result
+
+
+def chunk_text(transcript, max_tokens = CHUNK_TOKEN_BUDGET, overlap_tokens = CHUNK_OVERLAP_TOKENS):
+    """
+    Splits a text transcript into chunks of at most max_tokens tokens, without cutting off sentences.
+
+    Args:
+    transcript (str): The transcript.
+    max_tokens (int): The maximum number of tokens in a chunk. Defaults to CHUNK_TOKEN_BUDGET.
+    overlap_tokens (int): The maximum number of tokens of whole sentences repeated from the end of the previous chunk. Defaults to CHUNK_OVERLAP_TOKENS.
+
+    Returns:
+    list of str: The chunks, in order. A transcript that fits in one chunk is returned as the only chunk.
+    """
+    if count_tokens(transcript) <= max_tokens:
+        return [transcript]
+    sentences = split_sentences(transcript, max_tokens)
+    sizes = [count_tokens(sentence) for sentence in sentences]
+    return ["".join(sentences[start:end]).strip() for start, end in pack(sizes, max_tokens, overlap_tokens)]
+
+
+def chunk_timed_transcript(transcript, max_tokens = CHUNK_TOKEN_BUDGET, overlap_tokens = CHUNK_OVERLAP_TOKENS):
+    """
+    Splits a timestamped transcript into chunks of at most max_tokens tokens, as formatted for a prompt, without splitting segments across chunks.
+
+    Args:
+    transcript (TimedTranscript): The transcript.
+    max_tokens (int): The maximum number of tokens in a chunk. Defaults to CHUNK_TOKEN_BUDGET.
+    overlap_tokens (int): The maximum number of tokens of whole segments repeated from the end of the previous chunk. Defaults to CHUNK_OVERLAP_TOKENS.
+
+    Returns:
+    list of TimedTranscript: The chunks, in order, each a view of consecutive segments of the transcript.
+    """
+    sizes = [count_tokens(json.dumps(segment)) + 1 for segment in transcript]
+    return [transcript[start:end] for start, end in pack(sizes, max_tokens, overlap_tokens)]
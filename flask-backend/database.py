@@ -0,0 +1,190 @@
+import os
+import time
+import weakref
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool, extensions
+
+DB_NAME = "youtube_transcripts"
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# Connections idle for longer than this many seconds are checked with a 'SELECT 1' before being handed out.
+HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+connection_pool = None
+available_connections = None
+pool_lock = threading.Lock()
+# When each pooled connection was last returned to the pool, keyed by the connection itself, so an entry goes away with its connection.
+last_used = weakref.WeakKeyDictionary()
+pool_stats = {
+    "checkouts": 0,
+    "in_use": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "health_checks": 0,
+    "discarded_connections": 0,
+}
+
+
+def get_db_connection(db):
+    """
+    Establishes and returns a new connection to the PostgreSQL database, outside of the connection pool.
+
+    Args:
+    db (str): The name of the PostgreSQL database.
+    """
+    user = os.getenv("PGUSER")
+    return psycopg2.connect(
+        dbname=db,
+        user=user,
+        host="localhost",
+        port="5432"
+    )
+
+
+def init_pool(db = DB_NAME, min_size = POOL_MIN_SIZE, max_size = POOL_MAX_SIZE):
+    """
+    Creates the process-wide connection pool, if it has not been created already.
+
+    Args:
+    db (str): The name of the PostgreSQL database. Defaults to 'youtube_transcripts'.
+    min_size (int): The number of connections opened up front and kept open. Defaults to the DB_POOL_MIN_SIZE environment variable, or 1.
+    max_size (int): The maximum number of connections open at once. Defaults to the DB_POOL_MAX_SIZE environment variable, or 10.
+    """
+    global connection_pool, available_connections
+    with pool_lock:
+        if connection_pool is not None:
+            return
+        connection_pool = pool.ThreadedConnectionPool(
+            min_size,
+            max_size,
+            dbname=db,
+            user=os.getenv("PGUSER"),
+            host="localhost",
+            port="5432"
+        )
+        available_connections = threading.BoundedSemaphore(max_size)
+
+
+def close_pool():
+    """
+    Closes every connection in the process-wide connection pool. The pool is recreated on the next call to get_connection.
+    """
+    global connection_pool, available_connections
+    with pool_lock:
+        if connection_pool is None:
+            return
+        connection_pool.closeall()
+        connection_pool = None
+        available_connections = None
+        last_used.clear()
+
+
+def is_healthy(connection):
+    """
+    Checks whether a pooled connection can still be used.
+    Connections that have been idle for longer than HEALTH_CHECK_INTERVAL are tested with a round trip to the server.
+
+    Args:
+    connection (psycopg2 connection): The connection to check.
+
+    Returns:
+    bool: True if the connection can be used, False if it should be discarded.
+    """
+    if connection.closed:
+        return False
+    with pool_lock:
+        idle_since = last_used.get(connection, 0)
+    if time.monotonic() - idle_since < HEALTH_CHECK_INTERVAL:
+        return True
+    with pool_lock:
+        pool_stats["health_checks"] += 1
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def checkout_connection(connections):
+    """
+    Takes a healthy connection from the pool, replacing any connections that fail their health check.
+
+    Args:
+    connections (ThreadedConnectionPool): The pool to take the connection from.
+
+    Returns:
+    psycopg2 connection: A connection that is ready to use.
+    """
+    while True:
+        connection = connections.getconn()
+        if is_healthy(connection):
+            return connection
+        with pool_lock:
+            pool_stats["discarded_connections"] += 1
+            last_used.pop(connection, None)
+        connections.putconn(connection, close=True)
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrows a connection from the process-wide pool for the duration of a with block, waiting if every connection is in use.
+    Any transaction left open by the block is rolled back before the connection is returned to the pool.
+
+    Yields:
+    psycopg2 connection: A pooled connection to the 'youtube_transcripts' database.
+
+    Example:
+    >>> with get_connection() as connection:
+    ...     with connection.cursor() as cursor:
+    ...         cursor.execute("SELECT 1")
+    """
+    if connection_pool is None:
+        init_pool()
+    connections, semaphore = connection_pool, available_connections
+
+    started = time.monotonic()
+    semaphore.acquire()
+    waited = time.monotonic() - started
+    with pool_lock:
+        pool_stats["checkouts"] += 1
+        pool_stats["in_use"] += 1
+        pool_stats["wait_seconds_total"] += waited
+        pool_stats["wait_seconds_max"] = max(pool_stats["wait_seconds_max"], waited)
+
+    connection = None
+    try:
+        connection = checkout_connection(connections)
+        yield connection
+    finally:
+        if connection is not None:
+            try:
+                if not connection.closed and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                connection.close()
+            with pool_lock:
+                if connection.closed:
+                    last_used.pop(connection, None)
+                else:
+                    last_used[connection] = time.monotonic()
+            connections.putconn(connection, close=bool(connection.closed))
+        with pool_lock:
+            pool_stats["in_use"] -= 1
+        semaphore.release()
+
+
+def get_pool_stats():
+    """
+    Returns a snapshot of the connection pool's metrics.
+
+    Returns:
+    dict: The number of checkouts, connections in use, total and maximum seconds spent waiting for a connection, health checks run, and connections discarded.
+    """
+    with pool_lock:
+        return dict(pool_stats)
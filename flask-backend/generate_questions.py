@@ -1,9 +1,36 @@
 import re
 import os
 import ast
+import time
+import json
 import random
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-client = OpenAI()
+from question_filter import filter_questions
+from chunking import CHUNK_TOKEN_BUDGET, CHUNK_OVERLAP_TOKENS, chunk_text, chunk_timed_transcript, count_tokens
+from scheduler import chat_scheduler
+import structured_output
+import metrics
+from structured_output import KEY_POINTS_SCHEMA, TIMESTAMPED_KEY_POINTS_SCHEMA, QUESTION_SCHEMA, QUESTIONS_SCHEMA, BATCH_QUESTIONS_SCHEMA
+# Retries are made by chat_scheduler, which also keeps them within the rate limits, so the client does not retry on its own.
+client = OpenAI(max_retries=0)
+
+MODEL = "gpt-4o"
+PROMPT_FILES = ["summarize.txt", "summarize_with_timestamps.txt", "generate_question.txt", "generate_questions_batch.txt", "clean_questions.txt"]
+
+# The number of completion tokens counted against the tokens-per-minute budget for each request until its actual usage is known.
+COMPLETION_TOKEN_ESTIMATE = 1000
+
+# Questions are always cleaned locally by filter_questions. When set, they are also sent to the model to be cleaned by clean_questions.
+USE_LLM_CLEANING = os.getenv("USE_LLM_CLEANING", "false").lower() == "true"
+
+# When set, the model is asked for JSON matching a schema instead of a Python-style list or dictionary in free text.
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# The number of key points sent to the model in each question generation request. Set to 1 to generate each question in its own request.
+QUESTION_BATCH_SIZE = int(os.getenv("QUESTION_BATCH_SIZE", "5"))
 
 def load_prompt(file_name):
     """
@@ -20,83 +47,139 @@ def load_prompt(file_name):
     with open(file_path, "r") as file:
         return file.read()
 
-def split_transcript(transcript, max_chunk_size=100_000):
+
+@lru_cache(maxsize=None)
+def get_prompt_hash():
+    """
+    Computes a hash of every prompt template used to generate questions, the response schemas, and whether structured output is used,
+    so stored questions can be tied to the prompts that produced them. The hash is computed once per process.
+
+    Returns:
+    str: The SHA-256 hex digest of the prompt templates, schemas, and structured output setting.
+    """
+    digest = hashlib.sha256()
+    for file_name in PROMPT_FILES:
+        digest.update(load_prompt(file_name).encode("utf-8"))
+    for schema in (KEY_POINTS_SCHEMA, TIMESTAMPED_KEY_POINTS_SCHEMA, QUESTION_SCHEMA, QUESTIONS_SCHEMA, BATCH_QUESTIONS_SCHEMA):
+        digest.update(json.dumps(schema, sort_keys=True).encode("utf-8"))
+    digest.update(f"structured_output={STRUCTURED_OUTPUT}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def complete(messages, timeout=None, response_format=None):
     """
-    Splits a long transcript into chunks of a specified maximum size. Chunks are guaranteed to not cut off sentences. 
+    Sends a chat completion request to GPT-4o through chat_scheduler, which queues it by the priority of the current context,
+    keeps it within the in-flight, requests-per-minute, and tokens-per-minute budgets, and retries it after rate limit and server errors.
 
     Args:
-    transcript (str): The long transcript to be split.
-    max_chunk_size (int): The maximum size of each chunk in characters. Defaults to 100,000.
+    messages (list of dict): The messages to send to the model.
+    timeout (float): The maximum number of seconds to wait for the model's response. Defaults to None, which uses the client's default timeout.
+    response_format (dict): The format the model must respond in, such as a JSON schema. Defaults to None, which allows free text.
+
+    Returns:
+    str: The content of the model's response.
+    """
+    options = {"response_format": response_format} if response_format else {}
+
+    def send():
+        started = time.monotonic()
+        completion = client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            timeout=timeout,
+            **options
+        )
+        metrics.record_completion(MODEL, getattr(completion, "usage", None), time.monotonic() - started)
+        return completion
+
+    def usage_tokens(completion):
+        usage = getattr(completion, "usage", None)
+        return usage.prompt_tokens + usage.completion_tokens if usage is not None else None
+
+    estimate = sum(count_tokens(message["content"]) for message in messages) + COMPLETION_TOKEN_ESTIMATE
+    completion = chat_scheduler.call(send, tokens=estimate, usage_tokens=usage_tokens)
+    return completion.choices[0].message.content
+
+
+def complete_json(messages, schema_name, schema, timeout=None):
+    """
+    Sends a chat completion request to GPT-4o that must be answered with JSON matching a schema, and parses the response.
+    If the response cannot be parsed, the failure is counted and the model is asked once to repair its response.
+
+    Args:
+    messages (list of dict): The messages to send to the model.
+    schema_name (str): The name of the schema, used for the request and for counting parse failures.
+    schema (dict): The JSON schema the response must match.
+    timeout (float): The maximum number of seconds to wait for each response. Defaults to None.
 
     Returns:
-    list of str: A list of transcript chunks, each no longer than max_chunk_size characters.
+    The parsed JSON value.
+
+    Exceptions:
+    ValueError: If the repaired response can not be parsed either.
     """
-    chunks = []
-    starting_index = 0
-    transcript_length = len(transcript)
+    response_format = structured_output.response_format(schema_name, schema)
+    text = complete(messages, timeout=timeout, response_format=response_format)
+    try:
+        return structured_output.parse(text, schema)
+    except ValueError as e:
+        structured_output.record_parse_failure(schema_name)
+        print(f"Could not parse {schema_name} response, asking for a repair: {e}")
+        error = e
+
+    metrics.increment("retries_total", operation="structured_output")
+    repair_messages = messages + [
+        {"role": "assistant", "content": text or ""},
+        {"role": "user", "content": f"Your response could not be parsed: {error}. Return the corrected JSON only."}
+    ]
+    text = complete(repair_messages, timeout=timeout, response_format=response_format)
+    try:
+        return structured_output.parse(text, schema)
+    except ValueError:
+        structured_output.record_parse_failure(schema_name)
+        raise
+
+def split_transcript(transcript, max_tokens=CHUNK_TOKEN_BUDGET, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits a long transcript into chunks of at most max_tokens tokens. Chunks are guaranteed to not cut off sentences, unless a single sentence is longer than max_tokens. 
+
+    Args:
+    transcript (str): The long transcript to be split.
+    max_tokens (int): The maximum number of tokens in each chunk. Defaults to CHUNK_TOKEN_BUDGET.
+    overlap_tokens (int): The maximum number of tokens of whole sentences repeated from the end of the previous chunk. Defaults to CHUNK_OVERLAP_TOKENS.
 
-    while starting_index < transcript_length:
-        ending_index = starting_index + max_chunk_size
-        
-        if ending_index > transcript_length: ending_index = transcript_length
-        
-        if ending_index != transcript_length and transcript[ending_index-1] != '.':
-            ending_index = transcript.find('.', ending_index)
-            ending_index = ending_index + 1
-        
-        chunks.append(transcript[starting_index:ending_index])
-        starting_index = ending_index
-    return chunks
+    Returns:
+    list of str: A list of transcript chunks.
+    """
+    return chunk_text(transcript, max_tokens, overlap_tokens)
 
 
-def split_timestamped_transcript(transcript, max_chunk_size=95_000):
+def split_timestamped_transcript(transcript, max_tokens=CHUNK_TOKEN_BUDGET, overlap_tokens=CHUNK_OVERLAP_TOKENS):
     """
-    Splits a long transcript into chunks of a specified maximum size, ensuring transcription segments are not split across chunks.
+    Splits a long transcript into chunks of at most max_tokens tokens, ensuring transcription segments are not split across chunks.
 
     Args:
-    transcript (str): A string representation of a JSON-formatted list, where each item in the list is a dictionary representing a transcription segment with "start", "end", and "text" fields.
-    max_chunk_size (int): The maximum size of each chunk in characters, excluding extra characters taken to ensure an entire transcription segment is grabbed. Defaults to 95,000.
+    transcript (TimedTranscript): The timestamped transcript to be split.
+    max_tokens (int): The maximum number of tokens in each chunk, as formatted for the prompt. A segment longer than this is given a chunk of its own. Defaults to CHUNK_TOKEN_BUDGET.
+    overlap_tokens (int): The maximum number of tokens of whole segments repeated from the end of the previous chunk. Defaults to CHUNK_OVERLAP_TOKENS.
 
     Returns:
-    list of (list of str): The list of chunks. Each chunk is a list of JSON-formatted strings. Each string within a chunk represents a transcription segment with timestamps. 
-    """
-    chunks = []
-    starting_index = 0
-    transcript_length = len(transcript)
-
-    while starting_index < transcript_length:
-        starting_index = transcript.find("'{", starting_index)
-        if starting_index == -1: 
-            break
-        
-        ending_index = starting_index + max_chunk_size
-        if ending_index > transcript_length:
-            ending_index = transcript_length
-        
-        if ending_index != transcript_length and transcript[ending_index-1] != '.':
-            ending_index = transcript.find("}'", ending_index)
-            ending_index = ending_index + 2
-
-        chunk = transcript[starting_index:ending_index]
-        if not chunk.endswith(']'):
-            chunk += ']'
-        if not chunk.startswith('['):
-            chunk = '[' + chunk
-        
-        chunks.append(ast.literal_eval(chunk))
-        starting_index = ending_index
-    return chunks
-
-def summarize_text(transcript, max_extractions = 15):
+    list of TimedTranscript: The chunks, in order. Each chunk is a view of consecutive segments of the transcript.
+    """
+    return chunk_timed_transcript(transcript, max_tokens, overlap_tokens)
+
+def summarize_text(transcript, max_extractions = 15, structured = False):
     """
     Extracts key points from a given text transcript using GPT-4o. The number of points will be between 1 - max_extractions.
 
     Args:
     transcript (str): The transcription of a video as text.
     max_extractions (int): The maximum number of points that the model can extract from the video. Defaults to 15. 
+    structured (bool): True to request JSON matching KEY_POINTS_SCHEMA and return the parsed list. Defaults to False.
     
     Returns:
     str: A string containing a Python-style list of key points extracted. 
+    If structured == True, the list of key points itself is returned instead.
 
     Example:
     >>> summarize_text('This is our transcript...')
@@ -106,48 +189,43 @@ def summarize_text(transcript, max_extractions = 15):
     prompt = load_prompt("summarize.txt")
     prompt = prompt.format(max_extractions=max_extractions, transcript=transcript)
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "developer", "content": "You are an experienced educator."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return completion.choices[0].message.content
+    messages = [
+        {"role": "developer", "content": "You are an experienced educator."},
+        {"role": "user", "content": prompt}
+    ]
+    if structured:
+        return complete_json(messages, "key_points", KEY_POINTS_SCHEMA)["key_points"]
+    return complete(messages)
 
 
-def summarize_text_with_timestamps(transcript, max_extractions = 15):
+def summarize_text_with_timestamps(transcript, max_extractions = 15, structured = False):
     """
     Extracts key points from a timestamped video transcript using GPT-4o. 
     Each key point is mapped to the corresponding timestamp from the transcription segment, indicating when the information has been fully introduced in the video. 
 
     Args:
-    transcript (list of str): A list of JSON-formatted strings, each representing a transcription segment with timestamps. Each string has the following structure:
-    {
-        "start": "Starting time in seconds",
-        "end": "Ending time in seconds",
-        "text": "Transcribed text"
-    }
+    transcript (TimedTranscript): The transcription segments of a video, each with a "start" and "end" time in seconds and its "text".
     max_extractions (int): The maximum number of points that the model can extract from the video. Defaults to 15. 
+    structured (bool): True to request JSON matching TIMESTAMPED_KEY_POINTS_SCHEMA and return the parsed list. Defaults to False.
 
     Returns:
     str: A string containing a Python-style list of key points extracted, with associated timestamps. 
     Each item in the list is a JSON object that stores a key point and its associated timestamp.
+    If structured == True, the list of dictionaries itself is returned instead.
     """
 
-    transcript = "\n".join(transcript)
+    transcript = transcript.to_prompt()
 
     prompt = load_prompt("summarize_with_timestamps.txt")
     prompt = prompt.format(max_extractions=max_extractions, transcript=transcript)
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "developer", "content": "You are an experienced educator."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return completion.choices[0].message.content
+    messages = [
+        {"role": "developer", "content": "You are an experienced educator."},
+        {"role": "user", "content": prompt}
+    ]
+    if structured:
+        return complete_json(messages, "timestamped_key_points", TIMESTAMPED_KEY_POINTS_SCHEMA)["key_points"]
+    return complete(messages)
 
 
 def format_as_list(text):
@@ -176,6 +254,7 @@ def format_as_list(text):
 def format_as_dict(key_points):
     """
     Uses regular expressions to extract a Python dictionary from a string that contains additional text or comments. 
+    The dictionary is parsed with ast.literal_eval, so the string is never executed as code.
 
     Args:
     key_points (str): A string that contains a Python-style dictionary, potentially with additional text or comments.
@@ -191,18 +270,21 @@ def format_as_dict(key_points):
 
     key_points = re.search(r'\{.*\}', key_points, re.DOTALL)
     key_points = key_points.group(0)
-    return eval(key_points)
+    return ast.literal_eval(key_points)
 
 
-def generate_question(key_point):
+def generate_question(key_point, timeout=None, structured=False):
     """
     Generates a multiple-choice question from a given key point using GPT-4o.
     
     Args:
     key_point (str): The key point to generate the question from.
+    timeout (float): The maximum number of seconds to wait for the model's response. Defaults to None, which uses the client's default timeout.
+    structured (bool): True to request JSON matching QUESTION_SCHEMA and return the parsed dictionary. Defaults to False.
     
     Returns:
     str: A string containing a Python-style dictionary with the question, correct answer, and distractors.
+    If structured == True, the dictionary itself is returned instead.
 
     Example:
     >>> generate_question_with_gpt4('The four pillars of OOP are abstraction, polymorphism, inheritance, and encapsulation.')
@@ -223,65 +305,159 @@ def generate_question(key_point):
     prompt = load_prompt("generate_question.txt")
     prompt = prompt.format(key_point=key_point)
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are an experienced educator generating educational questions."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return completion.choices[0].message.content
+    messages = [
+        {"role": "system", "content": "You are an experienced educator generating educational questions."},
+        {"role": "user", "content": prompt}
+    ]
+    if structured:
+        return complete_json(messages, "question", QUESTION_SCHEMA, timeout=timeout)
+    return complete(messages, timeout=timeout)
+
+
+def generate_questions_batch(key_points, timeout=None):
+    """
+    Generates a multiple-choice question for each of several key points in a single request to GPT-4o, so the instructions are only sent once.
+    The response is always requested as JSON matching BATCH_QUESTIONS_SCHEMA.
+
+    Args:
+    key_points (list of str): The key points to generate questions from.
+    timeout (float): The maximum number of seconds to wait for the model's response. Defaults to None, which uses the client's default timeout.
+
+    Returns:
+    list of dict: A list with one entry per key point, in the order of key_points. Each entry is a dictionary with the question, options, and correct answer, 
+    or None if the model did not return a question for that key point.
+    """
+    numbered_points = "\n".join(f'{i + 1}. "{key_point}"' for i, key_point in enumerate(key_points))
+    prompt = load_prompt("generate_questions_batch.txt")
+    prompt = prompt.format(key_points=numbered_points)
+
+    messages = [
+        {"role": "system", "content": "You are an experienced educator generating educational questions."},
+        {"role": "user", "content": prompt}
+    ]
+    response = complete_json(messages, "batch_questions", BATCH_QUESTIONS_SCHEMA, timeout=timeout)
+
+    questions = [None] * len(key_points)
+    for question_data in response["questions"]:
+        index = question_data.pop("index") - 1
+        if 0 <= index < len(key_points) and questions[index] is None:
+            questions[index] = question_data
+    return questions
+
+
+def create_questions_from_batch(points, timestamped, timeout=None, on_question=None):
+    """
+    Generates questions for a batch of key points in a single request, falling back to one request per key point for any key point the batch did not produce a question for.
+
+    Args:
+    points (list of str or list of dict): Key points, or dictionaries storing a key point and its associated timestamp if timestamped == True.
+    timestamped (bool): True if key points are given timestamps, False if not.
+    timeout (float): The maximum number of seconds to wait for each response. Defaults to None.
+    on_question (function): Called with each question as soon as it has been generated. Defaults to None.
+
+    Returns:
+    list of dict: A list with one entry per key point, in the order of points. Each entry is a question, or None if no question could be generated.
+    """
+    try:
+        batch = generate_questions_batch([point['key_point'] if timestamped else point for point in points], timeout=timeout)
+    except Exception as e:
+        print(f"Error generating questions for batch of {len(points)} points, generating them one at a time\n{e}")
+        batch = [None] * len(points)
+
+    questions = []
+    for point, question_data in zip(points, batch):
+        if question_data is None:
+            questions.append(create_question_from_point(point, timestamped, timeout, on_question))
+            continue
+        if timestamped: question_data['timestamp'] = point['timestamp']
+        if on_question: on_question(question_data)
+        questions.append(question_data)
+    return questions
+
+
+def create_question_from_point(point, timestamped, timeout=None, on_question=None):
+    """
+    Generates a single question for a key point, returning None instead of raising if generation or parsing fails.
 
+    Args:
+    point (str or dict): A key point, or a dictionary storing a key point and its associated timestamp if timestamped == True.
+    timestamped (bool): True if the key point is given a timestamp, False if not.
+    timeout (float): The maximum number of seconds to wait for the model's response. Defaults to None.
+    on_question (function): Called with the question as soon as it has been generated. Defaults to None.
 
-def create_questions_from_points(key_points, timestamped):
+    Returns:
+    dict: A dictionary containing a question, options, correct answer, and optionally the timestamp, or None if an error occurred.
+    """
+    try:
+        question_data = generate_question(point['key_point'] if timestamped else point, timeout=timeout, structured=STRUCTURED_OUTPUT)
+        if not STRUCTURED_OUTPUT: question_data = format_as_dict(question_data)
+        if timestamped: question_data['timestamp'] = point['timestamp']
+        if on_question: on_question(question_data)
+        return question_data
+    except Exception as e:
+        print(f"Error generating question for point: {point}\n{e}")
+        return None
+
+
+def create_questions_from_points(key_points, timestamped, max_workers=8, timeout=60, on_question=None, batch_size=None):
     """
-    Generates questions for a list of key points.
+    Generates questions for a list of key points. 
+    Key points are grouped into batches of batch_size, each generated in a single request.
+    Up to max_workers batches are generated concurrently, and the returned questions keep the order of their key points.
     
     Args:
     timestamped (bool): True if key points are given timestamps, False if not.
-    if timestamped == True:
-        key_points (list of str): A list of key points to generate questions from.
     if timestamped == False:
+        key_points (list of str): A list of key points to generate questions from.
+    if timestamped == True:
         key_points (list of dict): A list of dictionaries, with each dictionary storing a key point and its associated timestamp.
+    max_workers (int): The maximum number of questions generated at the same time. Defaults to 8.
+    timeout (float): The maximum number of seconds to wait for each question. Defaults to 60.
+    on_question (function): Called with each question as soon as it has been generated, in the order questions finish. Defaults to None.
+    batch_size (int): The number of key points in each batch. Defaults to None, which uses QUESTION_BATCH_SIZE. A batch size of 1 generates each question in its own request.
     
     Returns:
     list: A list of dictionaries, with each dictionary containing a question, options, and correct answer. If timestamped == True, each dictionary will also contain the timestamp.
     """
+    if not key_points: return []
+    batch_size = batch_size or QUESTION_BATCH_SIZE
 
-    questions = []
-    for point in key_points:
-        try:
-            question_data = format_as_dict(generate_question(point['key_point'] if timestamped else point))
-            if timestamped: question_data['timestamp'] = point['timestamp']
-            questions.append(question_data)
-        except Exception as e:
-            print(f"Error generating question for point: {point}\n{e}")
-    return questions
+    if batch_size == 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(key_points))) as executor:
+            questions = executor.map(metrics.in_context(lambda point: create_question_from_point(point, timestamped, timeout, on_question)), key_points)
+            return [question for question in questions if question is not None]
+
+    batches = [key_points[i:i + batch_size] for i in range(0, len(key_points), batch_size)]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        questions = executor.map(metrics.in_context(lambda batch: create_questions_from_batch(batch, timestamped, timeout, on_question)), batches)
+        return [question for batch in questions for question in batch if question is not None]
 
 
-def clean_questions(questions, max_questions = 15):
+def clean_questions(questions, max_questions = 15, structured = False):
     """
     Cleans a list of questions, limiting the number of questions and removing any questions that are not educationally valuable. 
     
     Args:
     questions (list of dict): A list of dictionaries, each containing a question, options, correct answer, and optionally a timestamp.
     max_questions (int): The maximum number of questions our list should have. Defaults to 15.
+    structured (bool): True to request JSON matching QUESTIONS_SCHEMA and return the parsed list. Defaults to False.
     
     Returns:
     str: A string containing a list of dictionaries, with each dictionary containing a question, options, correct answer, and optionally a timestamp.
+    If structured == True, the list of dictionaries itself is returned instead.
     """
 
     prompt = load_prompt("clean_questions.txt")
     prompt = prompt.format(questions=questions, max_questions=max_questions)
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are an experienced educator generating educational questions."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return completion.choices[0].message.content
+    messages = [
+        {"role": "system", "content": "You are an experienced educator generating educational questions."},
+        {"role": "user", "content": prompt}
+    ]
+    if structured:
+        cleaned = complete_json(messages, "questions", QUESTIONS_SCHEMA)["questions"]
+        return [{key: value for key, value in question.items() if not (key == "timestamp" and value is None)} for question in cleaned]
+    return complete(messages)
 
 def shuffled(questions):
     """
@@ -299,37 +475,70 @@ def shuffled(questions):
     return questions
 
 
-def get_questions(transcript, timestamped):
+def create_questions_from_chunk(chunk, timestamped, on_stage=None, on_question=None, max_extractions=15):
+    """
+    Summarizes a single transcript chunk into key points and generates a question for each key point.
+
+    Args:
+    chunk (str or TimedTranscript): A transcript chunk, as returned by split_transcript if timestamped == False, or split_timestamped_transcript if timestamped == True.
+    timestamped (bool): True if key points are given timestamps, False if not.
+    on_stage (function): Called with 'generating' once the chunk's key points have been extracted. Defaults to None.
+    on_question (function): Called with each question as soon as it has been generated. Defaults to None.
+    max_extractions (int): The maximum number of key points extracted from the chunk. Defaults to 15.
+
+    Returns:
+    list: A list of dictionaries, with each dictionary containing a question, options, and correct answer. If timestamped == True, each dictionary will also contain the timestamp.
+    """
+    with metrics.stage("summarize"):
+        if timestamped:
+            key_points = summarize_text_with_timestamps(chunk, max_extractions, structured=STRUCTURED_OUTPUT)
+        else:
+            key_points = summarize_text(chunk, max_extractions, structured=STRUCTURED_OUTPUT)
+        if not STRUCTURED_OUTPUT: key_points = format_as_list(key_points)
+    if on_stage: on_stage("generating")
+    with metrics.stage("generate_questions"):
+        return create_questions_from_points(key_points, timestamped, on_question=on_question)
+
+
+def get_questions(transcript, timestamped, max_chunk_workers=4, on_stage=None, on_question=None, use_llm_cleaning=None, max_questions=15, max_extractions=15):
     """
     Retrieves educational multiple-choice questions generated from a transcript.
+    Chunks of a long transcript are processed concurrently, so one chunk can be summarized while questions are generated for another. 
+    The requests sent to the model are queued and limited by chat_scheduler, and questions are merged in chunk order.
+    The merged questions are cleaned locally by filter_questions, and optionally by the model afterwards.
 
     Args:
     timestamped (bool): True if key points are given timestamps, False if not.
     if timestamped == True:
-        transcript (list of str): A list of JSON-formatted strings, each representing a transcription segment with timestamps. 
-        Each string has the following structure:
-        {
-        "start": "Starting time in seconds",
-        "end": "Ending time in seconds",
-        "text": "Transcribed text"
-        }
+        transcript (TimedTranscript): The transcription segments of a video, each with a "start" and "end" time in seconds and its "text".
     if timestamped == False:
         transcript (str): The text transcription of a video.
+    max_chunk_workers (int): The maximum number of chunks processed at the same time. Defaults to 4.
+    on_stage (function): Called with 'summarizing', 'generating', and 'cleaning' as processing moves through those stages. Defaults to None.
+    on_question (function): Called with each question as soon as it has been generated, before the questions are cleaned. Defaults to None.
+    use_llm_cleaning (bool): True to also clean the questions with clean_questions. Defaults to None, which uses USE_LLM_CLEANING.
+    max_questions (int): The maximum number of questions returned. Defaults to 15.
+    max_extractions (int): The maximum number of key points extracted from each chunk. Defaults to 15.
     
     Returns:
     list: A list of dictionaries, each containing a question, options, and correct answer. If timestamped == True, each dictionary will also contain the timestamp.
+          The list is empty if the transcript has no text to generate questions from.
     """
-    chunks = [transcript] 
-    if len(str(transcript)) > 100000: 
-        chunks = split_timestamped_transcript(str(transcript)) if timestamped else split_transcript(transcript)
+    if on_stage: on_stage("summarizing")
+    chunks = split_timestamped_transcript(transcript) if timestamped else split_transcript(transcript)
+    chunks = [chunk for chunk in chunks if len(chunk) > 0]
+    if not chunks:
+        return []
     
-    questions = []
-    for chunk in chunks:
-        key_points = summarize_text_with_timestamps(chunk) if timestamped else summarize_text(chunk)
-        key_points = format_as_list(key_points)
-        questions.append(create_questions_from_points(key_points, timestamped))
+    with ThreadPoolExecutor(max_workers=min(max_chunk_workers, len(chunks))) as executor:
+        questions = list(executor.map(metrics.in_context(lambda chunk: create_questions_from_chunk(chunk, timestamped, on_stage, on_question, max_extractions)), chunks))
     
     questions = [question for sublist in questions for question in sublist]
-    questions = clean_questions(questions)
-    questions = format_as_list(questions)
+    if on_stage: on_stage("cleaning")
+    with metrics.stage("filter_questions"):
+        questions = filter_questions(questions, max_questions)
+    if USE_LLM_CLEANING if use_llm_cleaning is None else use_llm_cleaning:
+        with metrics.stage("clean_questions"):
+            questions = clean_questions(questions, max_questions, structured=STRUCTURED_OUTPUT)
+            if not STRUCTURED_OUTPUT: questions = format_as_list(questions)
     return shuffled(questions)
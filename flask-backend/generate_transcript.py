@@ -1,9 +1,39 @@
 import os
-import psycopg2
+import math
+import time
+import shutil
+import tempfile
+import subprocess
 import yt_dlp
-import json
-from openai import OpenAI
-from pydub import AudioSegment
+import psycopg2
+import re
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
+from database import get_connection
+import memory_cache
+import metrics
+from single_flight import SingleFlight, advisory_lock
+from captions import get_caption_segments
+from timed_transcript import TimedTranscript
+from transcription_backends import get_backend
+
+CHUNK_DURATION_MS = 24*60*1000
+OVERLAP_DURATION_MS = 30*1000
+
+transcript_requests = SingleFlight()
+
+# When set, a video's own captions are used as its transcript whenever it has a usable caption track, skipping the audio download and Whisper.
+USE_CAPTIONS = os.getenv("USE_CAPTIONS", "true").lower() == "true"
+
+# When set, audio is downloaded at the lowest bitrate of at least FAST_DOWNLOAD_MIN_ABR kbps and kept in its original container instead of being re-encoded to mp3.
+FAST_DOWNLOAD = os.getenv("FAST_DOWNLOAD", "true").lower() == "true"
+FAST_DOWNLOAD_MIN_ABR = int(os.getenv("FAST_DOWNLOAD_MIN_ABR", "32"))
+
+# In incremental mode, timestamped videos are processed in windows in playback order, so questions for the start of a video are ready first.
+# The first window is INCREMENTAL_FIRST_WINDOW_SECONDS long and each following window is twice as long as the one before, up to INCREMENTAL_MAX_WINDOW_SECONDS.
+INCREMENTAL_FIRST_WINDOW_SECONDS = float(os.getenv("INCREMENTAL_FIRST_WINDOW_SECONDS", "120"))
+INCREMENTAL_MAX_WINDOW_SECONDS = float(os.getenv("INCREMENTAL_MAX_WINDOW_SECONDS", "600"))
+WINDOW_OVERLAP_MS = 10*1000
 
 def extract_youtube_video_id(youtube_video_url):
     """
@@ -54,35 +84,51 @@ def get_absolute_path(file_name):
         return None
         
 
-def download_audio(youtube_url):
+def download_audio(youtube_url, output_dir = None, fast = None):
     """
-    Downloads the audio from a given YouTube video URL and converts it to an mp3 file. 
+    Downloads the audio from a given YouTube video URL.
+
+    In fast mode, the smallest audio-only format of at least FAST_DOWNLOAD_MIN_ABR kbps (usually Opus in WebM, or AAC in m4a) is downloaded and kept in its own container, which Whisper accepts, so nothing is re-encoded.
+    Otherwise, the best available audio is downloaded and converted to an mp3 file.
 
     Args:
     youtube_url (str): The URL of the YouTube video from which to download the audio.
+    output_dir (str): The directory the audio file is written to. Defaults to None, which uses the current working directory.
+    fast (bool): True to use fast mode, False to convert to mp3. Defaults to None, which uses FAST_DOWNLOAD.
 
     Returns:
-    str: The absolute file path of the downloaded mp3 audio file, or None if an error occurred.
+    str: The absolute file path of the downloaded audio file, or None if an error occurred.
 
     Exceptions:
     yt_dlp.DownloadError: For any errors that occur during the download process.
     Exception: For any other unexpected errors that may occur.
 
     Example:
-    >>> download_audio('https://www.youtube.com/watch?v=example_video')
+    >>> download_audio('https://www.youtube.com/watch?v=example_video', fast=False)
     '/absolute/path/to/example_video.mp3'
     """
-    ydl_opts = {
-        'format': 'mp3/bestaudio/best',
-        'postprocessors': [{  
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-        }]
-    }
+    fast = FAST_DOWNLOAD if fast is None else fast
+    if fast:
+        ydl_opts = {
+            'format': f'bestaudio[abr>={FAST_DOWNLOAD_MIN_ABR}]/bestaudio',
+            'format_sort': ['+abr', '+filesize'],
+        }
+    else:
+        ydl_opts = {
+            'format': 'mp3/bestaudio/best',
+            'postprocessors': [{  
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+            }]
+        }
+    if output_dir:
+        ydl_opts['outtmpl'] = os.path.join(output_dir, '%(id)s.%(ext)s')
 
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(youtube_url, download=True)  
+            if fast:
+                return os.path.abspath(info['requested_downloads'][0]['filepath'])
             file_name = ydl.prepare_filename(info)   
             return get_absolute_path(file_name)
     except yt_dlp.DownloadError as e:
@@ -121,45 +167,192 @@ def check_file_size(absolute_path_to_file, threshold = 25):
         return None
 
 
-def split_audio(absolute_path_to_file, chunk_duration_ms = 24*60*1000, overlap_duration_ms = 30*1000):
+def get_audio_duration_ms(absolute_path_to_file):
+    """
+    Reads the duration of an audio file from its container metadata using ffprobe, without decoding the audio.
+
+    Args:
+    absolute_path_to_file (str): The absolute path to the audio file.
+
+    Returns:
+    int: The duration of the audio file in milliseconds.
+
+    Exceptions:
+    subprocess.CalledProcessError: If ffprobe could not read the file.
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", absolute_path_to_file],
+        capture_output=True, text=True, check=True
+    )
+    return int(float(result.stdout.strip()) * 1000)
+
+
+def split_audio(absolute_path_to_file, chunk_duration_ms = CHUNK_DURATION_MS, overlap_duration_ms = OVERLAP_DURATION_MS, output_dir = None):
     """
     Splits an audio file into chunks with specified duration and overlap. 
+    Each chunk is cut by time range straight from the compressed file with ffmpeg and copied without re-encoding, so the audio is never decoded into memory.
+    Chunks keep the container format of the input file.
 
     Args:
     absolute_path_to_file (str): Path to the input audio file.
     chunk_duration_ms (int): Duration of each chunk in milliseconds. Defaults to 24 minutes.
     overlap_duration_ms (int): Duration of overlap between chunks in milliseconds. Defaults to 30 seconds.
+    output_dir (str): The directory the chunks are written to. Defaults to None, which creates a new temporary directory, so concurrent requests never share chunk files.
 
     Returns:
     list of str: a list of absolute paths to the saved chunk files.
 
     Example:
-    >>> split_audio('/absolute/path/to/example_video.mp3')
-    ['/absolute/path/to/chunk_1.mp3', '/absolute/path/to/chunk_2.mp3', '/absolute/path/to/chunk_3.mp3']
+    >>> split_audio('/absolute/path/to/example_video.mp3', output_dir='/tmp/example_video')
+    ['/tmp/example_video/chunk_1.mp3', '/tmp/example_video/chunk_2.mp3', '/tmp/example_video/chunk_3.mp3']
     """
-    audio = AudioSegment.from_mp3(absolute_path_to_file)
-    video_length_ms = len(audio)
-    num_chunks = video_length_ms // chunk_duration_ms + (1 if video_length_ms % chunk_duration_ms else 0)
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix="audio_chunks_")
+
+    video_length_ms = get_audio_duration_ms(absolute_path_to_file)
+    step_ms = chunk_duration_ms - overlap_duration_ms
+    num_chunks = max(1, math.ceil((video_length_ms - overlap_duration_ms) / step_ms))
     
+    ranges_ms = [(i * step_ms, min(i * step_ms + chunk_duration_ms, video_length_ms)) for i in range(num_chunks)]
+    return cut_audio(absolute_path_to_file, ranges_ms, output_dir)
+
+
+def cut_audio(absolute_path_to_file, ranges_ms, output_dir):
+    """
+    Cuts time ranges out of an audio file with ffmpeg, copying the audio without re-encoding it. The chunks keep the container format of the input file.
+
+    Args:
+    absolute_path_to_file (str): Path to the input audio file.
+    ranges_ms (list of (int, int)): The start and end of each chunk in milliseconds.
+    output_dir (str): The directory the chunks are written to, as chunk_1, chunk_2, and so on.
+
+    Returns:
+    list of str: a list of absolute paths to the saved chunk files, in the order of ranges_ms.
+
+    Exceptions:
+    subprocess.CalledProcessError: If ffmpeg fails.
+    """
+    extension = os.path.splitext(absolute_path_to_file)[1]
     output_files = []
-    for i in range(num_chunks):
-        start_time = i * (chunk_duration_ms - overlap_duration_ms)
-        end_time = start_time + chunk_duration_ms if start_time + chunk_duration_ms <= video_length_ms else video_length_ms
-        chunk = audio[start_time:end_time]
-        
-        output_file = f"chunk_{i+1}.mp3"
-        chunk.export(output_file, format="mp3")
-        output_files.append(get_absolute_path(output_file))
+    for i, (start_time, end_time) in enumerate(ranges_ms):
+        output_file = os.path.join(output_dir, f"chunk_{i+1}{extension}")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-ss", str(start_time / 1000), "-t", str((end_time - start_time) / 1000),
+             "-i", absolute_path_to_file, "-map", "0:a", "-c", "copy", output_file],
+            check=True
+        )
+        output_files.append(os.path.abspath(output_file))
     
     return output_files
 
 
+def get_window_bounds(duration, first_window = None, max_window = None):
+    """
+    Divides a video into the windows processed one after another in incremental mode: a short first window, then windows that double in length up to max_window.
+    A last window shorter than half of the window before it is merged into that window.
+
+    Args:
+    duration (float): The duration of the video in seconds.
+    first_window (float): The length of the first window in seconds. Defaults to None, which uses INCREMENTAL_FIRST_WINDOW_SECONDS.
+    max_window (float): The longest window in seconds. Defaults to None, which uses INCREMENTAL_MAX_WINDOW_SECONDS.
+
+    Returns:
+    list of (float, float): The start and end of each window in seconds, in playback order.
+
+    Example:
+    >>> get_window_bounds(1000.0, 120, 600)
+    [(0.0, 120.0), (120.0, 360.0), (360.0, 1000.0)]
+    """
+    length = first_window or INCREMENTAL_FIRST_WINDOW_SECONDS
+    max_window = max_window or INCREMENTAL_MAX_WINDOW_SECONDS
+    bounds = []
+    start = 0.0
+    while start < duration:
+        end = min(start + length, duration)
+        if bounds and end - start < (bounds[-1][1] - bounds[-1][0]) / 2:
+            bounds[-1] = (bounds[-1][0], end)
+        else:
+            bounds.append((start, end))
+        start = end
+        length = min(length * 2, max_window)
+    return bounds or [(0.0, duration)]
+
+
+def split_audio_windows(absolute_path_to_file, bounds, duration, overlap_duration_ms = WINDOW_OVERLAP_MS, output_dir = None):
+    """
+    Splits an audio file into the windows returned by get_window_bounds, each running overlap_duration_ms into the next window, like the chunks of split_audio.
+
+    Args:
+    absolute_path_to_file (str): Path to the input audio file.
+    bounds (list of (float, float)): The start and end of each window in seconds.
+    duration (float): The duration of the audio in seconds.
+    overlap_duration_ms (int): Duration of overlap between windows in milliseconds. Defaults to 10 seconds.
+    output_dir (str): The directory the windows are written to. Defaults to None, which creates a new temporary directory.
+
+    Returns:
+    list of str: a list of absolute paths to the saved window files, in playback order.
+    """
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix="audio_windows_")
+    ranges_ms = [(start * 1000, min(end * 1000 + overlap_duration_ms, duration * 1000)) for start, end in bounds]
+    return cut_audio(absolute_path_to_file, ranges_ms, output_dir)
+
+
+def get_chunk_offsets(num_chunks, chunk_duration_ms = CHUNK_DURATION_MS, overlap_duration_ms = OVERLAP_DURATION_MS):
+    """
+    Computes where each chunk created by split_audio starts in the original audio file.
+
+    Args:
+    num_chunks (int): The number of chunks the audio file was split into.
+    chunk_duration_ms (int): Duration of each chunk in milliseconds. Defaults to 24 minutes.
+    overlap_duration_ms (int): Duration of overlap between chunks in milliseconds. Defaults to 30 seconds.
+
+    Returns:
+    list of float: The starting time of each chunk in seconds.
+
+    Example:
+    >>> get_chunk_offsets(3)
+    [0.0, 1410.0, 2820.0]
+    """
+    return [i * (chunk_duration_ms - overlap_duration_ms) / 1000 for i in range(num_chunks)]
+
+
+def transcribe_with_retries(transcribe_function, absolute_path_to_file, retries = 3, backoff = 2.0):
+    """
+    Calls a transcription function on an audio file, retrying with exponential backoff if it raises an exception or returns None.
+    Requests to a hosted backend are already retried by transcription_scheduler, after the errors that can succeed on a retry only,
+    so they are tried once here rather than retried again after every error, including those that cannot succeed, such as a rejected file.
+
+    Args:
+    transcribe_function (function): The function used to transcribe the file, such as transcribe or transcribe_with_timestamps.
+    absolute_path_to_file (str): The absolute path to the audio file that will be transcribed.
+    retries (int): The number of times to retry after the first failed attempt, if the backend is not hosted. Defaults to 3.
+    backoff (float): The number of seconds to wait before the first retry, doubling after each failed retry. Defaults to 2 seconds.
+
+    Returns:
+    The result of transcribe_function, or None if every attempt failed.
+    """
+    if get_backend().hosted:
+        retries = 0
+    for attempt in range(retries + 1):
+        try:
+            transcription = transcribe_function(absolute_path_to_file)
+            if transcription is not None:
+                return transcription
+        except Exception as e:
+            print(f"Error transcribing {absolute_path_to_file} (attempt {attempt + 1}): {e}")
+        if attempt < retries:
+            metrics.increment("retries_total", operation="transcribe")
+            time.sleep(backoff * 2 ** attempt)
+    return None
+
+
 def transcribe(absolute_path_to_file):
     """
-    Transcribes an audio file to text in English using OpenAI's Whisper model.
+    Transcribes an audio file to text in English using the transcription backend selected by TRANSCRIPTION_BACKEND.
     
     Args:
-    absolute_path_to_file (str): The absolute path to an mp3 file that will be transcribed. 
+    absolute_path_to_file (str): The absolute path to an audio file that will be transcribed. 
 
     Returns:
     str: The transcription of the audio file in English as a plain text string, or None if an error occurred.
@@ -168,15 +361,8 @@ def transcribe(absolute_path_to_file):
     >>> transcribe('/absolute/path/to/example_video.mp3')
     'This is the transcription of the audio file.'
     """
-    client = OpenAI()
     try:
-        with open(absolute_path_to_file, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file, 
-                response_format="text"
-            )
-        return transcription
+        return get_backend().transcribe(absolute_path_to_file)
     except FileNotFoundError:
         print(f"File not found: {absolute_path_to_file}")
         return None
@@ -188,100 +374,233 @@ def transcribe(absolute_path_to_file):
         return None
 
 
-def transcribe_multiple(list_of_paths):
+def normalize_word(word):
+    """
+    Lowercases a word and strips its punctuation, so the same spoken word matches across differently punctuated transcriptions.
+
+    Args:
+    word (str): The word to normalize.
+
+    Returns:
+    str: The normalized word.
+
+    Example:
+    >>> normalize_word('Hello,')
+    'hello'
+    """
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def find_text_overlap(previous_words, next_words, window_words = 200, min_match_words = 8):
+    """
+    Finds where the start of a chunk's transcription repeats the end of the previous chunk's transcription.
+    Compares the last window_words of previous_words with the first window_words of next_words and takes the longest run of matching words.
+
+    Args:
+    previous_words (list of str): The words of the previous chunk's transcription.
+    next_words (list of str): The words of the next chunk's transcription.
+    window_words (int): The number of words at the chunk boundary searched for repeated text. Defaults to 200, which comfortably covers 30 seconds of speech.
+    min_match_words (int): The minimum number of consecutive matching words treated as repeated text. Defaults to 8.
+
+    Returns:
+    tuple of (int, int): The index in previous_words where the repeated text starts and the index in next_words where it starts, or None if no repeated text was found.
+    """
+    tail_start = max(0, len(previous_words) - window_words)
+    tail = [normalize_word(word) for word in previous_words[tail_start:]]
+    head = [normalize_word(word) for word in next_words[:window_words]]
+
+    match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+    if match.size < min_match_words:
+        return None
+    return tail_start + match.a, match.b
+
+
+def stitch_texts(texts, window_words = 200, min_match_words = 8):
+    """
+    Joins the transcriptions of overlapping audio chunks, keeping a single copy of the text repeated in each overlap.
+    The previous chunk is kept up to where the repeated text starts and the next chunk from that same point on.
+    Chunks whose transcription failed are given as None, and the chunks on either side of them are joined without removing any text.
+
+    Args:
+    texts (list of str): The transcriptions of consecutive audio chunks, in order.
+    window_words (int): The number of words at each chunk boundary searched for repeated text. Defaults to 200.
+    min_match_words (int): The minimum number of consecutive matching words treated as repeated text. Defaults to 8.
+
+    Returns:
+    str: The stitched transcription, or an empty string if no text was given.
+
+    Example:
+    >>> stitch_texts(['one two three four five six seven eight nine', 'four five six seven eight nine ten eleven'], min_match_words=3)
+    'one two three four five six seven eight nine ten eleven'
+    """
+    words = []
+    previous_is_adjacent = False
+    for text in texts:
+        if text is None:
+            previous_is_adjacent = False
+            continue
+        next_words = text.split()
+        overlap = find_text_overlap(words, next_words, window_words, min_match_words) if previous_is_adjacent else None
+        if overlap:
+            words = words[:overlap[0]] + next_words[overlap[1]:]
+        else:
+            words += next_words
+        previous_is_adjacent = True
+    return " ".join(words)
+
+
+def stitch_segments(transcribed_chunks, offsets, overlap):
     """
-    Transcribes multiple audio files and returns the concatenated transcriptions.
+    Removes the transcription segments repeated in the overlap between consecutive audio chunks, aligning segments by time.
+    Each overlap is cut at its midpoint: the previous chunk keeps the segments that start before the cut and the next chunk keeps the segments that start at or after it.
+    Chunks whose transcription failed are given as None, and the chunks on either side of them keep all of their segments.
+
+    Args:
+    transcribed_chunks (list of (list of Verbose JSON transcription objects)): The segments of each chunk, with times relative to the start of the chunk.
+    offsets (list of float): The starting time of each chunk in the original audio, in seconds.
+    overlap (float): The duration of the overlap between consecutive chunks, in seconds.
+
+    Returns:
+    list of (list of Verbose JSON transcription objects): The segments kept for each chunk, or None for chunks whose transcription failed.
+    """
+    stitched = []
+    for i, segments in enumerate(transcribed_chunks):
+        if segments is None:
+            stitched.append(None)
+            continue
+        if i > 0 and transcribed_chunks[i - 1] is not None:
+            cut = offsets[i] + overlap / 2
+            segments = [segment for segment in segments if segment.start + offsets[i] >= cut]
+        if i + 1 < len(transcribed_chunks) and transcribed_chunks[i + 1] is not None:
+            cut = offsets[i + 1] + overlap / 2
+            segments = [segment for segment in segments if segment.start + offsets[i] < cut]
+        stitched.append(segments)
+    return stitched
+
+
+def transcribe_multiple(list_of_paths, max_workers = 4, retries = 3):
+    """
+    Transcribes multiple audio files concurrently and returns the concatenated transcriptions, in the order of list_of_paths.
     
     Args:
     list_of_paths (list of str): A list of absolute file paths to audio files to be transcribed.
+    max_workers (int): The maximum number of files transcribed at the same time. Defaults to 4.
+    retries (int): The number of times a failed file is retried, as in transcribe_with_retries. Defaults to 3.
 
     Returns:
-    str: A concatenated string containing the transcriptions of all valid audio files, separated by newlines. 
-    An empty string is returned if no valid transcriptions are found.
+    str: A concatenated string containing the transcriptions of all valid audio files, with the text repeated in the overlap between consecutive files kept once. 
+    None is returned if no valid transcriptions are found.
     
     Example:
     >>> transcribe_multiple(['/absolute/path/to/chunk_1.mp3', '/absolute/path/to/chunk_2.mp3'])
     'Transcription of file1. Transcription of file2'
     """
-    transcription = ""
-    
-    for path in list_of_paths:
-        transcribed_text = transcribe(path)
-        if transcribed_text:
-            transcription += transcribed_text + " "
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        transcribed_texts = list(executor.map(metrics.in_context(lambda path: transcribe_with_retries(transcribe, path, retries)), list_of_paths))
 
+    transcription = stitch_texts(transcribed_texts)
     return transcription if transcription != "" else None
 
 
-def format_timestamps(transcription):
+def format_timestamps(transcription, offset = 0):
     """
     Extracts transcribed text, start times, and end times from a list of verbose JSON transcription objects. 
     
     Args:
     transcription (list of verbose JSON transcription objects): A list of transcribed segments from the Whisper model
+    offset (float): The number of seconds added to each start and end time, such as the start of an audio chunk within the original audio. Defaults to 0.
 
     Returns:
-    list of str: A list of JSON-formatted strings, each representing a transcription segment with the following structure:
-    {
-        "start": "Starting time in seconds",
-        "end": "Ending time in seconds",
-        "text": "Transcribed text"
-    }
+    TimedTranscript: The transcribed segments, each with a "start" and "end" time in seconds and its "text".
     """
-    result = []
-    for item in transcription:
-        data = {"start": item.start, "end": item.end, "text": item.text}
-        json_object = json.dumps(data, indent=4)
-        result.append(json_object)
-    return result
+    return TimedTranscript.from_segments(transcription, offset)
 
 
 def transcribe_with_timestamps(absolute_path_to_file):
     """
-    Transcribes an audio file to text with corresponding timestamps at the segment level in English using OpenAI's Whisper model. 
-    Each segment is returned as a transcription object defined by OpenAI, representing a verbose json transcription response from the model.
+    Transcribes an audio file to text with corresponding timestamps at the segment level in English, using the transcription backend selected by TRANSCRIPTION_BACKEND. 
+    Each segment has the `start`, `end`, and `text` of a verbose json transcription response from OpenAI's Whisper model, whichever backend produced it.
     
     Args:
-    absolute_path_to_file (str): The absolute path to an mp3 file that will be transcribed. 
+    absolute_path_to_file (str): The absolute path to an audio file that will be transcribed. 
 
     Returns:
-    list of Verbose JSON transcription objects: A list of transcribed segments.
-    """
-    client = OpenAI()
-    with open(absolute_path_to_file, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1", 
-            file=audio_file, 
-            response_format="verbose_json",
-            timestamp_granularities=["segment"]
-        )
-        return transcription.segments  
+    list of transcription segments: A list of transcribed segments.
+    """
+    return get_backend().transcribe_segments(absolute_path_to_file)
 
 
-def transcribe_multiple_audio_with_timestamps(list_of_paths):
+def transcribe_multiple_audio_with_timestamps(list_of_paths, offsets = None, overlap = OVERLAP_DURATION_MS / 1000, max_workers = 4, retries = 3):
     """
-    Transcribes multiple audio files and returns the concatenated transcriptions with timestamps. 
+    Transcribes multiple audio files concurrently and returns the concatenated transcriptions with timestamps, in the order of list_of_paths. 
+    The timestamps of each file are shifted by the file's offset, so they are relative to the start of the original audio.
+    Segments repeated in the overlap between consecutive files are kept once.
     
     Args:
     list_of_paths (list of str): A list of absolute file paths to audio files to be transcribed.
+    offsets (list of float): The starting time of each file in the original audio, in seconds. Defaults to None, which uses the offsets of the chunks created by split_audio with its default durations.
+    overlap (float): The duration of the overlap between consecutive files, in seconds. Defaults to 30 seconds.
+    max_workers (int): The maximum number of files transcribed at the same time. Defaults to 4.
+    retries (int): The number of times a failed file is retried, as in transcribe_with_retries. Defaults to 3.
 
     Returns:
-    list of str: A list of JSON-formatted strings, each representing a transcription segment. 
-    An empty list is returned if no valid transcriptions are found. Each string has the following structure:
-    {
-        "start": "Starting time in seconds",
-        "end": "Ending time in seconds",
-        "text": "Transcribed text"
-    }
-    """
-    transcription = []
-    
-    for path in list_of_paths:
-        transcribed_text = transcribe_with_timestamps(path)
-        if transcribed_text:
-            transcription.append(format_timestamps(transcribed_text))
-    
-    transcription = [json_string for sublist in transcription for json_string in sublist]
+    TimedTranscript: The transcribed segments, each with a "start" and "end" time in seconds and its "text". 
+    None is returned if no valid transcriptions are found.
+    """
+    if offsets is None:
+        offsets = get_chunk_offsets(len(list_of_paths))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        transcribed_chunks = list(executor.map(metrics.in_context(lambda path: transcribe_with_retries(transcribe_with_timestamps, path, retries)), list_of_paths))
+
+    transcribed_chunks = stitch_segments(transcribed_chunks, offsets, overlap)
+
+    transcription = TimedTranscript.concatenate(
+        format_timestamps(transcribed_text, offset)
+        for transcribed_text, offset in zip(transcribed_chunks, offsets) if transcribed_text
+    )
+    return transcription if len(transcription) > 0 else None
+
+
+def transcribe_windows(list_of_paths, bounds, on_window_transcript, duration, overlap = WINDOW_OVERLAP_MS / 1000, max_workers = 4, retries = 3):
+    """
+    Transcribes the audio windows created by split_audio_windows concurrently, passing each window's segments to on_window_transcript in playback order as soon as it and every window before it are done.
+    Each window's audio runs overlap seconds into the next window. The overlap is cut at its midpoint, as in stitch_segments, assuming the next window will be transcribed.
+    If it is not, the segments after the cut are passed on in its place.
+
+    Args:
+    list_of_paths (list of str): The absolute paths to the audio of each window.
+    bounds (list of (float, float)): The start and end of each window in the original audio, in seconds, as returned by get_window_bounds.
+    on_window_transcript (function): Called with each window's TimedTranscript, the window's start and end in seconds, and the duration of the video in seconds. Not called for windows without any segments.
+    duration (float): The duration of the video in seconds.
+    overlap (float): The duration of the overlap between consecutive windows, in seconds. Defaults to 10 seconds.
+    max_workers (int): The maximum number of windows transcribed at the same time. Defaults to 4.
+    retries (int): The number of times a failed window is retried, as in transcribe_with_retries. Defaults to 3.
+
+    Returns:
+    TimedTranscript: The transcribed segments of every window, each with a "start" and "end" time in seconds and its "text".
+    None is returned if no valid transcriptions are found.
+    """
+    windows = []
+    tail = None
+    previous_transcribed = False
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        transcribed_windows = executor.map(metrics.in_context(lambda path: transcribe_with_retries(transcribe_with_timestamps, path, retries)), list_of_paths)
+        for segments, (start, end) in zip(transcribed_windows, bounds):
+            if segments is None:
+                window, tail, previous_transcribed = tail, None, False
+            else:
+                if previous_transcribed:
+                    segments = [segment for segment in segments if segment.start >= overlap / 2]
+                cut = end - start + overlap / 2
+                window = format_timestamps([segment for segment in segments if segment.start < cut], start)
+                tail = format_timestamps([segment for segment in segments if segment.start >= cut], start)
+                previous_transcribed = True
+            if window is not None and len(window) > 0:
+                windows.append(window)
+                on_window_transcript(window, start, end, duration)
+
+    transcription = TimedTranscript.concatenate(windows)
     return transcription if len(transcription) > 0 else None
 
 
@@ -302,101 +621,224 @@ def delete_file(absolute_path_to_file):
         print(f"Error deleting file {absolute_path_to_file}: {e}")
 
 
-def get_db_connection(db):
+def process_video_transcription(youtube_video_url, timestamped, on_stage = None, on_window_transcript = None):
     """
-    Establishes and returns a connection to the PostgreSQL database.
-
-    Args:
-    db (str): The name of the PostgreSQL database.
-    """
-    user = os.getenv("PGUSER")
-    return psycopg2.connect(
-        dbname=db,  
-        user=user,              
-        host="localhost",             
-        port="5432"                    
-    )
+    Returns a transcription of a YouTube video, with or without timestamps depending on the value of 'timestamped'.
 
-
-def process_video_transcription(youtube_video_url, timestamped):
-    """
-    Downloads a YouTube video's audio and returns a transcription of this audio file, with or without timestamps depending on the value of 'timestampedr'.
+    If USE_CAPTIONS is set and the video has English manual or automatic captions, they are converted to the same format as a Whisper transcription and returned, without downloading any audio.
+    Otherwise, the video's audio is downloaded and transcribed.
     
-    Directly transcribes the audio if the file size is below the default threshold of 25 MB (which is the limit for Whisper).
-    Splits the audio into smaller chunks, transcribes each chunk, and returns a concatenation of these transcriptions if the file size is above the default threshold. 
+    Directly transcribes the audio if the transcription backend has no upload limit, or if the file size is below the backend's limit (25 MB for OpenAI's Whisper).
+    Otherwise, splits the audio into smaller chunks, transcribes each chunk, and returns a concatenation of these transcriptions. 
+    If timestamped is True and on_window_transcript is given, the audio is instead split into the windows of get_window_bounds, which are transcribed by transcribe_windows
+    and passed to on_window_transcript in playback order. If the audio cannot be split, it is transcribed as usual and on_window_transcript is not called.
 
-    Deletes any audio files downloaded after creating transcription. 
+    The audio and its chunks are written to a temporary directory for this request, which is deleted after creating the transcription. 
 
     Args:
     youtube_video_url (str): The URL of the YouTube video to be processed.
     timestamped (bool): True indicates that we should generate timestamps in our transcript, and False indicates no timestamps.
+    on_stage (function): Called with 'captions' if USE_CAPTIONS is set, then with 'downloading' and 'transcribing' if the audio has to be transcribed, as processing moves through those stages. Defaults to None.
+    on_window_transcript (function): Called with each window's TimedTranscript, its start and end in seconds, and the duration of the video in seconds, as described in transcribe_windows. Defaults to None.
 
     Returns:
     if timestamped is False: 
         str: The transcription of the video without timestamps, or None if a transcription could not be made. 
     if timestamped is True:
-        list of str: A list of JSON-formatted strings, each representing a transcription segment with timestamps. 
+        TimedTranscript: The transcription segments with timestamps, or None if a transcription could not be made. 
     """
-    path = download_audio(youtube_video_url)
-    if not path: return None
+    if USE_CAPTIONS:
+        if on_stage: on_stage("captions")
+        with metrics.stage("captions"):
+            segments = get_caption_segments(youtube_video_url)
+        if segments:
+            return format_timestamps(segments) if timestamped else " ".join(segment.text for segment in segments)
+
+    if on_stage: on_stage("downloading")
+    download_dir = tempfile.mkdtemp(prefix="audio_")
+    try:
+        with metrics.stage("download"):
+            path = download_audio(youtube_video_url, output_dir=download_dir)
+        if not path: return None
+        metrics.increment("download_bytes_total", os.path.getsize(path))
+
+        if on_stage: on_stage("transcribing")
+
+        backend = get_backend()
+        try:
+            metrics.record_audio(get_audio_duration_ms(path) / 1000, backend.hosted)
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            print(f"Could not measure the duration of {path}: {e}")
+
+        if timestamped and on_window_transcript:
+            window_dir = os.path.join(download_dir, "windows")
+            os.mkdir(window_dir)
+            try:
+                with metrics.stage("split_audio"):
+                    duration = get_audio_duration_ms(path) / 1000
+                    bounds = get_window_bounds(duration)
+                    window_files = split_audio_windows(path, bounds, duration, output_dir=window_dir)
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                print(f"Error splitting audio file {path} into windows, transcribing it whole: {e}")
+            else:
+                with metrics.stage("transcribe"):
+                    return transcribe_windows(window_files, bounds, on_window_transcript, duration)
+
+        file_size = check_file_size(path, backend.max_file_size_mb) if backend.max_file_size_mb else True
+        if file_size == None: return None
+
+        if file_size:
+            with metrics.stage("transcribe"):
+                return format_timestamps(transcribe_with_timestamps(path)) if timestamped else transcribe(path)
+
+        chunk_dir = os.path.join(download_dir, "chunks")
+        os.mkdir(chunk_dir)
+        try:
+            with metrics.stage("split_audio"):
+                audio_file_chunks = split_audio(path, output_dir=chunk_dir)
+        except subprocess.CalledProcessError as e:
+            print(f"Error splitting audio file {path}: {e}")
+            return None
+        with metrics.stage("transcribe"):
+            return transcribe_multiple_audio_with_timestamps(audio_file_chunks) if timestamped else transcribe_multiple(audio_file_chunks)
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
 
-    file_size = check_file_size(path)
-    if file_size == None: return None
 
-    if file_size:
-        transcription = format_timestamps(transcribe_with_timestamps(path)) if timestamped else transcribe(path)
+def add_timed_transcript_column():
+    """
+    Adds the 'timed_transcript_data' column to the 'videos' table of the PostgreSQL 'youtube_transcripts' database if it does not exist.
+    Timestamped transcripts are stored in it as TimedTranscript.to_bytes, replacing the list of JSON-formatted strings in 'timed_transcript', which is still read for videos stored before the column existed.
+    """
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE videos ADD COLUMN IF NOT EXISTS timed_transcript_data BYTEA")
+        connection.commit()
+
+
+def lookup_transcript(youtube_video_id, timestamped):
+    """
+    Fetches a stored transcript from the in-process transcript cache, or from the 'videos' table of the PostgreSQL 'youtube_transcripts' database on a cache miss.
+
+    Args:
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True to fetch the transcript with timestamps, False to fetch the transcript without timestamps.
+
+    Returns:
+    The stored transcript, in the same format returned by get_transcript, or None if it has not been stored.
+    """
+    cached = memory_cache.transcripts.get((youtube_video_id, timestamped))
+    if cached is not None:
+        metrics.increment("cache_lookups_total", cache="transcript", result="memory")
+        return cached
+
+    columns = "timed_transcript_data, timed_transcript" if timestamped else "transcript"
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(f"SELECT {columns} FROM videos WHERE youtube_video_id = %s", (youtube_video_id,))
+        row = cursor.fetchone()
+    if not row:
+        transcript = None
+    elif not timestamped:
+        transcript = row[0]
+    elif row[0]:
+        transcript = TimedTranscript.from_bytes(row[0])
+    elif row[1]:
+        transcript = TimedTranscript.from_json_strings(row[1])
     else:
-        audio_file_chunks = split_audio(path)
-        transcription = transcribe_multiple_audio_with_timestamps(audio_file_chunks) if timestamped else transcribe_multiple(audio_file_chunks)
-        for chunk in audio_file_chunks:
-            delete_file(chunk)
-    delete_file(path)
-    return transcription
+        transcript = None
+    if not transcript:
+        metrics.increment("cache_lookups_total", cache="transcript", result="miss")
+        return None
+
+    metrics.increment("cache_lookups_total", cache="transcript", result="database")
+    memory_cache.transcripts.set((youtube_video_id, timestamped), transcript)
+    return transcript
+
+
+def store_transcript(youtube_video_id, timestamped, transcript):
+    """
+    Stores a transcript in the 'videos' table of the PostgreSQL 'youtube_transcripts' database and the in-process transcript cache, replacing any stored transcript of the same kind.
+
+    Args:
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True if the transcript has timestamps, False if not.
+    transcript (str or TimedTranscript): The transcript, in the same format returned by get_transcript.
+    """
+    column = "timed_transcript_data" if timestamped else "transcript"
+    query = f"""
+        INSERT INTO videos (youtube_video_id, {column})
+        VALUES (%s, %s)
+        ON CONFLICT (youtube_video_id) DO UPDATE 
+        SET {column} = EXCLUDED.{column}
+    """
+    values = (youtube_video_id, psycopg2.Binary(transcript.to_bytes()) if timestamped else transcript)
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(query, values)
+        connection.commit() 
+    memory_cache.transcripts.set((youtube_video_id, timestamped), transcript)
+
 
+def create_transcript(youtube_video_url, youtube_video_id, timestamped, on_stage = None, on_window_transcript = None):
+    """
+    Processes a video into a transcript and stores it, unless another process stored it first.
+    A PostgreSQL advisory lock keyed on the video ID and timestamped flag ensures only one process at a time downloads and transcribes the same video.
+    Processes that waited on the lock find the stored transcript and return it without processing the video again.
 
-def get_transcript(youtube_video_url, timestamped):
+    Args:
+    youtube_video_url (str): The URL of the YouTube video.
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True indicates that we should generate timestamps in our transcript, and False indicates no timestamps.
+    on_stage (function): Called with the name of each processing stage as it starts. Defaults to None.
+    on_window_transcript (function): Called with each window of a timestamped transcript as it is transcribed, as described in process_video_transcription. Defaults to None.
+
+    Returns:
+    The transcript, in the same format returned by get_transcript, or None if a transcription could not be made.
+
+    Exceptions:
+    TimeoutError: If another process held the video's lock for longer than ADVISORY_LOCK_TIMEOUT_SECONDS.
+    """
+    with advisory_lock(f"transcript:{youtube_video_id}:{timestamped}"):
+        transcript = lookup_transcript(youtube_video_id, timestamped)
+        if transcript:
+            return transcript
+
+        transcript = process_video_transcription(youtube_video_url, timestamped, on_stage, on_window_transcript)
+        if transcript:
+            store_transcript(youtube_video_id, timestamped, transcript)
+        return transcript
+
+
+def get_transcript(youtube_video_url, timestamped, on_stage = None, on_window_transcript = None):
     """
     Retrieves the transcript for a given YouTube video.
 
     If the transcript exists in the PostgreSQL 'youtube_transcripts' database, it is fetched and returned. 
     If not, the function processes the video to generate a transcript, stores it in the database, and then returns the newly generated transcript.
+    Concurrent requests for the same video and timestamped flag are deduplicated, within this process and across processes, so the video is only downloaded and transcribed once.
 
     Args:
     youtube_video_url (str): The URL of the YouTube video.
     timestamped (bool): True indicates that we should generate timestamps in our transcript, and False indicates no timestamps.
+    on_stage (function): Called with 'captions', 'downloading', and 'transcribing', as in process_video_transcription, if the video has to be processed. Defaults to None.
+    on_window_transcript (function): Called with each window of a timestamped transcript as it is transcribed, as described in process_video_transcription.
+                                     Not called if the transcript is stored, comes from captions, or is being made by another request. Defaults to None.
 
     Returns:
     if timestamped is False:
         str: The transcription of the video without timestamps, or None if a transcription could not be made. 
     if timestamped is True:
-        list of str: A list of JSON-formatted strings, each representing a transcription segment with timestamps. 
+        TimedTranscript: The transcription segments with timestamps, or None if a transcription could not be made. 
     """
     youtube_video_id = extract_youtube_video_id(youtube_video_url)
-    connection = get_db_connection("youtube_transcripts")
-    cursor = connection.cursor()
     
     try:
-        column = "timed_transcript" if timestamped else "transcript"
-        cursor.execute(f"SELECT {column} FROM videos WHERE youtube_video_id = %s", (youtube_video_id,))
-        transcript = cursor.fetchone()
-        if transcript and transcript[0]:
-            return transcript[0] 
-        else:
-            transcript = process_video_transcription(youtube_video_url, timestamped)
-            query = f"""
-                INSERT INTO videos (youtube_video_id, {column})
-                VALUES (%s, %s)
-                ON CONFLICT (youtube_video_id) DO UPDATE 
-                SET {column} = EXCLUDED.{column}
-            """
-            values = (youtube_video_id, transcript)
-            cursor.execute(query, values)
-            connection.commit() 
+        transcript = lookup_transcript(youtube_video_id, timestamped)
+        if transcript:
             return transcript
+
+        return transcript_requests.do(
+            (youtube_video_id, timestamped),
+            lambda: create_transcript(youtube_video_url, youtube_video_id, timestamped, on_stage, on_window_transcript)
+        )
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
-    finally:
-        cursor.close()
-        connection.close()
-
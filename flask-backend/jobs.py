@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import generate_questions_for_video
+from scheduler import INTERACTIVE, PRIORITY_NAMES, priority
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# A running job is leased to the process running it, which renews the lease every third of JOB_LEASE_SECONDS.
+# Only jobs whose lease has run out, because their process stopped, are put back in the queue by other processes.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Jobs report and accept their priority by name, such as 'interactive'.
+PRIORITY_LEVELS = {name: level for level, name in PRIORITY_NAMES.items()}
+
+
+class JobStore:
+    """
+    Stores question generation jobs in a local SQLite database, so jobs survive restarts without any outside service.
+
+    Each job has a status of 'queued', 'running', 'done', or 'failed', and while running, a stage of
+    'captions', 'downloading', 'transcribing', 'summarizing', 'generating', or 'cleaning', an owner identifying the process running it,
+    and the time its lease on the job runs out.
+    """
+
+    def __init__(self, path = JOBS_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    video_url TEXT NOT NULL,
+                    timestamped INTEGER NOT NULL,
+                    regenerate INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT,
+                    lease_expires_at REAL,
+                    priority INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("lease_expires_at", "REAL"), ("priority", "INTEGER NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    def create(self, video_url, timestamped, regenerate = False, level = INTERACTIVE):
+        """
+        Adds a queued job.
+
+        Args:
+        video_url (str): The URL of the YouTube video.
+        timestamped (bool): True if the questions should include timestamps, False if not.
+        regenerate (bool): True to generate new questions even if questions are stored for the video. Defaults to False.
+        level (int): The priority of the job's requests to the model, INTERACTIVE or BACKGROUND. Defaults to INTERACTIVE.
+
+        Returns:
+        str: The ID of the new job.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO jobs (id, video_url, timestamped, regenerate, priority, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, video_url, int(timestamped), int(regenerate), level, now, now)
+            )
+        return job_id
+
+    def claim(self, job_id, owner, lease_seconds = JOB_LEASE_SECONDS):
+        """
+        Marks a queued job as running and leases it to an owner, unless another worker has already claimed it.
+
+        Args:
+        job_id (str): The ID of the job.
+        owner (str): Identifies the process claiming the job.
+        lease_seconds (float): How long the lease lasts unless it is renewed. Defaults to JOB_LEASE_SECONDS.
+
+        Returns:
+        bool: True if the job was claimed by this call, False if it was not queued.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (owner, now + lease_seconds, now, job_id)
+            )
+            return cursor.rowcount == 1
+
+    def renew_leases(self, owner, lease_seconds = JOB_LEASE_SECONDS):
+        """
+        Extends the lease on every job an owner is running.
+
+        Args:
+        owner (str): Identifies the process running the jobs.
+        lease_seconds (float): How long the renewed leases last. Defaults to JOB_LEASE_SECONDS.
+
+        Returns:
+        int: The number of leases renewed.
+        """
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, owner)
+            )
+            return cursor.rowcount
+
+    def update(self, job_id, **fields):
+        """
+        Updates the given fields of a job, such as its status, stage, result, or error.
+
+        Args:
+        job_id (str): The ID of the job.
+        fields: The columns to update and their new values. A result is stored as JSON.
+        """
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self.lock, self.connection:
+            self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        """
+        Fetches a job.
+
+        Args:
+        job_id (str): The ID of the job.
+
+        Returns:
+        dict: The job's ID, video URL, timestamped flag, priority name, status, stage, result, error, and creation and update times, or None if the job does not exist.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["timestamped"] = bool(job["timestamped"])
+        job["regenerate"] = bool(job["regenerate"])
+        job["priority"] = PRIORITY_NAMES[job["priority"]]
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def requeue_expired(self):
+        """
+        Puts jobs left running by a process that stopped, whose leases have run out, back in the queue.
+        Jobs that a live process is still running keep their status.
+
+        Returns:
+        list of str: The IDs of the jobs put back in the queue, oldest first.
+        """
+        condition = "status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        now = time.time()
+        with self.lock, self.connection:
+            rows = self.connection.execute(f"SELECT id FROM jobs WHERE {condition} ORDER BY created_at", (now,)).fetchall()
+            self.connection.execute(f"UPDATE jobs SET status = 'queued', stage = NULL, owner = NULL, lease_expires_at = NULL WHERE {condition}", (now,))
+        return [row["id"] for row in rows]
+
+    def requeue_unfinished(self):
+        """
+        Puts jobs whose leases have run out back in the queue, as requeue_expired does.
+
+        Returns:
+        list of str: The IDs of every queued job, oldest first.
+        """
+        self.requeue_expired()
+        with self.lock:
+            rows = self.connection.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row["id"] for row in rows]
+
+
+class JobQueue:
+    """
+    Runs question generation jobs on a background pool of worker threads, recording their progress in a JobStore.
+    While it runs, a heartbeat thread renews the leases on its running jobs, so other processes sharing the store leave them alone.
+
+    Example:
+    >>> queue = JobQueue(JobStore())
+    >>> job_id = queue.submit('https://www.youtube.com/watch?v=example_video', False)
+    >>> queue.store.get(job_id)['status']
+    'queued'
+    """
+
+    def __init__(self, store, max_workers = JOB_WORKERS, lease_seconds = JOB_LEASE_SECONDS):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.heartbeat = threading.Thread(target=self.renew_leases, name="job-heartbeat", daemon=True)
+        self.heartbeat.start()
+
+    def renew_leases(self):
+        """
+        Renews the leases on this queue's running jobs every third of the lease, until the queue shuts down,
+        and runs jobs whose leases have run out since, such as those of a process that was restarted moments ago.
+        """
+        while not self.stopped.wait(self.lease_seconds / 3):
+            try:
+                self.store.renew_leases(self.owner, self.lease_seconds)
+                for job_id in self.store.requeue_expired():
+                    self.executor.submit(self.run, job_id)
+            except Exception as e:
+                print(f"Error renewing job leases: {e}")
+
+    def submit(self, video_url, timestamped, regenerate = False, level = INTERACTIVE):
+        """
+        Queues a job that generates questions for a video.
+
+        Args:
+        video_url (str): The URL of the YouTube video.
+        timestamped (bool): True if the questions should include timestamps, False if not.
+        regenerate (bool): True to generate new questions even if questions are stored for the video. Defaults to False.
+        level (int): The priority of the job's requests to the model, INTERACTIVE for a user waiting on the job, or BACKGROUND for work such as pre-warming. Defaults to INTERACTIVE.
+
+        Returns:
+        str: The ID of the job.
+        """
+        job_id = self.store.create(video_url, timestamped, regenerate, level)
+        self.executor.submit(self.run, job_id)
+        return job_id
+
+    def resume(self):
+        """
+        Queues every job that is waiting in the store, or was running in a process that stopped and let its lease run out.
+        Another process may resume the same queued jobs; each job is run by whichever claims it first.
+
+        Returns:
+        int: The number of jobs resumed.
+        """
+        job_ids = self.store.requeue_unfinished()
+        for job_id in job_ids:
+            self.executor.submit(self.run, job_id)
+        return len(job_ids)
+
+    def run(self, job_id):
+        """
+        Runs a queued job, storing its questions when it finishes or its error if it fails.
+        Its requests to the model are sent at the priority the job was submitted with: INTERACTIVE by default, since a user is usually waiting on the job,
+        or BACKGROUND for work no one is waiting on, which is sent behind every interactive request.
+
+        Args:
+        job_id (str): The ID of the job.
+        """
+        if not self.store.claim(job_id, self.owner, self.lease_seconds):
+            return
+        job = self.store.get(job_id)
+        try:
+            with priority(PRIORITY_LEVELS[job["priority"]]):
+                questions = generate_questions_for_video(
+                    job["video_url"],
+                    job["timestamped"],
+                    job["regenerate"],
+                    on_stage=lambda stage: self.store.update(job_id, stage=stage)
+                )
+            self.store.update(job_id, status="done", stage=None, result=questions)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.update(job_id, status="failed", error=str(e))
+
+    def shutdown(self):
+        """
+        Stops accepting jobs without waiting for running jobs. Jobs that are still queued, or running once their lease runs out,
+        are resumed the next time the app starts.
+        """
+        self.stopped.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,179 @@
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+
+TRANSCRIPT_CACHE_BYTES = int(os.getenv("TRANSCRIPT_CACHE_BYTES", str(64 * 1024 * 1024)))
+QUESTION_CACHE_BYTES = int(os.getenv("QUESTION_CACHE_BYTES", str(16 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(60 * 60)))
+
+
+def estimate_size(value):
+    """
+    Estimates how many bytes a cached value takes up, using its nbytes if it has one, such as a TimedTranscript, or the length of its JSON encoding.
+
+    Args:
+    value: A TimedTranscript, or a JSON-serializable value such as a transcript or a list of questions.
+
+    Returns:
+    int: The estimated size of the value in bytes.
+    """
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    return len(json.dumps(value).encode("utf-8"))
+
+
+def copy_value(value):
+    """
+    Copies a mutable cached value, so that callers changing a value they were given, such as appending to a list of questions,
+    do not change the copy that later callers are given. Strings and TimedTranscripts are not changed in place, so they are shared.
+
+    Args:
+    value: A TimedTranscript, or a JSON-serializable value such as a transcript or a list of questions.
+
+    Returns:
+    The value, or a deep copy of it if it is a list or a dictionary.
+    """
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+
+class LRUCache:
+    """
+    A thread-safe, in-process least-recently-used cache bounded by the total size of its values in bytes.
+    Entries expire ttl seconds after they are stored. Lists and dictionaries are copied when they are stored and when they are returned.
+
+    Example:
+    >>> cache = LRUCache(max_bytes=1024, ttl=60)
+    >>> cache.set(('abc123', False), 'This is our transcript...')
+    >>> cache.get(('abc123', False))
+    'This is our transcript...'
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Returns the value stored for a key, marking it as most recently used.
+
+        Args:
+        key: The key the value was stored under.
+
+        Returns:
+        A copy of the stored value, or None if the key is missing or has expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self.remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return copy_value(value)
+
+    def set(self, key, value):
+        """
+        Stores a value for a key, evicting the least recently used entries until the cache fits within max_bytes.
+        Values larger than max_bytes are not stored.
+
+        Args:
+        key: The key to store the value under.
+        value: A JSON-serializable value.
+        """
+        size = estimate_size(value)
+        value = copy_value(value)
+        with self.lock:
+            self.remove(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                self.remove(oldest_key)
+                self.evictions += 1
+
+    def remove(self, key):
+        """
+        Removes a key without taking the lock. Callers must hold self.lock.
+
+        Args:
+        key: The key to remove.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def invalidate(self, key):
+        """
+        Removes the value stored for a key, if any.
+
+        Args:
+        key: The key to remove.
+        """
+        with self.lock:
+            self.remove(key)
+
+    def invalidate_where(self, predicate):
+        """
+        Removes every entry whose key matches a predicate.
+
+        Args:
+        predicate (function): A function taking a key and returning True if the entry should be removed.
+
+        Returns:
+        int: The number of entries removed.
+        """
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+            for key in keys:
+                self.remove(key)
+            return len(keys)
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache's counters.
+
+        Returns:
+        dict: The number of entries, bytes used, maximum bytes, hits, misses, evictions, and expirations.
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+transcripts = LRUCache(TRANSCRIPT_CACHE_BYTES, CACHE_TTL_SECONDS)
+question_sets = LRUCache(QUESTION_CACHE_BYTES, CACHE_TTL_SECONDS)
@@ -0,0 +1,328 @@
+import os
+import time
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+import memory_cache
+from database import get_pool_stats
+from structured_output import get_parse_failures
+from scheduler import chat_scheduler, transcription_scheduler
+
+# When set, responses from /generate_questions include a Server-Timing header with the time spent in each stage of the request.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+# Upper bounds, in seconds, of the buckets used for stage durations.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Prices in dollars, used to estimate cost: per million prompt and completion tokens for each chat model, and per minute of audio for hosted Whisper.
+TOKEN_PRICES = {
+    "gpt-4o": {"prompt": 2.50, "completion": 10.00},
+}
+WHISPER_PRICE_PER_MINUTE = 0.006
+
+DESCRIPTIONS = {
+    "stage_duration_seconds": ("histogram", "Time spent in each pipeline stage."),
+    "llm_requests_total": ("counter", "Chat completion requests sent to the model."),
+    "llm_tokens_total": ("counter", "Prompt and completion tokens used by chat completion requests."),
+    "llm_cost_dollars_total": ("counter", "Estimated cost of chat completion requests and hosted transcription."),
+    "download_bytes_total": ("counter", "Bytes of audio downloaded."),
+    "audio_seconds_total": ("counter", "Seconds of audio transcribed."),
+    "cache_lookups_total": ("counter", "Transcript and question cache lookups, by where the value was found."),
+    "retries_total": ("counter", "Operations retried after a failure."),
+    "time_to_first_question_seconds": ("histogram", "Time from starting to generate timed questions for a video until the first of them were ready."),
+    "timed_questions_total": ("counter", "Timed questions generated, by whether they were ready before their timestamp in a video that started playing when generation did."),
+}
+
+lock = threading.Lock()
+counters = defaultdict(float)
+histograms = {}
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def increment(name, value = 1, **labels):
+    """
+    Adds to a counter.
+
+    Args:
+    name (str): The name of the counter, such as 'llm_tokens_total'.
+    value (float): The amount to add. Defaults to 1.
+    **labels (str): The counter's labels, such as type='prompt'.
+    """
+    with lock:
+        counters[(name, label_key(labels))] += value
+
+
+def observe(name, value, **labels):
+    """
+    Records a value, such as a duration in seconds, in a histogram.
+
+    Args:
+    name (str): The name of the histogram, such as 'stage_duration_seconds'.
+    value (float): The value.
+    **labels (str): The histogram's labels, such as stage='download'.
+    """
+    with lock:
+        key = (name, label_key(labels))
+        if key not in histograms:
+            histograms[key] = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+        histogram = histograms[key]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+class RequestTrace:
+    """
+    Collects the time spent in each stage while handling one request.
+    Stages run concurrently, such as transcribing several audio chunks at once, add up, so a stage's total can exceed the request's wall time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = defaultdict(float)
+        self.started = time.monotonic()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.stages[stage] += seconds
+
+    def server_timing(self):
+        """
+        Formats the stage timings as a Server-Timing header value, in milliseconds, including the total time so far.
+
+        Returns:
+        str: The header value, such as 'download;dur=812.4, transcribe;dur=20511.0, total;dur=21400.2'.
+        """
+        with self.lock:
+            entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.monotonic() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def trace():
+    """
+    Starts collecting stage timings for a request, in the current context and in any function wrapped with in_context inside it.
+
+    Yields:
+    RequestTrace: The request's trace.
+    """
+    request_trace = RequestTrace()
+    token = current_trace.set(request_trace)
+    try:
+        yield request_trace
+    finally:
+        current_trace.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a pipeline stage, recording its duration in the 'stage_duration_seconds' histogram and in the current request's trace.
+
+    Args:
+    name (str): The name of the stage, such as 'download' or 'summarize'.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        seconds = time.monotonic() - started
+        observe("stage_duration_seconds", seconds, stage=name)
+        request_trace = current_trace.get()
+        if request_trace is not None:
+            request_trace.add(name, seconds)
+
+
+def in_context(function):
+    """
+    Wraps a function so it runs in a copy of the caller's context, such as inside a thread pool, keeping the caller's request trace.
+
+    Args:
+    function (function): The function to wrap.
+
+    Returns:
+    function: The wrapped function.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(function, *args, **kwargs)
+
+
+def record_completion(model, usage, seconds):
+    """
+    Records a chat completion request: its duration, its token usage, and its estimated cost.
+
+    Args:
+    model (str): The model the request was sent to.
+    usage: The completion's usage, with prompt_tokens and completion_tokens, or None if the response did not include it.
+    seconds (float): How long the request took.
+    """
+    increment("llm_requests_total", model=model)
+    observe("stage_duration_seconds", seconds, stage="llm_request")
+    if usage is None:
+        return
+    prices = TOKEN_PRICES.get(model, {})
+    for kind, tokens in (("prompt", usage.prompt_tokens), ("completion", usage.completion_tokens)):
+        increment("llm_tokens_total", tokens, model=model, type=kind)
+        increment("llm_cost_dollars_total", tokens * prices.get(kind, 0.0) / 1_000_000, service=model)
+
+
+def record_audio(seconds, hosted):
+    """
+    Records audio sent for transcription, and its estimated cost if it was transcribed by hosted Whisper.
+
+    Args:
+    seconds (float): The duration of the audio.
+    hosted (bool): True if the audio was transcribed by OpenAI's hosted Whisper, False if it was transcribed locally.
+    """
+    increment("audio_seconds_total", seconds, backend="openai" if hosted else "local")
+    if hosted:
+        increment("llm_cost_dollars_total", seconds / 60 * WHISPER_PRICE_PER_MINUTE, service="whisper-1")
+
+
+def record_questions_ready(questions, seconds, mode, first = False):
+    """
+    Records timed questions becoming ready, compared with the playback position of a video that started playing when generation started.
+    A question is ready before playback if its timestamp is at least the number of seconds generation has taken so far.
+
+    Args:
+    questions (list of dict): The questions that became ready, each with a timestamp.
+    seconds (float): The number of seconds since generation started.
+    mode (str): 'incremental' if the questions were generated window by window, or 'full' if they were generated from the whole transcript.
+    first (bool): True if these are the first questions ready for the video, recorded in 'time_to_first_question_seconds'. Defaults to False.
+    """
+    if first:
+        observe("time_to_first_question_seconds", seconds, mode=mode)
+    for question in questions:
+        ready = "before_playback" if (question.get("timestamp") or 0) >= seconds else "after_playback"
+        increment("timed_questions_total", mode=mode, ready=ready)
+
+
+# The stats of the caches, connection pool, and schedulers that only ever grow, exported as counters rather than gauges, so rate() and increase() handle restarts.
+CACHE_TOTALS = ("hits", "misses", "evictions", "expirations")
+POOL_TOTALS = ("checkouts", "wait_seconds_total", "health_checks", "discarded_connections")
+SCHEDULER_TOTALS = ("retries", "rate_limited")
+
+
+def total_name(name):
+    return name if name.endswith("_total") else f"{name}_total"
+
+
+def collect_gauges():
+    """
+    Collects gauges for the current state of the in-process caches, the database connection pool, and the API request schedulers' queues and budgets,
+    for render_prometheus. Their running totals are collected by collect_totals.
+
+    Returns:
+    dict: The gauges, mapping (name, labels) to a value.
+    """
+    gauges = {}
+    for cache_name, cache in (("transcripts", memory_cache.transcripts), ("question_sets", memory_cache.question_sets)):
+        for stat, value in cache.stats().items():
+            if stat not in CACHE_TOTALS:
+                gauges[(f"memory_cache_{stat}", (("cache", cache_name),))] = value
+    for stat, value in get_pool_stats().items():
+        if stat not in POOL_TOTALS:
+            gauges[(f"db_pool_{stat}", ())] = value
+    for scheduler in (chat_scheduler, transcription_scheduler):
+        stats = scheduler.stats()
+        for level, queued in stats.pop("queued").items():
+            gauges[("api_scheduler_queued", (("priority", level), ("scheduler", scheduler.name)))] = queued
+        for stat, value in stats.items():
+            if stat not in SCHEDULER_TOTALS:
+                gauges[(f"api_scheduler_{stat}", (("scheduler", scheduler.name),))] = value
+    return gauges
+
+
+def collect_totals():
+    """
+    Collects the running totals of the in-process caches, the database connection pool, structured output parse failures, and the API request schedulers,
+    such as cache hits and rate limit errors, for render_prometheus. Each name ends in _total.
+
+    Returns:
+    dict: The totals, mapping (name, labels) to a value.
+    """
+    totals = {}
+    for cache_name, cache in (("transcripts", memory_cache.transcripts), ("question_sets", memory_cache.question_sets)):
+        stats = cache.stats()
+        for stat in CACHE_TOTALS:
+            totals[(f"memory_cache_{stat}_total", (("cache", cache_name),))] = stats[stat]
+    stats = get_pool_stats()
+    for stat in POOL_TOTALS:
+        totals[(f"db_pool_{total_name(stat)}", ())] = stats[stat]
+    for schema_name, failures in get_parse_failures().items():
+        totals[("structured_output_parse_failures_total", (("schema", schema_name),))] = failures
+    for scheduler in (chat_scheduler, transcription_scheduler):
+        stats = scheduler.stats()
+        for stat in SCHEDULER_TOTALS:
+            totals[(f"api_scheduler_{stat}_total", (("scheduler", scheduler.name),))] = stats[stat]
+    return totals
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def render_prometheus(gauges = None, totals = None):
+    """
+    Renders every counter and histogram in the Prometheus text exposition format.
+
+    Args:
+    gauges (dict): Extra gauges to include, such as cache and connection pool stats, mapping (name, labels) to a value, where labels is a tuple of (label, value) pairs. Defaults to None.
+    totals (dict): Extra counters to include, such as those returned by collect_totals, in the same form as gauges. Defaults to None.
+
+    Returns:
+    str: The metrics.
+    """
+    with lock:
+        counter_items = sorted(counters.items())
+        histogram_items = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in histograms.items())
+
+    lines = []
+    described = set()
+
+    def describe(name, kind, description):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counter_items:
+        describe(name, *DESCRIPTIONS.get(name, ("counter", name)))
+        lines.append(f"{name}{format_labels(labels)} {value:g}")
+
+    for (name, labels), histogram in histogram_items:
+        describe(name, *DESCRIPTIONS.get(name, ("histogram", name)))
+        for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+        lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']:g}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+
+    for (name, labels), value in sorted((totals or {}).items()):
+        describe(name, "counter", name.replace("_", " ").capitalize() + ".")
+        lines.append(f"{name}{format_labels(labels)} {value:g}")
+
+    for (name, labels), value in sorted((gauges or {}).items()):
+        describe(name, "gauge", name.replace("_", " ").capitalize() + ".")
+        lines.append(f"{name}{format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """
+    Clears every counter and histogram.
+    """
+    with lock:
+        counters.clear()
+        histograms.clear()
@@ -0,0 +1,217 @@
+import os
+import copy
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from generate_transcript import extract_youtube_video_id, get_transcript, get_window_bounds
+from generate_questions import get_questions, shuffled
+from question_cache import get_cached_questions, store_questions
+from question_filter import filter_questions
+from single_flight import SingleFlight
+import metrics
+
+question_requests = SingleFlight()
+
+# When set, streamed timestamped questions are generated window by window in playback order, so the questions for the start of a video arrive first.
+INCREMENTAL_QUESTIONS = os.getenv("INCREMENTAL_QUESTIONS", "true").lower() == "true"
+
+
+def create_questions(youtube_video_url, youtube_video_id, timestamped, on_stage = None, on_question = None):
+    """
+    Transcribes a video, generates questions from its transcript, and stores the finished questions.
+
+    Args:
+    youtube_video_url (str): The URL of the YouTube video.
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True if the questions should include timestamps, False if not.
+    on_stage (function): Called with the name of each processing stage as it starts. Defaults to None.
+    on_question (function): Called with each question as soon as it has been generated, before the questions are cleaned. Defaults to None.
+
+    Returns:
+    list of dict: The questions, in the same format returned by get_questions.
+
+    Exceptions:
+    ValueError: If the video could not be transcribed.
+    """
+    started = time.monotonic()
+    transcript = get_transcript(youtube_video_url, timestamped, on_stage)
+    if not transcript:
+        raise ValueError("The video could not be transcribed")
+
+    questions = get_questions(transcript, timestamped, on_stage=on_stage, on_question=on_question)
+    if timestamped:
+        metrics.record_questions_ready(questions, time.monotonic() - started, "full", first=True)
+    store_questions(youtube_video_id, timestamped, questions)
+    return questions
+
+
+def create_questions_incrementally(youtube_video_url, youtube_video_id, on_stage = None, on_question = None, on_window = None, max_questions = 15, max_window_workers = 4):
+    """
+    Transcribes a video and generates timestamped questions from it window by window, in playback order, and stores the finished questions.
+    The video is divided into the windows of get_window_bounds: a short first window, then longer ones. Questions are generated for each window as soon as it has been transcribed,
+    while later windows are still being transcribed, and each window gets a share of max_questions in proportion to its length.
+    If the transcript was already stored or came from captions, it is divided into the same windows, which are processed in playback order.
+    Once every window is done, near-duplicate questions across windows are removed with filter_questions.
+    If questions could not be generated for some windows, the questions from the others are returned, but not stored.
+
+    Args:
+    youtube_video_url (str): The URL of the YouTube video.
+    youtube_video_id (str): The ID of the YouTube video.
+    on_stage (function): Called with the name of each processing stage as it starts. Windows overlap, so 'summarizing' is reported once, when the first window starts. Defaults to None.
+    on_question (function): Called with each question as soon as it has been generated, before the questions are cleaned. Defaults to None.
+    on_window (function): Called with the start and end of each window in seconds, and its cleaned questions, in playback order as soon as the window and every window before it are done,
+                          while later windows may still be transcribing. A window whose questions could not be generated is passed with no questions. Defaults to None.
+    max_questions (int): The maximum number of questions returned. Defaults to 15.
+    max_window_workers (int): The maximum number of windows processed at the same time. Defaults to 4.
+
+    Returns:
+    list of dict: The questions, in the same format returned by get_questions.
+
+    Exceptions:
+    ValueError: If the video could not be transcribed, or questions could not be generated for any window.
+    """
+    started = time.monotonic()
+    windows = []
+    questions = []
+    failed = []
+    done = 0
+    lock = threading.Lock()
+
+    def finish_windows():
+        # Called whenever a window's questions are done. Windows are finished in playback order, each once every window before it is done,
+        # while later windows may still be transcribing.
+        nonlocal done
+        with lock:
+            while done < len(windows) and windows[done][2].done():
+                start, end, future = windows[done]
+                done += 1
+                try:
+                    window_questions = future.result()
+                except Exception as e:
+                    print(f"Error generating questions for {youtube_video_url} from {start:.0f}s to {end:.0f}s: {e}")
+                    failed.append((start, end))
+                    window_questions = []
+                else:
+                    metrics.record_questions_ready(window_questions, time.monotonic() - started, "incremental", first=len(failed) == done - 1)
+                questions.extend(window_questions)
+                if on_window: on_window(start, end, window_questions)
+
+    with ThreadPoolExecutor(max_workers=max_window_workers) as executor:
+        def generate_window(window, start, end, duration):
+            if not windows and on_stage: on_stage("summarizing")
+            budget = max(1, round(max_questions * (end - start) / duration)) if duration else max_questions
+            future = executor.submit(metrics.in_context(get_questions), window, True, on_question=on_question, max_questions=budget, max_extractions=budget)
+            with lock:
+                windows.append((start, end, future))
+            future.add_done_callback(lambda future: finish_windows())
+
+        transcript = get_transcript(youtube_video_url, True, on_stage, on_window_transcript=generate_window)
+        if not transcript:
+            raise ValueError("The video could not be transcribed")
+        if not windows:
+            duration = transcript[-1]["end"]
+            bounds = get_window_bounds(duration)
+            for window, (start, end) in zip(transcript.split_at([start for start, _ in bounds[1:]]), bounds):
+                if len(window) > 0:
+                    generate_window(window, start, end, duration)
+    finish_windows()
+
+    if len(failed) == len(windows):
+        raise ValueError("Questions could not be generated for any part of the video")
+    if on_stage: on_stage("cleaning")
+    with metrics.stage("filter_questions"):
+        questions = filter_questions(questions, max_questions)
+    # Questions missing some windows are returned, but not stored, so the next request generates the whole set again.
+    if failed:
+        print(f"Not storing questions for {youtube_video_url}: {len(failed)} of {len(windows)} windows failed")
+        return questions
+    store_questions(youtube_video_id, True, questions)
+    return questions
+
+
+def generate_questions_for_video(youtube_video_url, timestamped, regenerate = False, on_stage = None, on_question = None, on_window = None):
+    """
+    Returns the questions for a YouTube video, generating them only if no question set has been stored for the video with the current prompts and model.
+    Concurrent requests for the same video and timestamped flag share a single generation.
+    If on_window is given and timestamped is True, the questions are generated window by window in playback order by create_questions_incrementally.
+
+    Args:
+    youtube_video_url (str): The URL of the YouTube video.
+    timestamped (bool): True if the questions should include timestamps, False if not.
+    regenerate (bool): True to ignore any stored questions and generate a new set, which replaces the stored one. Defaults to False.
+    on_stage (function): Called with 'captions', 'downloading', 'transcribing', 'summarizing', 'generating', and 'cleaning' as processing moves through those stages. 
+                         Stages that are skipped, such as downloading a video whose transcript is stored, are not reported. Defaults to None.
+    on_question (function): Called with each question as soon as it has been generated, before the questions are cleaned. 
+                            Not called for stored questions, or when another request is already generating questions for the video. Defaults to None.
+    on_window (function): Called with the start and end of each window in seconds, and its cleaned questions, as described in create_questions_incrementally.
+                          Not called for stored questions, or when another request is already generating questions for the video. Defaults to None.
+
+    Returns:
+    list of dict: A list of dictionaries, each containing a question, options, correct answer, and optionally a timestamp.
+    """
+    youtube_video_id = extract_youtube_video_id(youtube_video_url)
+    if not regenerate:
+        questions = get_cached_questions(youtube_video_id, timestamped)
+        if questions is not None:
+            return questions
+
+    if timestamped and on_window:
+        create = lambda: create_questions_incrementally(youtube_video_url, youtube_video_id, on_stage, on_question, on_window)
+    else:
+        create = lambda: create_questions(youtube_video_url, youtube_video_id, timestamped, on_stage, on_question)
+    return question_requests.do((youtube_video_id, timestamped, regenerate), create)
+
+
+def generate_with_events(youtube_video_url, timestamped, regenerate, emit):
+    """
+    Generates the questions for a YouTube video, passing an event to emit as each stage starts and each question is generated.
+    Failures are reported as an error event instead of being raised, so the last event is always a final or error event.
+    If INCREMENTAL_QUESTIONS is set, timestamped questions are generated window by window, with a window event as each window is done.
+
+    Args:
+    youtube_video_url (str): The URL of the YouTube video.
+    timestamped (bool): True if the questions should include timestamps, False if not.
+    regenerate (bool): True to ignore any stored questions and generate a new set, which replaces the stored one.
+    emit (function): Called with each event, as described in stream_questions_for_video, possibly from several threads.
+    """
+    try:
+        questions = generate_questions_for_video(
+            youtube_video_url,
+            timestamped,
+            regenerate,
+            on_stage=lambda stage: emit({"type": "stage", "stage": stage}),
+            on_question=lambda question: emit({"type": "question", "question": shuffled([copy.deepcopy(question)])[0]}),
+            on_window=(lambda start, end, questions: emit({"type": "window", "start": start, "end": end, "questions": copy.deepcopy(questions)})) if INCREMENTAL_QUESTIONS else None
+        )
+        emit({"type": "final", "questions": questions})
+    except Exception as e:
+        emit({"type": "error", "error": str(e)})
+
+
+def stream_questions_for_video(youtube_video_url, timestamped, regenerate = False):
+    """
+    Generates the questions for a YouTube video, yielding events as soon as they happen instead of waiting for the finished set.
+    Questions are generated on a background thread, and yielded as each key point is turned into a question. The last event holds the final, cleaned questions.
+
+    Args:
+    youtube_video_url (str): The URL of the YouTube video.
+    timestamped (bool): True if the questions should include timestamps, False if not.
+    regenerate (bool): True to ignore any stored questions and generate a new set, which replaces the stored one. Defaults to False.
+
+    Yields:
+    dict: An event, which is one of:
+    - {"type": "stage", "stage": str}: A processing stage has started.
+    - {"type": "question", "question": dict}: A question has been generated. It may later be removed when the questions are cleaned.
+    - {"type": "window", "start": float, "end": float, "questions": list of dict}: Timestamped questions are being generated incrementally, and every question
+      for the part of the video from start to end seconds is ready. Windows are reported in playback order, so the questions up to end can be shown.
+    - {"type": "final", "questions": list of dict}: The final questions, in the same format returned by generate_questions_for_video.
+    - {"type": "error", "error": str}: Generation failed. No further events follow.
+    """
+    events = queue.Queue()
+    threading.Thread(target=generate_with_events, args=(youtube_video_url, timestamped, regenerate, events.put), daemon=True).start()
+    while True:
+        event = events.get()
+        yield event
+        if event["type"] in ("final", "error"):
+            return
@@ -0,0 +1,195 @@
+"""
+Pre-generates transcripts and questions for a list of YouTube videos, so students opening them find their questions already stored.
+
+Usage:
+    python prewarm.py https://www.youtube.com/watch?v=abc https://www.youtube.com/watch?v=def
+    python prewarm.py --file playlist.txt --concurrency 4 --timestamped both
+
+Videos that already have stored questions are skipped. Finished videos are recorded in a state file, so an interrupted run can be restarted with the same arguments and picks up where it stopped.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from generate_transcript import extract_youtube_video_id, add_timed_transcript_column
+from pipeline import generate_questions_for_video
+from question_cache import create_question_sets_table, get_cached_questions
+from database import close_pool
+from scheduler import BACKGROUND, priority
+
+STAGES = ["captions", "downloading", "transcribing", "summarizing", "generating", "cleaning"]
+
+
+def read_urls(urls, file_name):
+    """
+    Collects the video URLs given on the command line and in a file, in order and without duplicates.
+
+    Args:
+    urls (list of str): The URLs given on the command line.
+    file_name (str): The path to a file with one URL per line, or None. Blank lines and lines starting with '#' are ignored.
+
+    Returns:
+    list of str: The URLs.
+    """
+    urls = list(urls)
+    if file_name:
+        with open(file_name, "r") as file:
+            urls += [line.strip() for line in file if line.strip() and not line.strip().startswith("#")]
+    return list(dict.fromkeys(urls))
+
+
+def load_finished(state_file):
+    """
+    Reads the videos finished by earlier runs from a state file.
+
+    Args:
+    state_file (str): The path to the state file, which has one JSON object per line.
+
+    Returns:
+    set of (str, bool): The video ID and timestamped flag of each finished video.
+    """
+    if not os.path.exists(state_file):
+        return set()
+    finished = set()
+    with open(state_file, "r") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("status") in ("done", "cached"):
+                finished.add((entry["video_id"], entry["timestamped"]))
+    return finished
+
+
+class StageTimer:
+    """
+    Records how long a video spends in each pipeline stage, from the stage names reported through on_stage.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.stage = None
+        self.started = time.monotonic()
+
+    def __call__(self, stage):
+        now = time.monotonic()
+        if self.stage is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + now - self.started
+        self.stage, self.started = stage, now
+
+    def finish(self):
+        """
+        Ends the current stage.
+
+        Returns:
+        dict: The number of seconds spent in each stage.
+        """
+        self(None)
+        return self.timings
+
+
+def prewarm_video(url, timestamped, finished, state_file, state_lock):
+    """
+    Generates and stores the questions for a video, unless they were already stored or finished by an earlier run.
+    Its requests to the model are sent at BACKGROUND priority, so they wait behind interactive requests made in the same process.
+
+    Args:
+    url (str): The URL of the YouTube video.
+    timestamped (bool): True to generate questions with timestamps, False to generate questions without timestamps.
+    finished (set of (str, bool)): The videos finished by earlier runs.
+    state_file (str): The path to the state file the result is appended to.
+    state_lock (threading.Lock): Serializes writes to the state file.
+
+    Returns:
+    dict: The result, with the video's URL, ID, timestamped flag, status ('done', 'cached', 'skipped', or 'failed'), total seconds, seconds per stage, and error if it failed.
+    """
+    video_id = extract_youtube_video_id(url)
+    result = {"url": url, "video_id": video_id, "timestamped": timestamped, "seconds": 0.0, "stages": {}}
+
+    if not video_id:
+        result.update(status="failed", error="Invalid YouTube URL")
+        return result
+    if (video_id, timestamped) in finished:
+        result["status"] = "skipped"
+        return result
+
+    started = time.monotonic()
+    timer = StageTimer()
+    try:
+        if get_cached_questions(video_id, timestamped) is not None:
+            result["status"] = "cached"
+        else:
+            with priority(BACKGROUND):
+                generate_questions_for_video(url, timestamped, on_stage=timer)
+            result["status"] = "done"
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+    result["stages"] = timer.finish()
+    result["seconds"] = time.monotonic() - started
+
+    with state_lock, open(state_file, "a") as file:
+        file.write(json.dumps(result) + "\n")
+    return result
+
+
+def print_report(results):
+    """
+    Prints a summary of a run: one line per video, followed by the total time spent in each stage.
+
+    Args:
+    results (list of dict): The results returned by prewarm_video.
+    """
+    print(f"\n{'status':<8} {'mode':<6} {'total':>8}  " + " ".join(f"{stage:>13}" for stage in STAGES) + "  video")
+    for result in results:
+        mode = "timed" if result["timestamped"] else "plain"
+        stages = " ".join(f"{result['stages'].get(stage, 0.0):>12.1f}s" for stage in STAGES)
+        print(f"{result['status']:<8} {mode:<6} {result['seconds']:>7.1f}s  {stages}  {result['url']}")
+        if result.get("error"):
+            print(f"         error: {result['error']}")
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    totals = {stage: sum(result["stages"].get(stage, 0.0) for result in results) for stage in STAGES}
+    print("\n" + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    print("Total seconds per stage: " + ", ".join(f"{stage} {seconds:.1f}" for stage, seconds in totals.items()))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Pre-generate transcripts and questions for YouTube videos.")
+    parser.add_argument("urls", nargs="*", help="URLs of YouTube videos.")
+    parser.add_argument("--file", help="A file with one video URL per line.")
+    parser.add_argument("--timestamped", choices=["true", "false", "both"], default="both", help="Which kind of questions to generate. Defaults to both.")
+    parser.add_argument("--concurrency", type=int, default=2, help="The number of videos processed at the same time. Defaults to 2.")
+    parser.add_argument("--state-file", default="prewarm_state.jsonl", help="Where finished videos are recorded, so an interrupted run can resume. Defaults to prewarm_state.jsonl.")
+    parser.add_argument("--report", help="A file to write the results to as JSON.")
+    args = parser.parse_args(argv)
+
+    urls = read_urls(args.urls, args.file)
+    if not urls:
+        parser.error("at least one URL is required, either as an argument or with --file")
+    modes = {"true": [True], "false": [False], "both": [False, True]}[args.timestamped]
+
+    create_question_sets_table()
+    add_timed_transcript_column()
+    finished = load_finished(args.state_file)
+    state_lock = threading.Lock()
+
+    tasks = [(url, timestamped) for url in urls for timestamped in modes]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda task: prewarm_video(*task, finished, args.state_file, state_lock), tasks))
+    close_pool()
+
+    print_report(results)
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(results, file, indent=4)
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import json
+from psycopg2.extras import Json
+from database import get_connection
+import memory_cache
+import metrics
+from generate_questions import MODEL, get_prompt_hash
+
+
+def create_question_sets_table():
+    """
+    Creates the 'question_sets' table in the PostgreSQL 'youtube_transcripts' database, if it does not exist.
+    Each row stores the finished questions for a video, keyed by the video ID, timestamped flag, prompt template hash, and model that generated them.
+    """
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS question_sets (
+                youtube_video_id TEXT NOT NULL,
+                timestamped BOOLEAN NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                questions JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (youtube_video_id, timestamped, prompt_hash, model)
+            )
+        """)
+        connection.commit()
+
+
+def get_cached_questions(youtube_video_id, timestamped):
+    """
+    Fetches the stored questions for a video that were generated with the current prompt templates and model.
+    The in-process question cache is checked first, and the database is only queried on a cache miss.
+
+    Args:
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True to fetch questions with timestamps, False to fetch questions without timestamps.
+
+    Returns:
+    list of dict: The stored questions, in the same format returned by get_questions, or None if no questions have been stored.
+    """
+    key = (youtube_video_id, timestamped, get_prompt_hash(), MODEL)
+    cached = memory_cache.question_sets.get(key)
+    if cached is not None:
+        metrics.increment("cache_lookups_total", cache="questions", result="memory")
+        return cached
+
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT questions FROM question_sets
+            WHERE youtube_video_id = %s AND timestamped = %s AND prompt_hash = %s AND model = %s
+            """,
+            key
+        )
+        questions = cursor.fetchone()
+    if not questions:
+        metrics.increment("cache_lookups_total", cache="questions", result="miss")
+        return None
+
+    metrics.increment("cache_lookups_total", cache="questions", result="database")
+    memory_cache.question_sets.set(key, questions[0])
+    return questions[0]
+
+
+async def get_cached_questions_async(connection_pool, youtube_video_id, timestamped):
+    """
+    Fetches the stored questions for a video like get_cached_questions, without blocking, using an asyncpg connection pool.
+
+    Args:
+    connection_pool (asyncpg.Pool): The pool to query the database with.
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True to fetch questions with timestamps, False to fetch questions without timestamps.
+
+    Returns:
+    list of dict: The stored questions, in the same format returned by get_questions, or None if no questions have been stored.
+    """
+    key = (youtube_video_id, timestamped, get_prompt_hash(), MODEL)
+    cached = memory_cache.question_sets.get(key)
+    if cached is not None:
+        metrics.increment("cache_lookups_total", cache="questions", result="memory")
+        return cached
+
+    questions = await connection_pool.fetchval(
+        """
+        SELECT questions FROM question_sets
+        WHERE youtube_video_id = $1 AND timestamped = $2 AND prompt_hash = $3 AND model = $4
+        """,
+        *key
+    )
+    if questions is None:
+        metrics.increment("cache_lookups_total", cache="questions", result="miss")
+        return None
+
+    metrics.increment("cache_lookups_total", cache="questions", result="database")
+    questions = json.loads(questions)
+    memory_cache.question_sets.set(key, questions)
+    return questions
+
+
+def store_questions(youtube_video_id, timestamped, questions):
+    """
+    Stores the questions generated for a video with the current prompt templates and model, replacing any questions stored under the same key.
+
+    Args:
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True if the questions have timestamps, False if not.
+    questions (list of dict): The questions, in the same format returned by get_questions.
+    """
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO question_sets (youtube_video_id, timestamped, prompt_hash, model, questions)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (youtube_video_id, timestamped, prompt_hash, model) DO UPDATE
+            SET questions = EXCLUDED.questions, created_at = now()
+            """,
+            (youtube_video_id, timestamped, get_prompt_hash(), MODEL, Json(questions))
+        )
+        connection.commit()
+    memory_cache.question_sets.set((youtube_video_id, timestamped, get_prompt_hash(), MODEL), questions)
+
+
+def invalidate_questions(youtube_video_id, timestamped = None):
+    """
+    Deletes the stored questions for a video, for every prompt template hash and model, from the database and the in-process question cache.
+    Copies cached by other processes expire after CACHE_TTL_SECONDS.
+
+    Args:
+    youtube_video_id (str): The ID of the YouTube video.
+    timestamped (bool): True or False to only delete questions with or without timestamps. Defaults to None, which deletes both.
+
+    Returns:
+    int: The number of question sets deleted.
+    """
+    query = "DELETE FROM question_sets WHERE youtube_video_id = %s"
+    values = (youtube_video_id,)
+    if timestamped is not None:
+        query += " AND timestamped = %s"
+        values += (timestamped,)
+
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(query, values)
+        deleted = cursor.rowcount
+        connection.commit()
+    # Dropped once the delete has committed, so requests cannot read the old questions back from the database into the emptied cache.
+    memory_cache.question_sets.invalidate_where(
+        lambda key: key[0] == youtube_video_id and (timestamped is None or key[1] == timestamped)
+    )
+    return deleted
@@ -0,0 +1,171 @@
+import re
+import math
+from collections import Counter
+
+NUM_OPTIONS = 4
+SIMILARITY_THRESHOLD = 0.8
+CATCH_ALL_OPTIONS = {"all of the above", "none of the above", "both a and b", "all of these", "none of these"}
+
+# Each score component is between 0 and 1, and a question's score is the weighted sum of its components.
+DEFAULT_SCORE_WEIGHTS = {
+    "question_length": 1.0,
+    "option_balance": 1.0,
+    "no_catch_all_options": 1.0,
+    "distinct_options": 1.0,
+}
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens, ignoring punctuation.
+
+    Args:
+    text (str): The text to split.
+
+    Returns:
+    list of str: The tokens.
+
+    Example:
+    >>> tokenize('What is Polymorphism?')
+    ['what', 'is', 'polymorphism']
+    """
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def is_well_formed(question, num_options = NUM_OPTIONS):
+    """
+    Checks that a question has the structure the extension expects: a question, the right number of distinct options, and a correct answer that is one of the options.
+
+    Args:
+    question (dict): A dictionary containing a question, options, correct answer, and optionally a timestamp.
+    num_options (int): The number of options each question must have. Defaults to 4.
+
+    Returns:
+    bool: True if the question is well formed, False if not.
+    """
+    if not isinstance(question, dict):
+        return False
+    text, options, correct_answer = question.get("question"), question.get("options"), question.get("correct_answer")
+    if not isinstance(text, str) or not text.strip():
+        return False
+    if not isinstance(options, list) or len(options) != num_options:
+        return False
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        return False
+    if len({option.strip().lower() for option in options}) != num_options:
+        return False
+    if "timestamp" in question and not isinstance(question["timestamp"], (int, float)):
+        return False
+    return correct_answer in options
+
+
+def score_question(question, weights = None):
+    """
+    Scores how well a question is likely to test understanding, using cheap signals from its text and options.
+
+    Args:
+    question (dict): A well-formed question.
+    weights (dict): The weight of each score component, keyed by the names in DEFAULT_SCORE_WEIGHTS. Defaults to None, which uses DEFAULT_SCORE_WEIGHTS.
+
+    Returns:
+    float: The question's score. Higher is better.
+    """
+    weights = weights or DEFAULT_SCORE_WEIGHTS
+    options = question["options"]
+
+    # Questions between 8 and 30 words score highest.
+    words = len(tokenize(question["question"]))
+    question_length = min(words / 8, 1.0) if words <= 30 else max(0.0, 1 - (words - 30) / 30)
+
+    # A correct answer noticeably longer or shorter than the distractors gives the answer away.
+    lengths = [len(option) for option in options]
+    correct_length = len(question["correct_answer"])
+    distractor_lengths = [length for option, length in zip(options, lengths) if option != question["correct_answer"]]
+    mean_distractor_length = sum(distractor_lengths) / len(distractor_lengths) if distractor_lengths else correct_length
+    option_balance = 1 - min(abs(correct_length - mean_distractor_length) / max(mean_distractor_length, 1), 1.0)
+
+    no_catch_all_options = 0.0 if any(option.strip().lower().rstrip('.') in CATCH_ALL_OPTIONS for option in options) else 1.0
+
+    # Options that share most of their words are hard to tell apart for the wrong reasons.
+    option_tokens = [set(tokenize(option)) for option in options]
+    overlaps = [
+        len(a & b) / len(a | b)
+        for i, a in enumerate(option_tokens) for b in option_tokens[i + 1:]
+        if a | b
+    ]
+    distinct_options = 1 - (sum(overlaps) / len(overlaps) if overlaps else 0.0)
+
+    components = {
+        "question_length": question_length,
+        "option_balance": option_balance,
+        "no_catch_all_options": no_catch_all_options,
+        "distinct_options": distinct_options,
+    }
+    return sum(weights.get(name, 0.0) * value for name, value in components.items())
+
+
+def tf_idf_vectors(documents):
+    """
+    Builds a normalized TF-IDF vector for each document.
+
+    Args:
+    documents (list of str): The documents.
+
+    Returns:
+    list of dict: A sparse vector for each document, mapping each token to its weight. Each vector has unit length.
+    """
+    token_counts = [Counter(tokenize(document)) for document in documents]
+    document_frequency = Counter(token for counts in token_counts for token in counts)
+    num_documents = len(documents)
+
+    vectors = []
+    for counts in token_counts:
+        vector = {token: count * (math.log((1 + num_documents) / (1 + document_frequency[token])) + 1) for token, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({token: weight / norm for token, weight in vector.items()})
+    return vectors
+
+
+def cosine_similarity(a, b):
+    """
+    Computes the cosine similarity of two unit-length sparse vectors.
+
+    Args:
+    a (dict): A sparse vector, mapping each token to its weight.
+    b (dict): A sparse vector, mapping each token to its weight.
+
+    Returns:
+    float: The cosine similarity, between 0 and 1.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(token, 0.0) for token, weight in a.items())
+
+
+def filter_questions(questions, max_questions = 15, similarity_threshold = SIMILARITY_THRESHOLD, weights = None, num_options = NUM_OPTIONS):
+    """
+    Cleans a list of questions locally, without calling a model.
+    Malformed questions are removed, questions are ranked by score, near-duplicates of higher-ranked questions are removed, and the top max_questions are kept.
+    Near-duplicates are detected by the TF-IDF cosine similarity of each question's text together with its correct answer.
+
+    Args:
+    questions (list of dict): A list of dictionaries, each containing a question, options, correct answer, and optionally a timestamp.
+    max_questions (int): The maximum number of questions returned. Defaults to 15.
+    similarity_threshold (float): Questions at least this similar to a higher-ranked question are removed. Defaults to 0.8.
+    weights (dict): The weight of each score component, as in score_question. Defaults to None, which uses DEFAULT_SCORE_WEIGHTS.
+    num_options (int): The number of options each question must have. Defaults to 4.
+
+    Returns:
+    list of dict: The kept questions, in their original order.
+    """
+    candidates = [question for question in questions if is_well_formed(question, num_options)]
+    vectors = tf_idf_vectors([f"{question['question']} {question['correct_answer']}" for question in candidates])
+    ranking = sorted(range(len(candidates)), key=lambda i: score_question(candidates[i], weights), reverse=True)
+
+    kept = []
+    for i in ranking:
+        if len(kept) == max_questions:
+            break
+        if all(cosine_similarity(vectors[i], vectors[j]) < similarity_threshold for j in kept):
+            kept.append(i)
+    return [candidates[i] for i in sorted(kept)]
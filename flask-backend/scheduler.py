@@ -0,0 +1,285 @@
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from openai import APIConnectionError
+
+# Requests run in priority order: interactive requests, made while a user waits, go ahead of background work such as jobs and pre-warming.
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Budgets for chat completion requests made by this process. Rate limits of 0 are not enforced.
+# Set the per-minute budgets to the account's limits for the model, divided between the processes that share the account.
+MAX_IN_FLIGHT_LLM_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_LLM_REQUESTS", "8"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+
+# Budgets for hosted transcription requests made by this process. Whisper is limited by requests, not tokens.
+MAX_IN_FLIGHT_TRANSCRIPTIONS = int(os.getenv("MAX_IN_FLIGHT_TRANSCRIPTIONS", "4"))
+TRANSCRIPTION_REQUESTS_PER_MINUTE = int(os.getenv("TRANSCRIPTION_REQUESTS_PER_MINUTE", "0"))
+
+# Failed requests that can succeed later are retried up to MAX_RETRIES times, waiting a random time of up to
+# RETRY_BASE_DELAY * 2 ** attempt seconds, capped at RETRY_MAX_DELAY, or as long as the API asks with a Retry-After header.
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "60.0"))
+
+WINDOW_SECONDS = 60.0
+
+current_priority = contextvars.ContextVar("current_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """
+    Sets the priority of the requests made in the current context, and in any function wrapped with metrics.in_context inside it.
+
+    Args:
+    level (int): INTERACTIVE or BACKGROUND.
+    """
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def is_retryable(error):
+    """
+    Decides whether a failed API request may succeed if it is sent again: rate limits (429), server errors (5xx), timeouts, and dropped connections.
+
+    Args:
+    error (Exception): The error raised by the request.
+
+    Returns:
+    bool: True if the request should be retried.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def get_retry_after(error):
+    """
+    Reads how long the API asked to wait before retrying, from the Retry-After headers of a failed request's response.
+
+    Args:
+    error (Exception): The error raised by the request.
+
+    Returns:
+    float: The number of seconds to wait, or None if the response did not say.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class RateLimitScheduler:
+    """
+    Sends API requests in priority order, without exceeding a number of requests in flight or the requests-per-minute and tokens-per-minute budgets,
+    and retries requests that fail with rate limit or server errors after a jittered exponential backoff.
+
+    Requests wait in a queue ordered by priority, then by arrival. The request at the head of the queue is sent as soon as a slot is free
+    and the last minute's requests and tokens leave room for it, so a large request is not overtaken by smaller ones indefinitely.
+    Tokens are counted from each request's estimate, which is corrected with the actual usage once the response arrives.
+    A rate limit error pauses every queued request for the backoff delay, rather than only the one that failed.
+
+    Args:
+    name (str): The name of the scheduler, used in stats and log messages.
+    max_in_flight (int): The maximum number of requests sent at once.
+    requests_per_minute (int): The maximum number of requests started in any minute, or 0 for no limit. Defaults to 0.
+    tokens_per_minute (int): The maximum number of tokens used by requests started in any minute, or 0 for no limit. Defaults to 0.
+    max_retries (int): The number of times a failed request is retried. Defaults to MAX_RETRIES.
+    base_delay (float): The backoff before the first retry, in seconds, doubled for each further retry. Defaults to RETRY_BASE_DELAY.
+    max_delay (float): The longest backoff, in seconds. Defaults to RETRY_MAX_DELAY.
+    """
+
+    def __init__(self, name, max_in_flight, requests_per_minute = 0, tokens_per_minute = 0, max_retries = MAX_RETRIES, base_delay = RETRY_BASE_DELAY, max_delay = RETRY_MAX_DELAY):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.queue = []
+        self.sequence = itertools.count()
+        self.in_flight = 0
+        self.started = deque()
+        self.tokens = deque()
+        self.tokens_in_window = 0
+        self.paused_until = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+
+    def prune(self, now):
+        while self.started and self.started[0] <= now - WINDOW_SECONDS:
+            self.started.popleft()
+        while self.tokens and self.tokens[0][0] <= now - WINDOW_SECONDS:
+            self.tokens_in_window -= self.tokens.popleft()[1]
+
+    def wait_time(self, tokens):
+        """
+        Works out how long the request at the head of the queue must wait before it can be sent. Called with the condition held.
+
+        Args:
+        tokens (int): The estimated tokens of the request.
+
+        Returns:
+        float: 0 if the request can be sent now, the number of seconds until a budget frees up, or None to wait until a request finishes.
+        """
+        now = time.monotonic()
+        self.prune(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= self.max_in_flight:
+            return None
+        if self.requests_per_minute and len(self.started) >= self.requests_per_minute:
+            return self.started[0] + WINDOW_SECONDS - now
+        # A request larger than the whole budget is sent once nothing else is counted against it, rather than never.
+        if self.tokens_per_minute and self.tokens and self.tokens_in_window + tokens > self.tokens_per_minute:
+            return self.tokens[0][0] + WINDOW_SECONDS - now
+        return 0
+
+    def acquire(self, tokens, level):
+        """
+        Waits until a request can be sent and counts it against the budgets.
+
+        Args:
+        tokens (int): The estimated tokens of the request.
+        level (int): The priority of the request.
+
+        Returns:
+        list: The request's entry in the token window, passed to release.
+        """
+        ticket = (level, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.queue, ticket)
+            try:
+                while True:
+                    wait = self.wait_time(tokens) if self.queue[0] == ticket else None
+                    if wait == 0:
+                        break
+                    self.condition.wait(timeout=wait)
+            except BaseException:
+                # A request interrupted while waiting, such as by KeyboardInterrupt, must not stay at the head of the queue and block the rest.
+                self.queue.remove(ticket)
+                heapq.heapify(self.queue)
+                self.condition.notify_all()
+                raise
+            heapq.heappop(self.queue)
+            now = time.monotonic()
+            entry = [now, tokens]
+            self.in_flight += 1
+            self.started.append(now)
+            self.tokens.append(entry)
+            self.tokens_in_window += tokens
+            self.condition.notify_all()
+            return entry
+
+    def release(self, entry, tokens = None):
+        """
+        Marks a request as finished, replacing its estimated tokens with the actual usage if it is known.
+
+        Args:
+        entry (list): The request's entry, returned by acquire.
+        tokens (int): The tokens the request actually used. Defaults to None, which keeps the estimate.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if tokens is not None:
+                if self.tokens and self.tokens[0][0] <= entry[0]:
+                    self.tokens_in_window += tokens - entry[1]
+                entry[1] = tokens
+            self.condition.notify_all()
+
+    def backoff(self, error, attempt):
+        """
+        Works out how long to wait before retrying a failed request, and pauses the queue for that long if the request was rate limited.
+
+        Args:
+        error (Exception): The error raised by the request.
+        attempt (int): The number of retries already made.
+
+        Returns:
+        float: The number of seconds to wait.
+        """
+        delay = get_retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self.condition:
+            self.retries += 1
+            if getattr(error, "status_code", None) == 429:
+                self.rate_limited += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def call(self, function, tokens = 0, usage_tokens = None):
+        """
+        Sends a request when the budgets allow, at the priority of the current context, retrying it if it fails with an error that is_retryable accepts.
+        The request waits in the queue again before each retry.
+
+        Args:
+        function (function): Sends the request. It is called again for each retry, so it must not rely on state consumed by an earlier attempt, such as an open file.
+        tokens (int): The estimated tokens of the request, counted against the tokens-per-minute budget. Defaults to 0.
+        usage_tokens (function): Returns the tokens actually used, given the response, or None if unknown. Defaults to None, which keeps the estimate.
+
+        Returns:
+        The result of function.
+
+        Exceptions:
+        Raises the request's last error if it cannot be retried or every retry failed.
+        """
+        level = current_priority.get()
+        for attempt in range(self.max_retries + 1):
+            entry = self.acquire(tokens, level)
+            used = None
+            try:
+                result = function()
+                used = usage_tokens(result) if usage_tokens else None
+                return result
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.backoff(e, attempt)
+                print(f"{self.name} request failed ({e}), retrying in {delay:.1f} seconds (attempt {attempt + 1} of {self.max_retries})")
+            finally:
+                self.release(entry, used)
+            time.sleep(delay)
+
+    def stats(self):
+        """
+        Reports the scheduler's queue and budgets.
+
+        Returns:
+        dict: The number of queued requests at each priority, the requests in flight, the requests and tokens counted in the last minute, and the number of retries and rate limit errors so far.
+        """
+        with self.condition:
+            self.prune(time.monotonic())
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for level, _ in self.queue:
+                queued[PRIORITY_NAMES.get(level, str(level))] += 1
+            return {
+                "queued": queued,
+                "in_flight": self.in_flight,
+                "requests_last_minute": len(self.started),
+                "tokens_last_minute": self.tokens_in_window,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+            }
+
+
+chat_scheduler = RateLimitScheduler("chat", MAX_IN_FLIGHT_LLM_REQUESTS, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+transcription_scheduler = RateLimitScheduler("transcription", MAX_IN_FLIGHT_TRANSCRIPTIONS, TRANSCRIPTION_REQUESTS_PER_MINUTE)
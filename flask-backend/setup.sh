@@ -12,9 +12,15 @@ pip install --upgrade pip
 
 # Install the required libraries
 echo "Installing required packages..."
-pip install openai psycopg2-binary yt-dlp pydub flask audioop-lts flask_cors
+pip install openai psycopg2-binary yt-dlp flask flask_cors tiktoken
 
-# Install ffmpeg if not already found, since pydub requires ffmpeg
+# To transcribe on the local CPU instead of with OpenAI's Whisper, also install faster-whisper and set TRANSCRIPTION_BACKEND=faster-whisper
+# pip install faster-whisper
+
+# To serve the API asynchronously with async_app.py, also install its dependencies and run: hypercorn async_app:app
+# pip install quart quart-cors asyncpg hypercorn
+
+# Install ffmpeg if not already found, since audio is downloaded and split with ffmpeg
 echo "Checking if ffmpeg is installed..."
 if ! command -v ffmpeg &> /dev/null; then
     echo "ffmpeg not found, installing..."
@@ -0,0 +1,102 @@
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+import psycopg2
+from database import DB_NAME, get_db_connection
+
+# The longest a process waits for another process's advisory lock, such as while it transcribes the same video, before giving up with a TimeoutError.
+ADVISORY_LOCK_TIMEOUT_SECONDS = float(os.getenv("ADVISORY_LOCK_TIMEOUT_SECONDS", "900"))
+
+# The SQLSTATE Postgres reports when a lock could not be taken within lock_timeout.
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls within a process: while a call for a key is running, later calls for the same key wait for its result instead of repeating the work.
+
+    Example:
+    >>> transcript_requests = SingleFlight()
+    >>> transcript_requests.do('abc123:transcript', lambda: process_video_transcription(url, False))
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, function):
+        """
+        Runs function for a key, unless a call for the same key is already running, in which case it waits for and returns that call's result.
+
+        Args:
+        key (str): Identifies the work being done. Calls with equal keys are deduplicated.
+        function (function): A function taking no arguments that does the work.
+
+        Returns:
+        The result of function, from this call or from the call already in flight.
+
+        Exceptions:
+        Exception: Any exception raised by function is raised in every caller waiting on it.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = Future()
+                self.calls[key] = call
+
+        if not is_leader:
+            return call.result()
+
+        try:
+            result = function()
+            call.set_result(result)
+            return result
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+@contextmanager
+def advisory_lock(key, timeout = None):
+    """
+    Holds a PostgreSQL session-level advisory lock for the duration of a with block, deduplicating work across processes such as Gunicorn workers.
+    Other processes entering the block with the same key wait until the lock is released, for at most timeout seconds, so that a holder that hangs,
+    such as in a stuck download, does not keep every waiter and its connection blocked forever.
+    The lock is released automatically by the server if the process holding it dies.
+
+    The lock is held on its own connection, opened outside the connection pool, because work inside the block, such as downloading and transcribing a video,
+    can take minutes and checks out pooled connections of its own. Holding a pooled connection for that long would tie up the pool,
+    and once every pooled connection was held by a lock, the work inside the blocks would wait forever for a connection.
+
+    Args:
+    key (str): Identifies the work being done. It is hashed into the lock's id with Postgres' hashtext.
+    timeout (float): The longest to wait for the lock, in seconds. Defaults to None, which uses ADVISORY_LOCK_TIMEOUT_SECONDS.
+
+    Exceptions:
+    TimeoutError: If another process held the lock for longer than timeout.
+    """
+    timeout = ADVISORY_LOCK_TIMEOUT_SECONDS if timeout is None else timeout
+    connection = get_db_connection(DB_NAME)
+    try:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('lock_timeout', %s, false)", (f"{int(timeout * 1000)}ms",))
+                cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (key,))
+            connection.commit()
+        except psycopg2.Error as e:
+            if getattr(e, "pgcode", None) == LOCK_NOT_AVAILABLE:
+                raise TimeoutError(f"Timed out after {timeout:.0f} seconds waiting for another process working on {key}") from e
+            raise
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (key,))
+            connection.commit()
+    finally:
+        connection.close()
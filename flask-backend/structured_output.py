@@ -0,0 +1,186 @@
+import json
+import threading
+from collections import Counter
+
+KEY_POINTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "key_points": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["key_points"],
+    "additionalProperties": False
+}
+
+TIMESTAMPED_KEY_POINTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "key_points": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "key_point": {"type": "string"},
+                    "timestamp": {"type": "number"}
+                },
+                "required": ["key_point", "timestamp"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["key_points"],
+    "additionalProperties": False
+}
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {"type": "array", "items": {"type": "string"}},
+        "correct_answer": {"type": "string"}
+    },
+    "required": ["question", "options", "correct_answer"],
+    "additionalProperties": False
+}
+
+BATCH_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer"},
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "correct_answer": {"type": "string"}
+                },
+                "required": ["index", "question", "options", "correct_answer"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["questions"],
+    "additionalProperties": False
+}
+
+# Strict schemas require every property, so questions without a timestamp have it set to null.
+QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "correct_answer": {"type": "string"},
+                    "timestamp": {"type": ["number", "null"]}
+                },
+                "required": ["question", "options", "correct_answer", "timestamp"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["questions"],
+    "additionalProperties": False
+}
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+parse_failures = Counter()
+parse_failures_lock = threading.Lock()
+
+
+def response_format(name, schema):
+    """
+    Builds the response_format argument that asks the model for JSON matching a schema.
+
+    Args:
+    name (str): The name of the schema.
+    schema (dict): The JSON schema.
+
+    Returns:
+    dict: The response_format argument for a chat completion request.
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def validate(value, schema, path = "$"):
+    """
+    Checks that a parsed JSON value matches the subset of JSON schema used by the schemas in this module.
+
+    Args:
+    value: The parsed JSON value.
+    schema (dict): The JSON schema.
+    path (str): The location of value within the whole response, used in error messages. Defaults to '$'.
+
+    Exceptions:
+    ValueError: If the value does not match the schema.
+    """
+    types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    if not any(isinstance(value, JSON_TYPES[name]) and not (name in ("integer", "number") and isinstance(value, bool)) for name in types):
+        raise ValueError(f"{path} should be of type {' or '.join(types)}")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                raise ValueError(f"{path} is missing '{key}'")
+        for key, item in value.items():
+            if key in schema.get("properties", {}):
+                validate(item, schema["properties"][key], f"{path}.{key}")
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{i}]")
+
+
+def parse(text, schema):
+    """
+    Parses a model response as JSON and validates it against a schema.
+
+    Args:
+    text (str): The content of the model's response, which is None if the model refused or was cut off before answering.
+    schema (dict): The JSON schema the response should match.
+
+    Returns:
+    The parsed JSON value.
+
+    Exceptions:
+    ValueError: If the response is empty, is not valid JSON, or does not match the schema.
+    """
+    if text is None:
+        raise ValueError("the response has no content")
+    value = json.loads(text)
+    validate(value, schema)
+    return value
+
+
+def record_parse_failure(name):
+    """
+    Counts a response that could not be parsed.
+
+    Args:
+    name (str): The name of the schema the response should have matched.
+    """
+    with parse_failures_lock:
+        parse_failures[name] += 1
+
+
+def get_parse_failures():
+    """
+    Returns the number of responses that could not be parsed, by schema name.
+
+    Returns:
+    dict: The number of parse failures for each schema name.
+    """
+    with parse_failures_lock:
+        return dict(parse_failures)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend's modules are imported by name, as app.py imports them, and create their OpenAI clients at import time.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
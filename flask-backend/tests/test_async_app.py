@@ -0,0 +1,35 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("asyncpg")
+import async_app
+
+
+def test_videos_waiting_for_a_worker_are_counted_as_queued(monkeypatch):
+    monkeypatch.setattr(async_app, "pipeline_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(async_app, "pipeline_stats", {"queued": 0, "in_flight": 0, "peak_in_flight": 0})
+    release = threading.Event()
+
+    async def run():
+        tasks = [asyncio.ensure_future(async_app.run_in_pipeline(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        during = dict(async_app.pipeline_stats)
+        release.set()
+        await asyncio.gather(*tasks)
+        return during
+
+    during = asyncio.run(run())
+    assert during == {"queued": 2, "in_flight": 1, "peak_in_flight": 1}
+    assert async_app.pipeline_stats == {"queued": 0, "in_flight": 0, "peak_in_flight": 1}
+
+
+def test_timestamped_is_read_as_a_bool():
+    async def read(payload):
+        async with async_app.app.test_request_context("/generate_questions", method="POST"):
+            return async_app.read_request(payload)
+
+    video_url, timestamped, regenerate, error = asyncio.run(read({"video_url": "https://www.youtube.com/watch?v=example_video", "timestamped": 1}))
+    assert timestamped is True and error is None
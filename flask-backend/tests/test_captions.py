@@ -0,0 +1,41 @@
+import os
+import captions
+import generate_transcript
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES, file_name), encoding="utf-8") as file:
+        return file.read()
+
+
+def test_automatic_captions_keep_each_rolled_up_line_once():
+    segments = captions.parse_vtt(read_fixture("automatic_captions.vtt"))
+
+    assert [(segment.start, segment.end, segment.text) for segment in segments] == [
+        (0.16, 2.31, "welcome to the lecture"),
+        (2.32, 4.63, "today we cover caching"),
+        (4.64, 7.11, "and why it helps"),
+    ]
+
+
+def test_manual_subtitles_drop_cue_settings_identifiers_and_tags():
+    segments = captions.parse_vtt(read_fixture("manual_subtitles.vtt"))
+
+    assert [(segment.start, segment.end, segment.text) for segment in segments] == [
+        (1.0, 4.0, "Hello, and welcome."),
+        (3604.5, 3606.25, "Two lines of text in one cue."),
+    ]
+
+
+def test_caption_path_reports_its_stage(monkeypatch):
+    segments = captions.parse_vtt(read_fixture("automatic_captions.vtt"))
+    monkeypatch.setattr(generate_transcript, "USE_CAPTIONS", True)
+    monkeypatch.setattr(generate_transcript, "get_caption_segments", lambda url: segments)
+    stages = []
+
+    transcript = generate_transcript.process_video_transcription("https://www.youtube.com/watch?v=example_video", False, on_stage=stages.append)
+
+    assert transcript == "welcome to the lecture today we cover caching and why it helps"
+    assert stages == ["captions"]
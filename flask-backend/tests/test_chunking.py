@@ -0,0 +1,22 @@
+import sys
+import types
+import chunking
+
+
+def test_tokenizer_that_cannot_load_falls_back_to_the_estimate_once(monkeypatch, capsys):
+    attempts = []
+
+    def load(name):
+        attempts.append(name)
+        raise ConnectionError("Could not download o200k_base")
+
+    offline_tiktoken = types.SimpleNamespace(encoding_for_model=load, get_encoding=load)
+    monkeypatch.setitem(sys.modules, "tiktoken", offline_tiktoken)
+    chunking.get_encoding.cache_clear()
+    try:
+        assert chunking.count_tokens("a" * 10) == 3
+        assert chunking.count_tokens("a" * 12) == 3
+        assert attempts == [chunking.TOKENIZER_MODEL]
+        assert capsys.readouterr().out.count("Could not load") == 1
+    finally:
+        chunking.get_encoding.cache_clear()
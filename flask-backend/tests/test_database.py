@@ -0,0 +1,65 @@
+import threading
+import database
+
+
+class FakeConnection:
+    closed = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query):
+        pass
+
+    def rollback(self):
+        pass
+
+    def get_transaction_status(self):
+        return database.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool:
+    """
+    Hands out new connections whenever none are idle, and keeps those returned open.
+    """
+
+    def __init__(self):
+        self.idle = []
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else FakeConnection()
+
+    def putconn(self, connection, close = False):
+        if close:
+            connection.close()
+        else:
+            self.idle.append(connection)
+
+
+def test_closed_connections_leave_no_idle_time_for_their_successors(monkeypatch):
+    monkeypatch.setattr(database, "connection_pool", FakePool())
+    monkeypatch.setattr(database, "available_connections", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(database, "last_used", database.weakref.WeakKeyDictionary())
+
+    with database.get_connection() as connection:
+        connection.close()
+    assert connection not in database.last_used and len(database.last_used) == 0
+
+    health_checks = database.get_pool_stats()["health_checks"]
+    with database.get_connection() as fresh:
+        assert fresh is not connection
+    assert database.get_pool_stats()["health_checks"] == health_checks + 1
+
+    with database.get_connection() as reused:
+        assert reused is fresh
+    assert database.get_pool_stats()["health_checks"] == health_checks + 1
+    assert list(database.last_used) == [fresh]
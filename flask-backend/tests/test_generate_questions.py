@@ -0,0 +1,57 @@
+import re
+import json
+import time
+import pytest
+import generate_questions
+from timed_transcript import TimedTranscript
+
+CALL_SECONDS = 0.2
+
+
+def fake_complete(messages, timeout=None, response_format=None):
+    """
+    Answers question generation requests after CALL_SECONDS, finishing requests for later key points sooner, so results arrive out of order.
+    """
+    prompt = messages[-1]["content"]
+    numbers = [int(number) for number in re.findall(r"point (\d+)", prompt)]
+    time.sleep(CALL_SECONDS - 0.01 * max(numbers))
+    if response_format["json_schema"]["name"] == "batch_questions":
+        indices = [int(index) for index in re.findall(r"^(\d+)\. ", prompt, re.MULTILINE)]
+        questions = [question(number, index=index) for index, number in zip(indices, numbers)]
+        return json.dumps({"questions": questions})
+    return json.dumps(question(numbers[0]))
+
+
+def question(number, **fields):
+    return dict(question=f"What is point {number}?", options=["a", "b", "c", "d"], correct_answer="a", **fields)
+
+
+def generate(monkeypatch, key_points, batch_size):
+    monkeypatch.setattr(generate_questions, "complete", fake_complete)
+    monkeypatch.setattr(generate_questions, "STRUCTURED_OUTPUT", True)
+    started = time.monotonic()
+    questions = generate_questions.create_questions_from_points(key_points, False, batch_size=batch_size)
+    return questions, time.monotonic() - started
+
+
+def test_questions_are_generated_concurrently_and_keep_their_order(monkeypatch):
+    key_points = [f"This is point {i}." for i in range(8)]
+    questions, seconds = generate(monkeypatch, key_points, batch_size=1)
+
+    assert [question["question"] for question in questions] == [f"What is point {i}?" for i in range(8)]
+    assert seconds < 2 * CALL_SECONDS
+
+
+def test_batches_are_generated_concurrently_and_keep_their_order(monkeypatch):
+    key_points = [f"This is point {i}." for i in range(12)]
+    questions, seconds = generate(monkeypatch, key_points, batch_size=3)
+
+    assert [question["question"] for question in questions] == [f"What is point {i}?" for i in range(12)]
+    assert seconds < 2 * CALL_SECONDS
+
+
+def test_empty_transcripts_have_no_questions(monkeypatch):
+    monkeypatch.setattr(generate_questions, "complete", lambda *args, **kwargs: pytest.fail("the model was called"))
+
+    assert generate_questions.get_questions("", False) == []
+    assert generate_questions.get_questions(TimedTranscript.from_dicts([]), True) == []
@@ -0,0 +1,98 @@
+import os
+import wave
+import types
+import shutil
+import subprocess
+import pytest
+import generate_transcript
+
+
+def test_hosted_transcriptions_are_not_retried_again(monkeypatch):
+    attempts = []
+    monkeypatch.setattr(generate_transcript, "get_backend", lambda: types.SimpleNamespace(hosted=True))
+
+    result = generate_transcript.transcribe_with_retries(lambda path: attempts.append(path), "/tmp/audio.mp3", retries=3, backoff=0)
+
+    assert result is None
+    assert attempts == ["/tmp/audio.mp3"]
+
+
+def test_local_transcriptions_are_retried(monkeypatch):
+    attempts = []
+    monkeypatch.setattr(generate_transcript, "get_backend", lambda: types.SimpleNamespace(hosted=False))
+
+    def transcribe(path):
+        attempts.append(path)
+        return "Hello." if len(attempts) == 3 else None
+
+    assert generate_transcript.transcribe_with_retries(transcribe, "/tmp/audio.mp3", retries=3, backoff=0) == "Hello."
+    assert len(attempts) == 3
+
+
+def segment(start, end, text):
+    return types.SimpleNamespace(start=start, end=end, text=text)
+
+
+def test_window_bounds_double_up_to_the_longest_window():
+    assert generate_transcript.get_window_bounds(1000.0, 120, 600) == [(0.0, 120.0), (120.0, 360.0), (360.0, 1000.0)]
+
+    bounds = generate_transcript.get_window_bounds(3000.0, 120, 600)
+    assert [end - start for start, end in bounds] == [120.0, 240.0, 480.0, 600.0, 600.0, 600.0, 360.0]
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+
+
+def test_window_bounds_merge_a_short_last_window_and_cover_short_videos():
+    assert generate_transcript.get_window_bounds(130.0, 120, 600) == [(0.0, 130.0)]
+    assert generate_transcript.get_window_bounds(60.0, 120, 600) == [(0.0, 60.0)]
+    assert generate_transcript.get_window_bounds(0.0, 120, 600) == [(0.0, 0.0)]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_audio_windows_run_into_the_next_window(tmp_path):
+    path = str(tmp_path / "lecture.wav")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=30", "-ac", "1", "-ar", "8000", path], check=True)
+
+    windows = generate_transcript.split_audio_windows(path, [(0.0, 10.0), (10.0, 30.0)], 30.0, overlap_duration_ms=2000, output_dir=str(tmp_path))
+
+    durations = []
+    for window in windows:
+        with wave.open(window) as audio:
+            durations.append(audio.getnframes() / audio.getframerate())
+    assert [os.path.basename(window) for window in windows] == ["chunk_1.wav", "chunk_2.wav"]
+    assert durations == pytest.approx([12.0, 20.0], abs=0.05)
+
+
+def transcribe_windows(monkeypatch, transcriptions, bounds):
+    monkeypatch.setattr(generate_transcript, "get_backend", lambda: types.SimpleNamespace(hosted=True))
+    monkeypatch.setattr(generate_transcript, "transcribe_with_timestamps", transcriptions.get)
+    passed = []
+    transcript = generate_transcript.transcribe_windows(
+        list(transcriptions), bounds, lambda window, start, end, duration: passed.append((start, [item["text"] for item in window])),
+        bounds[-1][1], overlap=2.0
+    )
+    return transcript, passed
+
+
+def test_window_overlap_is_cut_at_its_midpoint(monkeypatch):
+    transcriptions = {
+        "window_1": [segment(0.0, 5.0, "a"), segment(5.0, 10.5, "b"), segment(11.2, 12.0, "c from window 1")],
+        "window_2": [segment(0.0, 0.8, "b from window 2"), segment(1.2, 5.0, "c"), segment(5.0, 9.0, "d")],
+    }
+
+    transcript, passed = transcribe_windows(monkeypatch, transcriptions, [(0.0, 10.0), (10.0, 20.0)])
+
+    assert passed == [(0.0, ["a", "b"]), (10.0, ["c", "d"])]
+    assert [(item["start"], item["text"]) for item in transcript] == [(0.0, "a"), (5.0, "b"), (11.2, "c"), (15.0, "d")]
+
+
+def test_failed_window_is_replaced_by_the_tail_of_the_window_before(monkeypatch):
+    transcriptions = {
+        "window_1": [segment(0.0, 5.0, "a"), segment(11.2, 12.0, "c from window 1")],
+        "window_2": None,
+        "window_3": [segment(0.5, 4.0, "e")],
+    }
+
+    transcript, passed = transcribe_windows(monkeypatch, transcriptions, [(0.0, 10.0), (10.0, 20.0), (20.0, 30.0)])
+
+    assert passed == [(0.0, ["a"]), (10.0, ["c from window 1"]), (20.0, ["e"])]
+    assert [item["start"] for item in transcript] == [0.0, 11.2, 20.5]
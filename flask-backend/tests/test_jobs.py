@@ -0,0 +1,66 @@
+import time
+import threading
+import jobs
+import scheduler
+
+
+def test_requeue_leaves_jobs_with_live_leases_running(tmp_path):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    live = store.create("https://www.youtube.com/watch?v=live", False)
+    stale = store.create("https://www.youtube.com/watch?v=stale", False)
+    store.claim(live, "other-process", lease_seconds=60)
+    store.claim(stale, "stopped-process", lease_seconds=-1)
+
+    assert store.requeue_unfinished() == [stale]
+    assert store.get(live)["status"] == "running"
+    assert store.get(stale)["status"] == "queued"
+
+
+def test_running_jobs_keep_their_lease_and_expired_jobs_are_picked_up(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def generate(video_url, timestamped, regenerate, on_stage):
+        release.wait(5)
+        return [{"question": video_url}]
+
+    monkeypatch.setattr(jobs, "generate_questions_for_video", generate)
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = jobs.JobQueue(store, max_workers=2, lease_seconds=0.3)
+    try:
+        running = queue.submit("https://www.youtube.com/watch?v=running", False)
+        stale = store.create("https://www.youtube.com/watch?v=stale", False)
+        store.claim(stale, "stopped-process", lease_seconds=-1)
+
+        time.sleep(0.6)
+        assert store.requeue_expired() == []
+        assert store.get(running)["status"] == "running"
+        assert store.get(stale)["owner"] == queue.owner
+
+        release.set()
+        queue.executor.shutdown(wait=True)
+        assert store.get(stale)["result"] == [{"question": "https://www.youtube.com/watch?v=stale"}]
+    finally:
+        release.set()
+        queue.shutdown()
+
+
+def test_jobs_run_at_the_priority_they_were_submitted_with(tmp_path, monkeypatch):
+    levels = {}
+
+    def generate(video_url, timestamped, regenerate, on_stage):
+        levels[video_url] = scheduler.current_priority.get()
+        return []
+
+    monkeypatch.setattr(jobs, "generate_questions_for_video", generate)
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = jobs.JobQueue(store, max_workers=1)
+    try:
+        student = queue.submit("https://www.youtube.com/watch?v=student", False)
+        prewarm = queue.submit("https://www.youtube.com/watch?v=prewarm", False, level=scheduler.BACKGROUND)
+        queue.executor.shutdown(wait=True)
+    finally:
+        queue.shutdown()
+
+    assert levels == {"https://www.youtube.com/watch?v=student": scheduler.INTERACTIVE, "https://www.youtube.com/watch?v=prewarm": scheduler.BACKGROUND}
+    assert store.get(student)["priority"] == "interactive"
+    assert store.get(prewarm)["priority"] == "background"
@@ -0,0 +1,25 @@
+import memory_cache
+from timed_transcript import TimedTranscript
+
+
+def test_changing_a_returned_value_does_not_change_the_cache():
+    cache = memory_cache.LRUCache(max_bytes=1024, ttl=60)
+    questions = [{"question": "What is a transcript?", "choices": ["A", "B"]}]
+    cache.set(("abc123", False), questions)
+    questions.append({"question": "Added after storing"})
+
+    cached = cache.get(("abc123", False))
+    cached[0]["choices"].append("C")
+    cached.append({"question": "Added after reading"})
+
+    assert cache.get(("abc123", False)) == [{"question": "What is a transcript?", "choices": ["A", "B"]}]
+
+
+def test_immutable_values_are_shared():
+    cache = memory_cache.LRUCache(max_bytes=1024, ttl=60)
+    transcript = TimedTranscript.from_dicts([{"start": 0.0, "end": 1.0, "text": "Hello."}])
+    cache.set(("abc123", True), transcript)
+    cache.set(("abc123", False), "Hello.")
+
+    assert cache.get(("abc123", True)) is transcript
+    assert cache.get(("abc123", False)) == "Hello."
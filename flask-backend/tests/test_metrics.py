@@ -0,0 +1,24 @@
+import memory_cache
+import metrics
+
+
+def test_running_totals_are_exported_as_counters():
+    memory_cache.transcripts.get(("not-cached", False))
+    output = metrics.render_prometheus(metrics.collect_gauges(), metrics.collect_totals())
+
+    assert "# TYPE memory_cache_misses_total counter" in output
+    assert "# TYPE db_pool_checkouts_total counter" in output
+    assert "# TYPE db_pool_wait_seconds_total counter" in output
+    assert "# TYPE api_scheduler_retries_total counter" in output
+    assert "# TYPE api_scheduler_rate_limited_total counter" in output
+    assert "# TYPE memory_cache_misses gauge" not in output
+    assert "# TYPE db_pool_checkouts gauge" not in output
+
+
+def test_current_state_is_exported_as_gauges():
+    output = metrics.render_prometheus(metrics.collect_gauges(), metrics.collect_totals())
+
+    assert "# TYPE memory_cache_entries gauge" in output
+    assert "# TYPE db_pool_in_use gauge" in output
+    assert "# TYPE api_scheduler_queued gauge" in output
+    assert "# TYPE api_scheduler_in_flight gauge" in output
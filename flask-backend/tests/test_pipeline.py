@@ -0,0 +1,85 @@
+import time
+import pytest
+import pipeline
+from timed_transcript import TimedTranscript
+
+WINDOWS = [(0.0, 10.0), (10.0, 30.0)]
+TRANSCRIPT_SECONDS = 1.0
+
+
+def window_transcript(start, end):
+    return TimedTranscript.from_dicts([{"start": start, "end": end, "text": f"Part of the lecture from {start:.0f} to {end:.0f}."}])
+
+
+def question_for(window):
+    start = window[0]["start"]
+    return {
+        "question": f"What does the lecture cover from second {start:.0f}?",
+        "options": [f"Topic {start:.0f}", "Nothing", "Music", "Credits"],
+        "correct_answer": f"Topic {start:.0f}",
+        "timestamp": start,
+    }
+
+
+@pytest.fixture
+def video(monkeypatch):
+    """
+    Stands in for transcription, whose later window takes TRANSCRIPT_SECONDS, and for question generation, which is immediate unless told to fail.
+    """
+    state = {"stored": [], "failing": set(), "transcribed_at": None}
+
+    def get_transcript(url, timestamped, on_stage = None, on_window_transcript = None):
+        windows = [window_transcript(start, end) for start, end in WINDOWS]
+        on_window_transcript(windows[0], *WINDOWS[0], WINDOWS[-1][1])
+        time.sleep(TRANSCRIPT_SECONDS)
+        on_window_transcript(windows[1], *WINDOWS[1], WINDOWS[-1][1])
+        state["transcribed_at"] = time.monotonic()
+        return TimedTranscript.concatenate(windows)
+
+    def get_questions(window, timestamped, on_question = None, max_questions = 15, max_extractions = 15):
+        if window[0]["start"] in state["failing"]:
+            raise RuntimeError("The model could not be reached")
+        return [question_for(window)]
+
+    monkeypatch.setattr(pipeline, "get_transcript", get_transcript)
+    monkeypatch.setattr(pipeline, "get_questions", get_questions)
+    monkeypatch.setattr(pipeline, "store_questions", lambda video_id, timestamped, questions: state["stored"].append(questions))
+    return state
+
+
+def test_first_window_is_ready_while_later_windows_transcribe(video):
+    emitted = []
+    started = time.monotonic()
+
+    questions = pipeline.create_questions_incrementally(
+        "https://www.youtube.com/watch?v=example_video", "example_video",
+        on_window=lambda start, end, window_questions: emitted.append((start, end, len(window_questions), time.monotonic()))
+    )
+
+    assert [(start, end, count) for start, end, count, _ in emitted] == [(0.0, 10.0, 1), (10.0, 30.0, 1)]
+    assert emitted[0][3] - started < TRANSCRIPT_SECONDS / 2
+    assert emitted[0][3] < video["transcribed_at"]
+    assert [question["timestamp"] for question in questions] == [0.0, 10.0]
+    assert video["stored"] == [questions]
+
+
+def test_questions_missing_a_window_are_returned_but_not_stored(video):
+    video["failing"].add(10.0)
+    emitted = []
+
+    questions = pipeline.create_questions_incrementally(
+        "https://www.youtube.com/watch?v=example_video", "example_video",
+        on_window=lambda start, end, window_questions: emitted.append((start, len(window_questions)))
+    )
+
+    assert [question["timestamp"] for question in questions] == [0.0]
+    assert emitted == [(0.0, 1), (10.0, 0)]
+    assert video["stored"] == []
+
+
+def test_every_window_failing_raises(video):
+    video["failing"].update({0.0, 10.0})
+
+    with pytest.raises(ValueError):
+        pipeline.create_questions_incrementally("https://www.youtube.com/watch?v=example_video", "example_video")
+    assert video["stored"] == []
@@ -0,0 +1,127 @@
+import time
+import types
+import threading
+import pytest
+import scheduler
+from scheduler import INTERACTIVE, BACKGROUND, RateLimitScheduler
+
+# The budgets are counted over a shortened window, so waits for them take a fraction of a second.
+WINDOW = 0.3
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+@pytest.fixture(autouse=True)
+def short_window(monkeypatch):
+    monkeypatch.setattr(scheduler, "WINDOW_SECONDS", WINDOW)
+
+
+def test_interactive_requests_go_ahead_of_earlier_background_requests():
+    limiter = RateLimitScheduler("test", max_in_flight=1)
+    held = limiter.acquire(0, INTERACTIVE)
+    order = []
+
+    def request(name, level):
+        with scheduler.priority(level):
+            limiter.call(lambda: order.append(name))
+
+    threads = []
+    for name, level in (("background 1", BACKGROUND), ("background 2", BACKGROUND), ("interactive", INTERACTIVE)):
+        threads.append(threading.Thread(target=request, args=(name, level)))
+        threads[-1].start()
+        time.sleep(0.05)
+    assert limiter.stats()["queued"] == {"interactive": 1, "background": 2}
+
+    limiter.release(held)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "background 1", "background 2"]
+
+
+def test_requests_per_minute_wait_for_the_window():
+    limiter = RateLimitScheduler("test", max_in_flight=10, requests_per_minute=2)
+    started = time.monotonic()
+    times = [limiter.call(lambda: time.monotonic() - started) for _ in range(3)]
+
+    assert times[1] < WINDOW / 2
+    assert times[2] >= WINDOW * 0.9
+
+
+def test_tokens_per_minute_wait_for_the_window():
+    limiter = RateLimitScheduler("test", max_in_flight=10, tokens_per_minute=100)
+    started = time.monotonic()
+    first = limiter.call(lambda: time.monotonic() - started, tokens=60)
+    second = limiter.call(lambda: time.monotonic() - started, tokens=60)
+
+    assert first < WINDOW / 2
+    assert second >= WINDOW * 0.9
+
+
+def test_release_replaces_the_estimate_with_the_actual_usage():
+    limiter = RateLimitScheduler("test", max_in_flight=10, tokens_per_minute=100)
+    limiter.call(lambda: {"usage": 10}, tokens=60, usage_tokens=lambda response: response["usage"])
+    assert limiter.stats()["tokens_last_minute"] == 10
+
+    started = time.monotonic()
+    limiter.call(lambda: None, tokens=60)
+    assert time.monotonic() - started < WINDOW / 2
+
+
+def test_rate_limit_pauses_the_queue_for_the_retry_after_time():
+    limiter = RateLimitScheduler("test", max_in_flight=10, base_delay=5.0)
+    attempts = []
+
+    def send():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FakeAPIError(429, {"retry-after-ms": "200"})
+        return "done"
+
+    assert limiter.call(send) == "done"
+    assert 0.19 <= attempts[1] - attempts[0] < 1.0
+    assert limiter.stats()["rate_limited"] == 1 and limiter.stats()["retries"] == 1
+
+    limiter.backoff(FakeAPIError(429, {"retry-after": "0.2"}), 0)
+    with limiter.condition:
+        assert 0.1 < limiter.wait_time(0) <= 0.2
+
+
+def test_failed_requests_give_up_after_max_retries():
+    limiter = RateLimitScheduler("test", max_in_flight=10, max_retries=2, base_delay=0.01)
+    attempts = []
+
+    def send(status_code):
+        attempts.append(status_code)
+        raise FakeAPIError(status_code)
+
+    with pytest.raises(FakeAPIError):
+        limiter.call(lambda: send(500))
+    assert attempts == [500, 500, 500]
+
+    with pytest.raises(FakeAPIError):
+        limiter.call(lambda: send(400))
+    assert attempts == [500, 500, 500, 400]
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_interrupted_wait_leaves_the_queue():
+    limiter = RateLimitScheduler("test", max_in_flight=1)
+    held = limiter.acquire(0, INTERACTIVE)
+    wait = limiter.condition.wait
+
+    def interrupted(timeout = None):
+        raise KeyboardInterrupt
+
+    limiter.condition.wait = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        limiter.acquire(0, INTERACTIVE)
+    limiter.condition.wait = wait
+    assert limiter.queue == []
+
+    limiter.release(held)
+    assert limiter.call(lambda: "sent") == "sent"
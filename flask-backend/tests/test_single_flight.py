@@ -0,0 +1,83 @@
+import pytest
+import psycopg2
+import database
+import single_flight
+
+
+class RecordingConnection:
+    """
+    Records the statements run on it, in place of a psycopg2 connection.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, values = ()):
+        self.statements.append(query.split("(")[0])
+        self.values = values
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_advisory_lock_holds_its_own_connection_outside_the_pool(monkeypatch):
+    connection = RecordingConnection()
+    monkeypatch.setattr(single_flight, "get_db_connection", lambda db: connection)
+    monkeypatch.setattr(database, "get_connection", lambda: (_ for _ in ()).throw(AssertionError("the pool was used")))
+
+    with single_flight.advisory_lock("transcript:abc123:True"):
+        assert connection.statements == ["SELECT set_config", "SELECT pg_advisory_lock"]
+    assert connection.statements == ["SELECT set_config", "SELECT pg_advisory_lock", "SELECT pg_advisory_unlock"]
+    assert connection.closed
+
+
+def test_advisory_lock_closes_its_connection_when_the_block_raises(monkeypatch):
+    connection = RecordingConnection()
+    monkeypatch.setattr(single_flight, "get_db_connection", lambda db: connection)
+
+    try:
+        with single_flight.advisory_lock("transcript:abc123:True"):
+            raise ValueError("transcription failed")
+    except ValueError:
+        pass
+    assert connection.statements[-1] == "SELECT pg_advisory_unlock"
+    assert connection.closed
+
+
+class LockNotAvailable(psycopg2.Error):
+    pgcode = single_flight.LOCK_NOT_AVAILABLE
+
+
+class LockedConnection(RecordingConnection):
+    """
+    Fails to take the advisory lock, as Postgres does once lock_timeout passes while another session holds it.
+    """
+
+    def execute(self, query, values = ()):
+        super().execute(query, values)
+        if "pg_advisory_lock" in query:
+            raise LockNotAvailable("canceling statement due to lock timeout")
+
+
+def test_advisory_lock_gives_up_after_its_timeout(monkeypatch):
+    connection = LockedConnection()
+    monkeypatch.setattr(single_flight, "get_db_connection", lambda db: connection)
+
+    with pytest.raises(TimeoutError):
+        with single_flight.advisory_lock("transcript:abc123:True", timeout=2.5):
+            pytest.fail("the block ran without the lock")
+    assert connection.statements == ["SELECT set_config", "SELECT pg_advisory_lock"]
+    assert connection.closed
@@ -0,0 +1,39 @@
+import json
+import pytest
+import generate_questions
+import structured_output
+from structured_output import QUESTION_SCHEMA
+
+QUESTION = {"question": "What is stored?", "options": ["Text", "Audio"], "correct_answer": "Text"}
+
+
+def test_parse_rejects_empty_content_as_a_parse_failure():
+    with pytest.raises(ValueError):
+        structured_output.parse(None, QUESTION_SCHEMA)
+
+
+def test_empty_content_is_repaired(monkeypatch):
+    responses = iter([None, json.dumps(QUESTION)])
+    sent = []
+
+    def complete(messages, timeout=None, response_format=None):
+        sent.append(messages)
+        return next(responses)
+
+    monkeypatch.setattr(generate_questions, "complete", complete)
+    messages = [{"role": "user", "content": "Write a question about storage, not seen before by complete_json's cache."}]
+
+    assert generate_questions.complete_json(messages, "question", QUESTION_SCHEMA) == QUESTION
+    assert len(sent) == 2
+    assert sent[1][1] == {"role": "assistant", "content": ""}
+
+
+def test_prompt_hash_depends_on_structured_output(monkeypatch):
+    generate_questions.get_prompt_hash.cache_clear()
+    structured_hash = generate_questions.get_prompt_hash()
+    monkeypatch.setattr(generate_questions, "STRUCTURED_OUTPUT", not generate_questions.STRUCTURED_OUTPUT)
+    generate_questions.get_prompt_hash.cache_clear()
+    try:
+        assert generate_questions.get_prompt_hash() != structured_hash
+    finally:
+        generate_questions.get_prompt_hash.cache_clear()
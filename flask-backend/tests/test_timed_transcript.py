@@ -0,0 +1,29 @@
+from timed_transcript import TimedTranscript
+
+TRANSCRIPT = TimedTranscript.from_dicts([
+    {"start": 0.0, "end": 5.0, "text": "One."},
+    {"start": 5.0, "end": 10.0, "text": "Two."},
+    {"start": 10.0, "end": 15.0, "text": "Three."},
+    {"start": 15.0, "end": 20.0, "text": "Four."},
+])
+
+
+def texts(parts):
+    return [[segment["text"] for segment in part] for part in parts]
+
+
+def test_split_at_gives_each_segment_to_the_part_it_starts_in():
+    assert texts(TRANSCRIPT.split_at([5.0, 12.0])) == [["One."], ["Two.", "Three."], ["Four."]]
+    assert texts(TRANSCRIPT.split_at([])) == [["One.", "Two.", "Three.", "Four."]]
+
+
+def test_split_at_leaves_parts_without_segments_empty():
+    assert texts(TRANSCRIPT.split_at([0.0, 2.0, 30.0])) == [[], ["One."], ["Two.", "Three.", "Four."], []]
+
+
+def test_split_at_stays_within_a_view():
+    view = TRANSCRIPT[1:3]
+    parts = view.split_at([0.0, 10.0, 30.0])
+
+    assert texts(parts) == [[], ["Two."], ["Three."], []]
+    assert TimedTranscript.concatenate(parts) == view
@@ -0,0 +1,241 @@
+import sys
+import json
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Binary layout: magic, segment count, then the start times, end times, and text offsets as little-endian arrays, then the text as UTF-8.
+MAGIC = b"TTR1"
+HEADER = struct.Struct("<4sI")
+
+
+class TimedTranscript:
+    """
+    A timestamped transcript stored column by column: the start and end time of every segment in two float arrays,
+    and the text of every segment in one string, with an array of offsets marking where each segment's text begins and ends.
+
+    Slicing by segment index or by time range returns a view that shares the arrays and the text, so it takes O(1) time and memory
+    (plus O(log n) to find a time range). Indexing a single segment returns it as a dictionary with "start", "end", and "text".
+
+    Segments are expected in playback order, so their start and end times are both non-decreasing.
+
+    Example:
+    >>> transcript = TimedTranscript.from_dicts([{"start": 0.0, "end": 2.5, "text": "Hello."}, {"start": 2.5, "end": 4.0, "text": "Welcome."}])
+    >>> transcript[1]
+    {'start': 2.5, 'end': 4.0, 'text': 'Welcome.'}
+    >>> len(transcript.between(3.0, 10.0))
+    1
+    """
+
+    def __init__(self, starts, ends, text, offsets, lo = 0, hi = None):
+        self.starts = starts
+        self.ends = ends
+        self.text = text
+        self.offsets = offsets
+        self.lo = lo
+        self.hi = len(starts) if hi is None else hi
+
+    @classmethod
+    def from_segments(cls, segments, offset = 0):
+        """
+        Builds a transcript from transcription segments, such as those returned by Whisper or parsed from captions.
+
+        Args:
+        segments (iterable): Objects with `start`, `end`, and `text` attributes.
+        offset (float): The number of seconds added to each start and end time, such as the start of an audio chunk within the original audio. Defaults to 0.
+
+        Returns:
+        TimedTranscript: The transcript.
+        """
+        return cls.from_dicts({"start": segment.start + offset, "end": segment.end + offset, "text": segment.text} for segment in segments)
+
+    @classmethod
+    def from_dicts(cls, segments):
+        """
+        Builds a transcript from dictionaries with "start", "end", and "text" keys.
+
+        Args:
+        segments (iterable of dict): The segments.
+
+        Returns:
+        TimedTranscript: The transcript.
+        """
+        starts, ends, offsets, texts = array("d"), array("d"), array("q", [0]), []
+        for segment in segments:
+            starts.append(segment["start"])
+            ends.append(segment["end"])
+            texts.append(segment["text"])
+            offsets.append(offsets[-1] + len(segment["text"]))
+        return cls(starts, ends, "".join(texts), offsets)
+
+    @classmethod
+    def from_json_strings(cls, segments):
+        """
+        Builds a transcript from the list of JSON-formatted segment strings that timestamped transcripts used to be stored as.
+
+        Args:
+        segments (list of str): The JSON-formatted segments.
+
+        Returns:
+        TimedTranscript: The transcript.
+        """
+        return cls.from_dicts(json.loads(segment) for segment in segments)
+
+    @classmethod
+    def concatenate(cls, transcripts):
+        """
+        Joins transcripts end to end.
+
+        Args:
+        transcripts (iterable of TimedTranscript): The transcripts, in playback order.
+
+        Returns:
+        TimedTranscript: The joined transcript.
+        """
+        starts, ends, offsets, texts = array("d"), array("d"), array("q", [0]), []
+        for transcript in transcripts:
+            starts.extend(transcript.starts[transcript.lo:transcript.hi])
+            ends.extend(transcript.ends[transcript.lo:transcript.hi])
+            base = offsets[-1] - transcript.offsets[transcript.lo]
+            offsets.extend(offset + base for offset in transcript.offsets[transcript.lo + 1:transcript.hi + 1])
+            texts.append(transcript.segment_text())
+        return cls(starts, ends, "".join(texts), offsets)
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            lo, hi, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("TimedTranscript slices do not support a step")
+            return TimedTranscript(self.starts, self.ends, self.text, self.offsets, self.lo + lo, self.lo + max(lo, hi))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TimedTranscript index out of range")
+        i = self.lo + index
+        return {"start": self.starts[i], "end": self.ends[i], "text": self.text[self.offsets[i]:self.offsets[i + 1]]}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return isinstance(other, TimedTranscript) and list(self) == list(other)
+
+    def __repr__(self):
+        return f"<TimedTranscript of {len(self)} segments>"
+
+    @property
+    def nbytes(self):
+        """
+        The approximate number of bytes this transcript's segments take up in memory.
+        """
+        return len(self) * (self.starts.itemsize + self.ends.itemsize + self.offsets.itemsize) + self.offsets[self.hi] - self.offsets[self.lo]
+
+    def between(self, start_time, end_time):
+        """
+        Returns the segments that overlap a time range, as a view.
+
+        Args:
+        start_time (float): The start of the range, in seconds.
+        end_time (float): The end of the range, in seconds.
+
+        Returns:
+        TimedTranscript: The segments that end after start_time and start before end_time.
+        """
+        lo = bisect_right(self.ends, start_time, self.lo, self.hi)
+        hi = bisect_left(self.starts, end_time, lo, self.hi)
+        return TimedTranscript(self.starts, self.ends, self.text, self.offsets, lo, hi)
+
+    def split_at(self, times):
+        """
+        Splits the transcript at a list of times into consecutive views, each segment going to the part in which it starts.
+
+        Args:
+        times (list of float): The times to split at, in seconds, in increasing order.
+
+        Returns:
+        list of TimedTranscript: len(times) + 1 parts, which may be empty.
+        """
+        bounds = [self.lo] + [bisect_left(self.starts, split_time, self.lo, self.hi) for split_time in times] + [self.hi]
+        return [TimedTranscript(self.starts, self.ends, self.text, self.offsets, lo, max(lo, hi)) for lo, hi in zip(bounds, bounds[1:])]
+
+    def segment_text(self):
+        """
+        Returns the text of every segment, joined without separators.
+
+        Returns:
+        str: The text.
+        """
+        return self.text[self.offsets[self.lo]:self.offsets[self.hi]]
+
+    def text_length(self, index):
+        """
+        Returns the number of characters in a segment's text.
+
+        Args:
+        index (int): The index of the segment.
+
+        Returns:
+        int: The length of the segment's text.
+        """
+        i = self.lo + index
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def to_prompt(self):
+        """
+        Formats the transcript for a prompt, as one compact JSON object per line, each with "start", "end", and "text".
+
+        Returns:
+        str: The formatted transcript.
+        """
+        return "\n".join(json.dumps(segment) for segment in self)
+
+    def to_bytes(self):
+        """
+        Encodes the transcript in a compact binary form, suitable for a bytea column.
+
+        Returns:
+        bytes: The encoded transcript.
+        """
+        base = self.offsets[self.lo]
+        offsets = array("q", (offset - base for offset in self.offsets[self.lo:self.hi + 1]))
+        parts = [self.starts[self.lo:self.hi], self.ends[self.lo:self.hi], offsets]
+        if sys.byteorder == "big":
+            for part in parts:
+                part.byteswap()
+        return HEADER.pack(MAGIC, len(self)) + b"".join(part.tobytes() for part in parts) + self.segment_text().encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Decodes a transcript encoded by to_bytes.
+
+        Args:
+        data (bytes or memoryview): The encoded transcript.
+
+        Returns:
+        TimedTranscript: The transcript.
+
+        Exceptions:
+        ValueError: If the data is not an encoded transcript.
+        """
+        data = bytes(data)
+        magic, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not an encoded TimedTranscript")
+
+        position = HEADER.size
+        parts = []
+        for typecode, length in (("d", count), ("d", count), ("q", count + 1)):
+            part = array(typecode)
+            part.frombytes(data[position:position + length * part.itemsize])
+            position += length * part.itemsize
+            parts.append(part)
+        if sys.byteorder == "big":
+            for part in parts:
+                part.byteswap()
+        starts, ends, offsets = parts
+        return cls(starts, ends, data[position:].decode("utf-8"), offsets)
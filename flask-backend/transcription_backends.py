@@ -0,0 +1,155 @@
+import os
+import threading
+from openai import OpenAI
+from scheduler import transcription_scheduler
+
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "openai")
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small.en")
+LOCAL_WHISPER_THREADS = int(os.getenv("LOCAL_WHISPER_THREADS", str(os.cpu_count() or 4)))
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+
+
+class OpenAIWhisperBackend:
+    """
+    Transcribes audio with OpenAI's hosted Whisper model. Files must be uploaded, so they are limited to 25 MB.
+    Requests are sent through transcription_scheduler, which limits how many are in flight and retries them after rate limit and server errors.
+    """
+
+    max_file_size_mb = 25
+    hosted = True
+
+    def transcribe(self, absolute_path_to_file):
+        """
+        Transcribes an audio file to plain text in English.
+
+        Args:
+        absolute_path_to_file (str): The absolute path to the audio file.
+
+        Returns:
+        str: The transcription.
+        """
+        client = OpenAI(max_retries=0)
+
+        def send():
+            with open(absolute_path_to_file, "rb") as audio_file:
+                return client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                    response_format="text"
+                )
+
+        return transcription_scheduler.call(send)
+
+    def transcribe_segments(self, absolute_path_to_file):
+        """
+        Transcribes an audio file in English, with timestamps at the segment level.
+
+        Args:
+        absolute_path_to_file (str): The absolute path to the audio file.
+
+        Returns:
+        list of Verbose JSON transcription objects: The segments, each with `start`, `end`, and `text`.
+        """
+        client = OpenAI(max_retries=0)
+
+        def send():
+            with open(absolute_path_to_file, "rb") as audio_file:
+                return client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                    response_format="verbose_json",
+                    timestamp_granularities=["segment"]
+                )
+
+        return transcription_scheduler.call(send).segments
+
+
+class FasterWhisperBackend:
+    """
+    Transcribes audio on the local CPU with faster-whisper, so nothing is uploaded and there is no file size limit.
+    Voice activity detection splits the audio into speech chunks before transcription, skipping silence.
+    The model is loaded on first use and shared by every thread.
+
+    Requires the optional faster-whisper package: pip install faster-whisper
+    """
+
+    max_file_size_mb = None
+    hosted = False
+
+    def __init__(self, model_size = LOCAL_WHISPER_MODEL, cpu_threads = LOCAL_WHISPER_THREADS, compute_type = LOCAL_WHISPER_COMPUTE_TYPE):
+        self.model_size = model_size
+        self.cpu_threads = cpu_threads
+        self.compute_type = compute_type
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load_model(self):
+        """
+        Loads the Whisper model, if it has not been loaded already.
+
+        Returns:
+        faster_whisper.WhisperModel: The loaded model.
+
+        Exceptions:
+        ImportError: If faster-whisper is not installed.
+        """
+        with self.lock:
+            if self.model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise ImportError("The faster-whisper backend requires the faster-whisper package: pip install faster-whisper") from e
+                self.model = WhisperModel(self.model_size, device="cpu", compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+            return self.model
+
+    def transcribe_segments(self, absolute_path_to_file):
+        """
+        Transcribes an audio file in English, with timestamps at the segment level.
+
+        Args:
+        absolute_path_to_file (str): The absolute path to the audio file.
+
+        Returns:
+        list of faster_whisper Segment: The segments, each with `start`, `end`, and `text`.
+        """
+        segments, _ = self.load_model().transcribe(absolute_path_to_file, language="en", vad_filter=True)
+        return list(segments)
+
+    def transcribe(self, absolute_path_to_file):
+        """
+        Transcribes an audio file to plain text in English.
+
+        Args:
+        absolute_path_to_file (str): The absolute path to the audio file.
+
+        Returns:
+        str: The transcription.
+        """
+        return " ".join(segment.text.strip() for segment in self.transcribe_segments(absolute_path_to_file))
+
+
+BACKENDS = {
+    "openai": OpenAIWhisperBackend,
+    "faster-whisper": FasterWhisperBackend,
+}
+backend = None
+backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the transcription backend selected by the TRANSCRIPTION_BACKEND environment variable, 'openai' or 'faster-whisper', creating it on first use.
+
+    Returns:
+    OpenAIWhisperBackend or FasterWhisperBackend: The backend.
+
+    Exceptions:
+    ValueError: If TRANSCRIPTION_BACKEND names an unknown backend.
+    """
+    global backend
+    with backend_lock:
+        if backend is None:
+            if TRANSCRIPTION_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown transcription backend '{TRANSCRIPTION_BACKEND}', expected one of: {', '.join(BACKENDS)}")
+            backend = BACKENDS[TRANSCRIPTION_BACKEND]()
+        return backend
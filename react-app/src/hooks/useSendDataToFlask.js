@@ -1,6 +1,21 @@
 import { useState } from "react";
 
+/**
+ * Orders questions by timestamp when they have one, so questions streamed out of order are shown in playback order.
+ *
+ * @param {Array} questions - The questions received so far.
+ * @returns {Array} - A new array of the questions, sorted by timestamp if every question has one.
+ */
+const sortByTimestamp = (questions) =>
+  questions.every((q) => typeof q.timestamp === "number")
+    ? [...questions].sort((a, b) => a.timestamp - b.timestamp)
+    : [...questions];
+
 /** Custom hook to send data to a Flask API, which does video transcription and question generation.
+ * Questions are streamed from the API as newline-delimited JSON, so the response message is updated as each question is generated,
+ * and replaced by the final, cleaned list of questions once generation finishes.
+ * Timestamped questions may be generated window by window in playback order. As each window is done, the questions streamed for it
+ * are replaced by its cleaned questions, so the questions for the start of the video are settled while later ones are still generated.
  *
  * @returns {object} - An object containing the response message, error state, and a function to send data to the Flask API.
  * The response message should be a list of questions, each with a `question`, `options`, and `correct_answer`, and optionally a `timestamp`.
@@ -13,19 +28,72 @@ const useSendDataToFlask = () => {
     setError(null);
 
     try {
-      const response = await fetch("http://127.0.0.1:5000/generate_questions", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({
-          video_url: videoUrl,
-          timestamped: timestamped,
-        }),
-      });
-
-      const data = await response.json();
-      setResponseMessage(data);
+      const response = await fetch(
+        "http://127.0.0.1:5000/generate_questions/stream",
+        {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({
+            video_url: videoUrl,
+            timestamped: timestamped,
+          }),
+        }
+      );
+
+      if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
+      let streamedQuestions = [];
+      let windowQuestions = [];
+      let windowsEnd = 0;
+
+      const handleEvent = (event) => {
+        if (event.type === "question") {
+          streamedQuestions = [...streamedQuestions, event.question];
+          setResponseMessage(
+            sortByTimestamp([...windowQuestions, ...streamedQuestions])
+          );
+        } else if (event.type === "window") {
+          windowQuestions = [...windowQuestions, ...event.questions];
+          windowsEnd = event.end;
+          const settled = new Set(windowQuestions.map((q) => q.question));
+          streamedQuestions = streamedQuestions.filter(
+            (q) =>
+              typeof q.timestamp === "number" &&
+              q.timestamp >= windowsEnd &&
+              !settled.has(q.question)
+          );
+          setResponseMessage(
+            sortByTimestamp([...windowQuestions, ...streamedQuestions])
+          );
+        } else if (event.type === "final") {
+          setResponseMessage(event.questions);
+        } else if (event.type === "error") {
+          throw new Error(event.error);
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split("\n");
+        buffered = lines.pop();
+        lines.filter((line) => line.trim()).forEach((line) => {
+          handleEvent(JSON.parse(line));
+        });
+      }
+      if (buffered.trim()) {
+        handleEvent(JSON.parse(buffered));
+      }
     } catch (err) {
       console.error("Error:", err);
       setError("Error communicating with Flask API.");